@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+import threading
+import time
+
+
+class SemanticAnswerCache:
+    """In-memory cache of LLM answers.
+
+    Entries are grouped by the exact set of retrieved chunks; within a group a
+    cached answer is reused when the new query embedding is within the cosine
+    similarity threshold of the cached one and the entry has not expired.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl: float = 3600, max_entries: int = 512):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._groups: "OrderedDict[frozenset, List[Dict]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, embedding: List[float], chunk_keys: Iterable[str]) -> Optional[Dict]:
+        group_key = frozenset(chunk_keys)
+        vector = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            entries = self._groups.get(group_key, [])
+            live = [entry for entry in entries if entry['expires'] > now]
+            if len(live) != len(entries):
+                self._size -= len(entries) - len(live)
+                self._groups[group_key] = live
+            for entry in live:
+                if float(np.dot(entry['vector'], vector)) >= self.threshold:
+                    self._groups.move_to_end(group_key)
+                    self.hits += 1
+                    return entry['value']
+            self.misses += 1
+            return None
+
+    def put(self, embedding: List[float], chunk_keys: Iterable[str], value: Dict, paper_ids: Iterable[str] = ()):
+        group_key = frozenset(chunk_keys)
+        entry = {
+            'vector': self._normalize(embedding),
+            'value': value,
+            'paper_ids': set(paper_ids),
+            'expires': time.time() + self.ttl
+        }
+        with self._lock:
+            self._groups.setdefault(group_key, []).append(entry)
+            self._groups.move_to_end(group_key)
+            self._size += 1
+            while self._size > self.max_entries and self._groups:
+                _, evicted = self._groups.popitem(last=False)
+                self._size -= len(evicted)
+
+    def invalidate_papers(self, paper_ids: Iterable[str]) -> int:
+        """Drop answers that were built from any of the given papers."""
+        paper_ids = set(paper_ids)
+        removed = 0
+        with self._lock:
+            for group_key in list(self._groups):
+                entries = self._groups[group_key]
+                kept = [entry for entry in entries if not entry['paper_ids'] & paper_ids]
+                removed += len(entries) - len(kept)
+                if kept:
+                    self._groups[group_key] = kept
+                else:
+                    del self._groups[group_key]
+            self._size -= removed
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._groups.clear()
+            self._size = 0
+
+    def stats(self) -> Dict:
+        return {'hits': self.hits, 'misses': self.misses, 'entries': self._size}
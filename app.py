@@ -1,52 +1,156 @@
+import time
+SCRIPT_START = time.perf_counter()
 import streamlit as st
-from scraper import MedicalPaperScraper
-from rag_system import MedicalRAG
-import schedule
+# rag_system (langchain, chromadb, torch) is imported by the search warm-up, not here
+from scraper import MedicalPaperScraper, DEFAULT_SOURCES, SOURCE_NAMES
+from refresh_worker import RefreshStatus, load_last_update, refresh_due, start_refresh
+from metrics import METRICS
 from datetime import datetime, timedelta
-import time
 import threading
 import json
 import os
+IMPORT_SECONDS = time.perf_counter() - SCRIPT_START
 
-def initialize_system():
-    sources = [
-        "https://pubmed.ncbi.nlm.nih.gov/?term=latest",
-        "https://www.biorxiv.org/collection/new_results",
-        "https://www.medrxiv.org/content/early/recent",
-        "https://www.sciencedirect.com/browse/journals-and-books?subject=medicine",
-        "https://trialsearch.who.int/trial-search",
-        "https://europepmc.org/search?query=recent"
-    ]
-    
-    scraper = MedicalPaperScraper(sources)
-    rag = MedicalRAG()
-    return scraper, rag
-
-def update_papers():
-    """Update papers and return the newly fetched papers"""
-    papers = st.session_state.scraper.run_scraper()
-    st.session_state.rag.process_papers(papers)
-    st.session_state.last_update = datetime.now()
-    st.session_state.next_update = datetime.now() + timedelta(hours=12)
-    st.session_state.recent_papers = papers[:10]  # Keep most recent 10 papers
-    
-    # Save update time to file
-    with open('last_update.json', 'w') as f:
-        json.dump({
-            'last_update': st.session_state.last_update.isoformat(),
-            'next_update': st.session_state.next_update.isoformat()
-        }, f)
+@st.cache_resource
+def get_scraper():
+    """One scraper and catalog per process"""
+    return MedicalPaperScraper(DEFAULT_SOURCES)
+
+class SearchWarmup:
+    """Builds the RAG system (model, store handle, LLM client) on a background thread"""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.ready = threading.Event()
+        self.rag = None
+        self.error = None
+        self.seconds = None
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        try:
+            from rag_system import MedicalRAG
+            rag = MedicalRAG()
+            # Loads MiniLM and runs one embedding, then opens the store
+            rag.embedding_dim
+            rag.vectorstore
+            self.rag = rag
+            print(f"Search ready {time.perf_counter() - self.started:.2f}s after startup")
+        except Exception as e:
+            self.error = e
+            print(f"Search warm-up failed: {str(e)}")
+        finally:
+            self.seconds = time.perf_counter() - self.started
+            self.ready.set()
+
+    def get(self):
+        """The RAG system, waiting for the warm-up to finish if it has not yet"""
+        self.ready.wait()
+        if self.error is not None:
+            raise self.error
+        return self.rag
+
+@st.cache_resource
+def startup_stats():
+    """Import time and time-to-interactive of the first page load in this process"""
+    return {'start': SCRIPT_START, 'imports': IMPORT_SECONDS, 'interactive': None}
+
+@st.cache_resource
+def start_warmup():
+    """Start loading the search stack as soon as the process serves its first page"""
+    stats = startup_stats()
+    warmup = SearchWarmup(stats['start'])
+    METRICS.register('startup', lambda: {
+        'startup_import_seconds': stats['imports'],
+        'startup_interactive_seconds': stats['interactive'] or 0.0,
+        'startup_search_ready_seconds': warmup.seconds or 0.0
+    })
+    return warmup
 
 def run_scheduler():
-    """Background scheduler to run updates"""
+    """Start a refresh process whenever one is due; refreshes never run in the UI process"""
     while True:
-        schedule.run_pending()
+        if refresh_due():
+            start_refresh()
         time.sleep(60)
 
-def display_recent_papers():
+@st.cache_resource
+def start_scheduler():
+    """Start the single scheduler thread for this process, unless refresh_worker.py is run separately"""
+    if os.getenv('REFRESH_SCHEDULER', 'app') != 'app':
+        return None
+    scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
+    scheduler_thread.start()
+    return scheduler_thread
+
+REFRESH_STAGES = {
+    'starting': 'Starting update',
+    'scraping': 'Fetching latest papers',
+    'indexing': 'Indexing papers',
+    'done': 'Finishing update'
+}
+
+def refresh_status_panel():
+    """Update times, refresh progress and the Update Now button; polled while a refresh runs"""
+    refresh = RefreshStatus().read()
+    running = refresh['state'] == 'running'
+    updates = load_last_update()
+    if updates['last_update']:
+        st.markdown(f'''
+            <div class="status-box">
+                <p><strong>Last Update:</strong><br/> {updates['last_update'].strftime('%Y-%m-%d %H:%M')}</p>
+                <p><strong>Next Update:</strong><br/> {updates['next_update'].strftime('%Y-%m-%d %H:%M')}</p>
+            </div>
+        ''', unsafe_allow_html=True)
+
+    if running:
+        counts = ', '.join(f"{refresh[key]} {key}" for key in ('scraped', 'papers', 'chunks') if refresh.get(key))
+        st.info(f"{REFRESH_STAGES.get(refresh['stage'], refresh['stage'])}...{f' ({counts})' if counts else ''}")
+    elif st.session_state.get('refresh_running'):
+        # The refresh we were watching just finished; rerun the page to stop polling
+        st.session_state.refresh_running = False
+        st.session_state.refresh_outcome = refresh
+        st.rerun()
+
+    outcome = st.session_state.pop('refresh_outcome', None)
+    if outcome and outcome['state'] == 'succeeded':
+        st.success("Database updated successfully!")
+    elif refresh['state'] == 'failed':
+        st.error(f"Last update failed: {refresh.get('error')}")
+
+    if st.button("Update Now", type="primary", disabled=running):
+        # If another update started meanwhile, the panel simply follows that one
+        start_refresh()
+        st.session_state.refresh_running = True
+        st.rerun()
+
+def display_update_status():
+    st.markdown('<h3 class="section-header">Update Status</h3>', unsafe_allow_html=True)
+    running = RefreshStatus().read()['state'] == 'running'
+    if running:
+        st.session_state.refresh_running = True
+    # Only the panel reruns while polling, so searches on the page are not interrupted
+    st.fragment(refresh_status_panel, run_every=2 if running else None)()
+
+def display_admin_panel():
+    """Stage latencies, counters and the latest requests handled by this app process"""
+    with st.expander("Admin: Metrics"):
+        st.caption("Since this process started; refreshes run in their own process and log there.")
+        rows = METRICS.stage_summary()
+        if rows:
+            st.dataframe([{key: round(value, 1) if isinstance(value, float) else value for key, value in row.items()}
+                          for row in rows], hide_index=True)
+        else:
+            st.write("No requests yet.")
+        st.json(METRICS.counter_summary(), expanded=False)
+        st.markdown("**Recent requests**")
+        for record in reversed(list(METRICS.recent_traces)[-10:]):
+            st.code(json.dumps(record, default=str), language='json')
+
+def display_recent_papers(recent_papers):
     """Display the most recently fetched papers"""
     st.markdown('<h3 class="section-header">Recently Added Papers</h3>', unsafe_allow_html=True)
-    for paper in st.session_state.recent_papers:
+    for paper in recent_papers:
         st.markdown(f'''
             <div class="paper-box">
                 <div class="paper-title">{paper['title']}</div>
@@ -59,89 +163,94 @@ def display_recent_papers():
             </div>
         ''', unsafe_allow_html=True)
 
-def display_all_papers():
+PAGE_SIZE = 50
+
+@st.cache_data(ttl=600, max_entries=256)
+def load_papers_page(_catalog, catalog_version, sources, sort_by, after):
+    """One page of papers and the next page's cursor; cached per catalog version so reruns skip the query"""
+    return _catalog.list_papers(list(sources), sort_by=sort_by, limit=PAGE_SIZE, after=after)
+
+@st.cache_data(ttl=600, max_entries=64)
+def load_paper_count(_catalog, catalog_version, sources):
+    return _catalog.count(list(sources))
+
+@st.cache_data(ttl=600)
+def load_sources(_catalog, catalog_version):
+    return _catalog.sources()
+
+def display_all_papers(catalog):
     """Display all stored papers with filtering options"""
+    start = time.perf_counter()
     st.subheader("All Stored Papers")
     
-    # Get all JSON files from backup directory
-    backup_dir = os.getenv('BACKUP_DIR', './paper_backups')
-    if not os.path.exists(backup_dir):
-        os.makedirs(backup_dir)
-        
-    json_files = [f for f in os.listdir(backup_dir) if f.endswith('.json')]
-    
-    if not json_files:
-        st.warning("No paper backups found yet. Please update the database.")
+    version = catalog.version()
+    sources = load_sources(catalog, version)
+    if not sources:
+        st.warning("No papers stored yet. Please update the database.")
         return
-        
-    # Load the most recent backup
-    latest_backup = max(json_files)
-    with open(os.path.join(backup_dir, latest_backup), 'r') as f:
-        all_papers = json.load(f)
     
     # Filtering options
     col1, col2 = st.columns(2)
     with col1:
-        sources = list(set(paper['source'] for paper in all_papers))
-        selected_source = st.multiselect('Filter by source:', sources)
+        selected_source = st.multiselect('Filter by source:', sources, key='all_papers_sources')
     
     with col2:
-        sort_by = st.selectbox('Sort by:', ['date', 'source', 'title'])
+        sort_by = st.selectbox('Sort by:', ['date', 'source', 'title'], key='all_papers_sort')
     
-    # Filter papers
-    if selected_source:
-        filtered_papers = [p for p in all_papers if p['source'] in selected_source]
-    else:
-        filtered_papers = all_papers
-    
-    # Sort papers
-    if sort_by == 'date':
-        filtered_papers = sorted(filtered_papers, key=lambda x: x['date'], reverse=True)
-    elif sort_by == 'source':
-        filtered_papers = sorted(filtered_papers, key=lambda x: x['source'])
-    else:
-        filtered_papers = sorted(filtered_papers, key=lambda x: x['title'])
+    # Filtering, sorting and paging happen in the catalog; only one page is loaded and rendered.
+    # Pages are fetched after a cursor, so the start cursor of every page visited is kept and
+    # reset whenever the filter or sort order changes.
+    listing = (tuple(selected_source), sort_by)
+    if st.session_state.get('all_papers_listing') != listing:
+        st.session_state.all_papers_listing = listing
+        st.session_state.all_papers_cursors = [None]
+    cursors = st.session_state.all_papers_cursors
+    page = len(cursors)
+    papers, next_cursor = load_papers_page(catalog, version, tuple(selected_source), sort_by, cursors[-1])
+    matching = load_paper_count(catalog, version, tuple(selected_source))
+    pages = max(1, -(-matching // PAGE_SIZE))
     
     # Display papers
-    st.write(f"Showing {len(filtered_papers)} papers")
-    for i, paper in enumerate(filtered_papers):
+    first = (page - 1) * PAGE_SIZE
+    st.write(f"Showing {first + 1}-{first + len(papers)} of {matching} papers (page {page} of {pages})")
+    for paper in papers:
         with st.expander(f"{paper['title']} - {paper['source']} ({paper['date']})"):
             st.write(f"**Abstract:**\n{paper['abstract']}")
-            unique_key = f"btn_{i}_{int(time.time())}_{paper['source']}"
-            if st.button(f"Open Paper", key=unique_key):
+            if st.button(f"Open Paper", key=f"open_{paper['paper_id']}"):
                 st.markdown(f"<a href='{paper['url']}' target='_blank'>Click here to open paper</a>", unsafe_allow_html=True)
 
-def display_search_results(query_result):
-    """Display search results in a structured format"""
-    if not query_result:
-        st.warning("No results found.")
-        return
+    previous_col, next_col = st.columns(2)
+    with previous_col:
+        st.button('← Previous page', key='all_papers_previous', disabled=page == 1, on_click=cursors.pop)
+    with next_col:
+        st.button('Next page →', key='all_papers_next', disabled=next_cursor is None,
+                  on_click=cursors.append, args=(next_cursor,))
 
-    # Display analysis in a cleaner format
-    st.markdown('<div class="analysis-section">', unsafe_allow_html=True)
-    analysis_text = query_result['analysis']
-    sections = analysis_text.split('\n')
-    current_section = ""
-    
-    for section in sections:
-        if section.startswith('1. Key Findings'):
-            st.markdown('<h3 class="section-header">🔍 Key Findings</h3>', unsafe_allow_html=True)
-            current_section = "key_findings"
-        elif section.startswith('2. Clinical Implications'):
-            st.markdown('<h3 class="section-header">👨‍⚕️ Clinical Implications</h3>', unsafe_allow_html=True)
-            current_section = "implications"
-        elif section.startswith('3. Critical Analysis'):
-            st.markdown('<h3 class="section-header">📊 Critical Analysis</h3>', unsafe_allow_html=True)
-            current_section = "analysis"
-        elif section.startswith('4. Recommendations'):
-            st.markdown('<h3 class="section-header">💡 Recommendations</h3>', unsafe_allow_html=True)
-            current_section = "recommendations"
-        elif section.strip():  # Only add non-empty lines
-            st.markdown(f'<p>{section}</p>', unsafe_allow_html=True)
-    st.markdown('</div>', unsafe_allow_html=True)
-
-    # Display referenced papers
-    papers = query_result.get('papers', [])
+    st.caption(f"Page rendered in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+SECTION_HEADERS = [
+    ('1. Key Findings', '🔍 Key Findings'),
+    ('2. Clinical Implications', '👨‍⚕️ Clinical Implications'),
+    ('3. Critical Analysis', '📊 Critical Analysis'),
+    ('4. Recommendations', '💡 Recommendations')
+]
+
+def format_analysis(analysis_text):
+    """Render analysis text as HTML, turning the numbered sections into headers"""
+    html = ['<div class="analysis-section">']
+    for section in analysis_text.split('\n'):
+        for prefix, header in SECTION_HEADERS:
+            if section.startswith(prefix):
+                html.append(f'<h3 class="section-header">{header}</h3>')
+                break
+        else:
+            if section.strip():  # Only add non-empty lines
+                html.append(f'<p>{section}</p>')
+    html.append('</div>')
+    return '\n'.join(html)
+
+def display_referenced_papers(papers):
+    """Display the papers a search result was based on"""
     if papers:
         st.markdown('<h3 class="section-header">📚 Referenced Papers</h3>', unsafe_allow_html=True)
         
@@ -158,13 +267,48 @@ def display_search_results(query_result):
             
             col1, col2 = st.columns([1, 4])
             with col1:
-                if st.button("Open Paper", key=f"ref_{i}_{int(time.time())}"):
+                if st.button("Open Paper", key=f"ref_{i}"):
                     st.markdown(f"<a href='{paper['url']}' target='_blank' class='custom-button'>Opening paper...</a>", unsafe_allow_html=True)
             with col2:
                 st.markdown(f"[View Original Paper]({paper['url']})")
     else:
         st.info("No specific papers were referenced for this query.")
 
+PUBLISHED_WITHIN = {
+    'Any time': None,
+    'Last 7 days': 7,
+    'Last 30 days': 30,
+    'Last year': 365
+}
+
+def display_streaming_search(rag, query, sources=None, since=None):
+    """Render the analysis section by section as tokens arrive"""
+    analysis_placeholder = st.empty()
+    analysis_placeholder.info("Analyzing research papers...")
+    timing_placeholder = st.empty()
+
+    analysis_text = ""
+    for event in rag.stream_query_papers(query, sources=sources, since=since):
+        if event['type'] == 'papers':
+            # Papers are known before generation starts, so show them straight away
+            display_referenced_papers(event['papers'])
+        elif event['type'] == 'token':
+            analysis_text += event['text']
+            analysis_placeholder.markdown(format_analysis(analysis_text), unsafe_allow_html=True)
+        elif event['type'] == 'done':
+            cached = " (cached)" if event['cached'] else ""
+            context_stats = event.get('context_stats')
+            tokens = ""
+            if context_stats:
+                tokens = f", prompt {context_stats['prompt_tokens']} tokens"
+                if context_stats['tokens_saved'] > 0:
+                    tokens += f" ({context_stats['tokens_saved']} saved)"
+            if event['time_to_first_token'] is not None:
+                timing_placeholder.caption(
+                    f"First token in {event['time_to_first_token']:.2f}s, "
+                    f"complete in {event['total_time']:.2f}s{tokens}{cached}"
+                )
+
 def custom_css():
     st.markdown("""
         <style>
@@ -254,71 +398,62 @@ def main():
     custom_css()
     st.markdown('<h1 class="main-header">DocuMeD</h1>', unsafe_allow_html=True)
     
-    # Initialize system state
-    if 'initialized' not in st.session_state:
-        st.session_state.scraper, st.session_state.rag = initialize_system()
-        st.session_state.initialized = True
-        
-        # Try to load last update time
-        if os.path.exists('last_update.json'):
-            with open('last_update.json', 'r') as f:
-                data = json.load(f)
-                st.session_state.last_update = datetime.fromisoformat(data['last_update'])
-                st.session_state.next_update = datetime.fromisoformat(data['next_update'])
-        else:
-            st.session_state.last_update = None
-            st.session_state.next_update = None
-        
-        # Initialize recent papers list
-        st.session_state.recent_papers = []
-        
-        # Schedule updates every 12 hours
-        schedule.every(12).hours.do(update_papers)
-        
-        # Start the scheduler in a background thread
-        scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-        scheduler_thread.start()
+    # Shared across sessions: one scraper, search system and scheduler per process
+    startup = startup_stats()
+    scraper = get_scraper()
+    warmup = start_warmup()
+    start_scheduler()
 
     # Navigation
     st.sidebar.markdown('<div class="nav-section">', unsafe_allow_html=True)
     page = st.sidebar.radio("Navigation", ["Recent Updates", "All Papers", "Search"])
     st.sidebar.markdown('</div>', unsafe_allow_html=True)
     
-    # Display update status in sidebar
-    st.sidebar.markdown('<h3 class="section-header">Update Status</h3>', unsafe_allow_html=True)
-    if st.session_state.last_update:
-        st.sidebar.markdown(f'''
-            <div class="status-box">
-                <p><strong>Last Update:</strong><br/> {st.session_state.last_update.strftime('%Y-%m-%d %H:%M')}</p>
-                <p><strong>Next Update:</strong><br/> {st.session_state.next_update.strftime('%Y-%m-%d %H:%M')}</p>
-            </div>
-        ''', unsafe_allow_html=True)
-    
-    # Manual update button
-    if st.sidebar.button("Update Now", type="primary"):
-        with st.spinner("Fetching latest papers..."):
-            update_papers()
-        st.success("Database updated successfully!")
+    # Updates run in a separate refresh process; the sidebar only shows their progress
+    with st.sidebar:
+        display_update_status()
+        display_admin_panel()
 
     # Content based on navigation selection
     if page == "Recent Updates":
-        if st.session_state.recent_papers:
-            display_recent_papers()
-        elif not st.session_state.last_update:
+        recent_papers = scraper.catalog.recent(10)
+        if recent_papers:
+            display_recent_papers(recent_papers)
+        elif not load_last_update()['last_update']:
             st.warning("No papers fetched yet. Click 'Update Now' to fetch the latest papers.")
     
     elif page == "All Papers":
-        display_all_papers()
+        display_all_papers(scraper.catalog)
     
     else:  # Search page
         st.markdown('<div class="search-box">', unsafe_allow_html=True)
         st.markdown('<h3 class="section-header">Search and Analysis</h3>', unsafe_allow_html=True)
         query = st.text_input("Enter your medical research query:")
+        col1, col2 = st.columns(2)
+        with col1:
+            sources = st.multiselect('Sources:', SOURCE_NAMES)
+        with col2:
+            within = st.selectbox('Published:', list(PUBLISHED_WITHIN))
+        since = None
+        if PUBLISHED_WITHIN[within]:
+            since = (datetime.now() - timedelta(days=PUBLISHED_WITHIN[within])).date()
         if query:
-            with st.spinner("Analyzing research papers..."):
-                results = st.session_state.rag.query_papers(query)
-                display_search_results(results)
+            if not warmup.ready.is_set():
+                with st.spinner("Loading the search model..."):
+                    warmup.ready.wait()
+            try:
+                rag = warmup.get()
+            except Exception as e:
+                st.error(f"Search is unavailable: {str(e)}")
+            else:
+                # Retrieval picks up a finished refresh first; a running one does not affect the search
+                display_streaming_search(rag, query, sources=sources, since=since)
         st.markdown('</div>', unsafe_allow_html=True)
 
+    if startup['interactive'] is None:
+        startup['interactive'] = time.perf_counter() - startup['start']
+        print(f"Startup: imports {startup['imports']:.2f}s, interactive after {startup['interactive']:.2f}s"
+              f"{'' if warmup.ready.is_set() else ', search model still loading'}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,79 @@
+"""Time the All Papers page queries against catalogs of different sizes.
+
+Usage: python benchmarks/bench_catalog.py [--sizes 500 500000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import PaperCatalog, SORT_KEYS
+from scraper import SOURCE_NAMES
+
+
+def build_catalog(path: str, size: int) -> PaperCatalog:
+    catalog = PaperCatalog(path)
+    rng = random.Random(size)
+    batch = []
+    for i in range(size):
+        batch.append({
+            'title': f"Synthetic paper {i} on {rng.choice(['sepsis', 'asthma', 'melasma', 'obesity'])}",
+            'abstract': 'Abstract text. ' * 20,
+            'date': f"{rng.randint(2015, 2025)} {rng.choice(['Jan', 'Apr', 'Jul', 'Oct'])} {rng.randint(1, 28)}",
+            'source': rng.choice(SOURCE_NAMES),
+            'url': f"https://example.org/{i}"
+        })
+        if len(batch) == 10000:
+            catalog.add_papers(batch)
+            batch = []
+    catalog.add_papers(batch)
+    return catalog
+
+
+def cursor_at(catalog: PaperCatalog, sort_by: str, position: int):
+    """The cursor a reader paging from the start would hold just before row ``position``."""
+    keys = ', '.join(SORT_KEYS[sort_by])
+    row = catalog._connection().execute(f"SELECT {keys} FROM papers ORDER BY {keys} LIMIT 1 OFFSET ?",
+                                        (position - 1,)).fetchone()
+    return tuple(row)
+
+
+def timed(fn, repeat: int = 20) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 500000])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='documed_bench_')
+    print(f"{'papers':>8} {'sort':>7} {'first page ms':>14} {'middle page ms':>15} {'filtered ms':>12} "
+          f"{'2 sources ms':>13} {'count ms':>9}")
+    for size in args.sizes:
+        start = time.perf_counter()
+        catalog = build_catalog(os.path.join(workdir, f'catalog_{size}.sqlite3'), size)
+        print(f"(built {size} papers in {time.perf_counter() - start:.1f}s)")
+        for sort_by in ['date', 'source', 'title']:
+            middle_cursor = cursor_at(catalog, sort_by, size // 2)
+            first = timed(lambda: catalog.list_papers(sort_by=sort_by, limit=50))
+            middle = timed(lambda: catalog.list_papers(sort_by=sort_by, limit=50, after=middle_cursor))
+            filtered = timed(lambda: catalog.list_papers(['bioRxiv'], sort_by=sort_by, limit=50))
+            two_sources = timed(lambda: catalog.list_papers(['bioRxiv', 'PubMed'], sort_by=sort_by, limit=50))
+            count = timed(lambda: catalog.count(['bioRxiv']))
+            print(f"{size:>8} {sort_by:>7} {first:>14.2f} {middle:>15.2f} {filtered:>12.2f} "
+                  f"{two_sources:>13.2f} {count:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
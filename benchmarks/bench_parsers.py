@@ -0,0 +1,80 @@
+"""Time listing-page parsing per source on the saved fixture pages.
+
+Compares the previous approach (decode to str, full html.parser tree) with the
+table-driven parsers on raw bytes, with and without lxml.
+
+Usage: python benchmarks/bench_parsers.py [--repeat 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsers import PARSER, ListingParser, SOURCE_RULES, _find, _text
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+URL = 'http://localhost/listing'
+
+
+def full_tree_parse(parser: ListingParser, content: bytes):
+    """What every scrape_* method used to do: a complete html.parser tree of the decoded page."""
+    soup = BeautifulSoup(content.decode('utf-8'), 'html.parser')
+    papers = []
+    tag, css_class = parser.item
+    for item in soup.find_all(tag, class_=css_class):
+        try:
+            paper = {field: _text(item, steps) for field, steps in parser.fields.items()}
+            paper['source'] = parser.source
+            paper['url'] = parser._absolute(_find(item, parser.link)['href']) if parser.link else URL
+        except (AttributeError, TypeError, KeyError):
+            continue
+        papers.append(paper)
+    return papers
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"Fast backend: {PARSER}")
+    print(f"{'source':>14} {'KB':>5} {'items':>6} {'full tree ms':>13} {'html.parser ms':>15} {f'{PARSER} ms':>12} {'speedup':>8}")
+    totals = [0.0, 0.0, 0.0]
+    for source_key in SOURCE_RULES:
+        with open(os.path.join(FIXTURES_DIR, f'{source_key}.html'), 'rb') as f:
+            content = f.read()
+        strained = ListingParser(source_key, parser='html.parser')
+        fast = ListingParser(source_key)
+
+        expected = full_tree_parse(strained, content)
+        assert list(strained.parse(content, URL)) == expected, f"{source_key}: strained output differs"
+        assert list(fast.parse(content, URL)) == expected, f"{source_key}: {PARSER} output differs"
+
+        times = [
+            timed(lambda: full_tree_parse(strained, content), args.repeat),
+            timed(lambda: list(strained.parse(content, URL)), args.repeat),
+            timed(lambda: list(fast.parse(content, URL)), args.repeat)
+        ]
+        totals = [total + t for total, t in zip(totals, times)]
+        print(f"{source_key:>14} {len(content) / 1024:>5.0f} {len(expected):>6} "
+              f"{times[0]:>13.2f} {times[1]:>15.2f} {times[2]:>12.2f} {times[0] / times[2]:>7.1f}x")
+    print(f"{'all':>14} {'':>5} {'':>6} {totals[0]:>13.2f} {totals[1]:>15.2f} {totals[2]:>12.2f} "
+          f"{totals[0] / totals[2]:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
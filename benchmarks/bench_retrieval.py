@@ -0,0 +1,59 @@
+"""Recall@k and latency for lexical-only, vector-only and hybrid retrieval on a small labelled set.
+
+Usage: python benchmarks/bench_retrieval.py [--k 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('GROQ_API_KEY', 'benchmark')
+
+from rag_system import MedicalRAG
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'retrieval_benchmark.json')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+
+    with open(DATA) as f:
+        data = json.load(f)
+
+    workdir = tempfile.mkdtemp(prefix='documed_bench_')
+    os.environ['EMBEDDING_CACHE_DIR'] = os.path.join(workdir, 'embedding_cache')
+    rag = MedicalRAG(persist_directory=os.path.join(workdir, 'chroma_db'))
+    rag.process_papers(data['papers'])
+
+    # Embed queries up front so vector timings measure search, not the model
+    for item in data['queries']:
+        rag.embeddings.embed_query(item['query'])
+
+    print(f"{'mode':<10} {'recall@' + str(args.k):>10} {'p50 ms':>10} {'max ms':>10}")
+    for mode in ['lexical', 'vector', 'hybrid']:
+        recalls = []
+        latencies = []
+        for item in data['queries']:
+            start = time.perf_counter()
+            docs = rag.retrieve(item['query'], k=args.k, mode=mode)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found = {doc.metadata.get('title') for doc in docs}
+            recalls.append(len(found & set(item['relevant'])) / len(item['relevant']))
+        print(f"{mode:<10} {statistics.mean(recalls):>10.3f} {statistics.median(latencies):>10.2f} {max(latencies):>10.2f}")
+
+    latencies = []
+    for item in data['queries']:
+        start = time.perf_counter()
+        rag.lexical_index.search(item['query'], args.k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(f"BM25 index lookup alone: p50 {statistics.median(latencies):.3f} ms, max {max(latencies):.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
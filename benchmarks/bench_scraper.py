@@ -0,0 +1,76 @@
+"""Compare sequential and concurrent MedicalPaperScraper.run_scraper against local stub hosts,
+then measure repeat refreshes of unchanged listings (conditional GETs and high-water marks).
+
+Usage: python benchmarks/bench_scraper.py
+"""
+import sys
+import os
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import start_stub_servers
+from fetcher import ConcurrentFetcher
+from scraper import MedicalPaperScraper
+
+LATENCIES = {
+    'pubmed': 0.2,
+    'biorxiv': 0.3,
+    'medrxiv': 0.3,
+    'sciencedirect': 1.5,
+    'who': 2.0,
+    'europepmc': 0.4
+}
+
+
+def run(scraper: MedicalPaperScraper) -> float:
+    start = time.perf_counter()
+    papers = scraper.run_scraper()
+    elapsed = time.perf_counter() - start
+    # No indexing here, so the state is committed straight away as if it had succeeded
+    scraper.commit_fetch_state()
+    downloaded = sum(stats['bytes'] for stats in scraper.fetch_stats.values())
+    print(f"  -> {len(papers)} papers in {elapsed:.2f}s, {downloaded / 1024:.0f} KB downloaded")
+    return elapsed
+
+
+def make_scraper(sources, workdir: str, state_name: str) -> MedicalPaperScraper:
+    os.environ['FETCH_STATE_PATH'] = os.path.join(workdir, state_name)
+    return MedicalPaperScraper(sources)
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix='documed_bench_')
+    os.environ['BACKUP_DIR'] = os.path.join(workdir, 'paper_backups')
+    os.environ['CATALOG_PATH'] = os.path.join(workdir, 'paper_catalog.sqlite3')
+    servers = start_stub_servers(LATENCIES)
+    plain_servers = start_stub_servers(LATENCIES, validators=False)
+    sources = [server.url for server in servers.values()]
+    plain_sources = [server.url for server in plain_servers.values()]
+    try:
+        print("Sequential (1 worker):")
+        sequential = make_scraper(sources, workdir, 'sequential_state.json')
+        sequential.fetcher = ConcurrentFetcher(sequential.headers, max_workers=1, per_host=1)
+        sequential_time = run(sequential)
+
+        print("Concurrent:")
+        concurrent_time = run(make_scraper(sources, workdir, 'concurrent_state.json'))
+
+        print(f"Sum of injected latency:   {sum(LATENCIES.values()):.2f}s")
+        print(f"Slowest source latency:    {max(LATENCIES.values()):.2f}s")
+        print(f"Speedup: {sequential_time / concurrent_time:.1f}x")
+
+        print("Repeat refresh, sources send ETags (expect 304s):")
+        run(make_scraper(sources, workdir, 'concurrent_state.json'))
+
+        print("Repeat refresh, no validators (parsing stops at the high-water mark):")
+        run(make_scraper(plain_sources, workdir, 'plain_state.json'))
+        run(make_scraper(plain_sources, workdir, 'plain_state.json'))
+    finally:
+        for server in list(servers.values()) + list(plain_servers.values()):
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
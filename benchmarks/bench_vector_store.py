@@ -0,0 +1,164 @@
+"""Compare the Chroma store with the quantized memory-mapped store on one synthetic corpus.
+
+Each backend is built and queried in its own subprocess so resident memory
+is measured in isolation. Recall@k is against exact float32 search.
+
+Usage: python benchmarks/bench_vector_store.py [--sizes 20000 100000] [--queries 200]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DIM = 384
+K = 10
+BACKENDS = ['chroma', 'int8-flat', 'float16-flat', 'int8-ivf']
+
+
+def rss_mb() -> dict:
+    """Resident memory split into private heap and pages mapped from files (reclaimable page cache)."""
+    usage = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(('RssAnon:', 'RssFile:')):
+                usage[line.split(':')[0]] = int(line.split()[1]) / 1024
+    return usage
+
+
+def disk_mb(path: str) -> float:
+    # Allocated blocks, since preallocated vector files are sparse
+    total = 0
+    for directory, _, files in os.walk(path):
+        total += sum(os.stat(os.path.join(directory, name)).st_blocks * 512 for name in files)
+    return total / 1024 / 1024
+
+
+def make_corpus(size: int, queries: int, seed: int = 0):
+    """Clustered unit vectors, roughly like sentence embeddings of papers on a few hundred topics."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(50, size // 200), DIM)).astype(np.float32)
+
+    def sample(n):
+        points = centers[rng.integers(0, len(centers), n)] + 1.0 * rng.normal(size=(n, DIM)).astype(np.float32)
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+    return sample(size), sample(queries)
+
+
+def import_backend(backend: str):
+    if backend == 'chroma':
+        import chromadb
+        return chromadb
+    import quantized_store
+    return quantized_store
+
+
+def open_backend(backend: str, path: str):
+    module = import_backend(backend)
+    if backend == 'chroma':
+        return module.PersistentClient(path=path).get_or_create_collection('langchain')
+    dtype, index = backend.split('-')
+    return module.QuantizedCollection(path, dtype=dtype, index=index)
+
+
+def build(backend: str, path: str, corpus_path: str) -> dict:
+    corpus = np.load(corpus_path, mmap_mode='r')
+    start = time.perf_counter()
+    collection = open_backend(backend, path)
+    for offset in range(0, len(corpus), 5000):
+        batch = np.asarray(corpus[offset:offset + 5000])
+        ids = [f"chunk-{i}" for i in range(offset, offset + len(batch))]
+        collection.upsert(ids=ids, embeddings=batch.tolist(),
+                          metadatas=[{'paper_id': chunk_id} for chunk_id in ids], documents=ids)
+    return {'build_s': time.perf_counter() - start}
+
+
+def serve(backend: str, path: str, queries_path: str, truth_path: str) -> dict:
+    queries = np.load(queries_path)
+    truth = np.load(truth_path)
+    # Library imports are not part of the index's footprint
+    import_backend(backend)
+    before = rss_mb()
+    start = time.perf_counter()
+    collection = open_backend(backend, path)
+    collection.query(query_embeddings=[queries[0].tolist()], n_results=K)
+    open_s = time.perf_counter() - start
+
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=K)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = {int(chunk_id.split('-')[1]) for chunk_id in result['ids'][0]}
+        recalls.append(len(found & set(expected.tolist())) / K)
+    latencies.sort()
+    after = rss_mb()
+    return {
+        'open_s': open_s,
+        'heap_mb': after['RssAnon'] - before['RssAnon'],
+        'mapped_mb': after['RssFile'] - before['RssFile'],
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1],
+        'recall': sum(recalls) / len(recalls)
+    }
+
+
+def run_child(*args) -> dict:
+    output = subprocess.run([sys.executable, __file__, '--child', *args],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20000, 100000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--backends', nargs='+', default=BACKENDS)
+    parser.add_argument('--child', nargs='+')
+    args = parser.parse_args()
+
+    if args.child:
+        step, backend, path, *paths = args.child
+        result = build(backend, path, *paths) if step == 'build' else serve(backend, path, *paths)
+        print(json.dumps(result))
+        return
+
+    workdir = tempfile.mkdtemp(prefix='documed_bench_')
+    print(f"{'vectors':>8} {'backend':>13} {'build s':>8} {'disk MB':>8} {'open s':>7} {'heap MB':>8} {'mapped MB':>10} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {f'recall@{K}':>9}")
+    try:
+        for size in args.sizes:
+            corpus, queries = make_corpus(size, args.queries)
+            truth = np.argsort(-(queries @ corpus.T), axis=1)[:, :K]
+            corpus_path = os.path.join(workdir, 'corpus.npy')
+            queries_path = os.path.join(workdir, 'queries.npy')
+            truth_path = os.path.join(workdir, 'truth.npy')
+            np.save(corpus_path, corpus)
+            np.save(queries_path, queries)
+            np.save(truth_path, truth)
+            del corpus
+
+            for backend in args.backends:
+                path = os.path.join(workdir, f'{backend}_{size}')
+                built = run_child('build', backend, path, corpus_path)
+                served = run_child('serve', backend, path, queries_path, truth_path)
+                print(f"{size:>8} {backend:>13} {built['build_s']:>8.1f} {disk_mb(path):>8.0f} "
+                      f"{served['open_s']:>7.2f} {served['heap_mb']:>8.0f} {served['mapped_mb']:>10.0f} {served['p50_ms']:>7.2f} "
+                      f"{served['p95_ms']:>7.2f} {served['recall']:>9.3f}")
+                shutil.rmtree(path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
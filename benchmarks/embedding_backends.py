@@ -0,0 +1,154 @@
+"""Compare MiniLM embedding backends: PyTorch, ONNX fp32 and ONNX int8.
+
+Each backend runs in its own process so load time and resident memory are
+measured separately. Reports model load time, RSS, document throughput,
+single-query latency, and the cosine similarity of each backend's vectors to
+the PyTorch ones; exits non-zero if a backend is below its MIN_COSINE threshold.
+
+Usage:
+    python onnx_embeddings.py export            # once, writes ./onnx_model
+    python benchmarks/embedding_backends.py [--texts 2000] [--queries 200] [--threads 4] [--batch-size 32]
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+BACKENDS = ['torch', 'onnx', 'onnx-int8']
+
+
+def rss_mb() -> float:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def corpus(args):
+    from fakes import synthetic_papers, synthetic_queries
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    # Chunked like process_papers does, so lengths match what ingest embeds
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    texts = []
+    for paper in synthetic_papers(args.texts):
+        texts.extend(splitter.split_text(f"{paper['title']}\n\n{paper['abstract']}"))
+        if len(texts) >= args.texts:
+            break
+    return texts[:args.texts], synthetic_queries(args.queries)
+
+
+def run_backend(args) -> dict:
+    """Measure one backend in this process; the vectors are written for the cosine comparison."""
+    import numpy as np
+    from rag_system import load_embeddings
+
+    texts, queries = corpus(args)
+    baseline = rss_mb()
+    start = time.perf_counter()
+    embeddings = load_embeddings(args.backend, args.threads)
+    embeddings.embed_query("dimension probe")
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectors = []
+    for i in range(0, len(texts), args.batch_size):
+        vectors.extend(embeddings.embed_documents(texts[i:i + args.batch_size]))
+    ingest_seconds = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        embeddings.embed_query(query)
+        latencies.append(time.perf_counter() - start)
+
+    np.save(args.vectors, np.asarray(vectors, dtype=np.float32))
+    return {
+        'backend': args.backend,
+        'load_seconds': load_seconds,
+        'rss_mb': rss_mb(),
+        'model_rss_mb': rss_mb() - baseline,
+        'texts_per_sec': len(texts) / ingest_seconds,
+        'query_p50_ms': percentile(latencies, 0.5) * 1000,
+        'query_p95_ms': percentile(latencies, 0.95) * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backends', nargs='+', default=BACKENDS, choices=BACKENDS)
+    parser.add_argument('--texts', type=int, default=2000, help="Chunks embedded for the throughput test")
+    parser.add_argument('--queries', type=int, default=200, help="Single queries for the latency test")
+    parser.add_argument('--threads', type=int, default=0, help="Intra-op threads (default: all cores)")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--output', help="Write the results as JSON")
+    parser.add_argument('--backend', help=argparse.SUPPRESS)
+    parser.add_argument('--vectors', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        print(json.dumps(run_backend(args)))
+        return
+
+    import numpy as np
+    from onnx_embeddings import MIN_COSINE, compare_vectors
+
+    workdir = tempfile.mkdtemp(prefix='documed_embed_bench_')
+    results = []
+    for backend in args.backends:
+        vectors_path = os.path.join(workdir, f"{backend}.npy")
+        command = [sys.executable, os.path.abspath(__file__), '--backend', backend, '--vectors', vectors_path,
+                   '--texts', str(args.texts), '--queries', str(args.queries), '--threads', str(args.threads),
+                   '--batch-size', str(args.batch_size)]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"{backend} failed:\n{completed.stderr.strip().splitlines()[-1] if completed.stderr else ''}")
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        result['vectors'] = vectors_path
+        results.append(result)
+
+    reference = next((result for result in results if result['backend'] == 'torch'), None)
+    below_threshold = []
+    print(f"{'backend':<10}{'load s':>8}{'RSS MB':>9}{'model MB':>10}{'texts/s':>10}{'q p50 ms':>10}{'q p95 ms':>10}"
+          f"{'min cos':>10}")
+    for result in results:
+        cosine = ''
+        if reference is not None and result is not reference:
+            similarity = compare_vectors(np.load(reference['vectors']), np.load(result['vectors']))
+            result['cosine'] = similarity
+            threshold = MIN_COSINE['int8' if result['backend'] == 'onnx-int8' else 'fp32']
+            cosine = f"{similarity['min']:.5f}"
+            if similarity['min'] < threshold:
+                cosine += f" (below {threshold})"
+                below_threshold.append(result['backend'])
+        print(f"{result['backend']:<10}{result['load_seconds']:>8.2f}{result['rss_mb']:>9.0f}{result['model_rss_mb']:>10.0f}"
+              f"{result['texts_per_sec']:>10.1f}{result['query_p50_ms']:>10.2f}{result['query_p95_ms']:>10.2f}  {cosine}")
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump([{key: value for key, value in result.items() if key != 'vectors'} for result in results], f, indent=2)
+    if below_threshold:
+        print(f"Vectors from {', '.join(below_threshold)} are not close enough to the PyTorch ones")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
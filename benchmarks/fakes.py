@@ -0,0 +1,148 @@
+"""Deterministic offline stand-ins for the parts of DocuMed that need the network or a model download:
+a synthetic paper corpus, hashing embeddings and a chat model with configurable latency."""
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from typing import Dict, Iterator, List
+import asyncio
+import hashlib
+import random
+import time
+import re
+import zlib
+
+import numpy as np
+
+DIM = 384
+
+TOPICS = [
+    ('hypertension', 'blood pressure', 'antihypertensive', 'cardiovascular'),
+    ('type 2 diabetes', 'insulin resistance', 'glycemic control', 'metformin'),
+    ('melasma', 'hyperpigmentation', 'tranexamic acid', 'dermatology'),
+    ('lymphoma', 'CAR-T', 'cytokine release', 'remission'),
+    ('COVID-19', 'SARS-CoV-2', 'nirmatrelvir', 'viral rebound'),
+    ('dementia', 'cognitive decline', 'amyloid', 'statins'),
+    ('sepsis', 'antibiotic resistance', 'bacteremia', 'intensive care'),
+    ('asthma', 'inhaled corticosteroids', 'airway inflammation', 'exacerbation'),
+    ('breast cancer', 'HER2', 'mammography', 'adjuvant therapy'),
+    ('depression', 'SSRI', 'psychotherapy', 'relapse'),
+    ('stroke', 'thrombectomy', 'anticoagulation', 'rehabilitation'),
+    ('influenza', 'vaccine effectiveness', 'hemagglutinin', 'hospitalization'),
+    ('chronic kidney disease', 'eGFR', 'SGLT2 inhibitors', 'dialysis'),
+    ('obesity', 'GLP-1 agonists', 'bariatric surgery', 'weight loss'),
+    ('tuberculosis', 'isoniazid', 'latent infection', 'drug resistance'),
+    ('malaria', 'artemisinin', 'Plasmodium falciparum', 'bed nets'),
+    ('osteoporosis', 'bone density', 'bisphosphonates', 'fracture risk'),
+    ('heart failure', 'ejection fraction', 'beta blockers', 'readmission'),
+    ('diabetic retinopathy', 'machine learning', 'fundus imaging', 'screening'),
+    ('HIV', 'antiretroviral therapy', 'viral load', 'pre-exposure prophylaxis'),
+]
+FINDINGS = ['reduced', 'increased', 'did not change', 'was associated with', 'significantly improved', 'worsened']
+OUTCOMES = ['mortality', 'hospital admissions', 'quality of life', 'adverse events', 'symptom scores',
+            'treatment adherence', 'length of stay', 'biomarker levels']
+POPULATIONS = ['older adults', 'children', 'pregnant women', 'outpatients', 'intensive care patients',
+               'primary care patients', 'a multicentre cohort', 'low-income settings']
+DESIGNS = ['randomized controlled trial', 'prospective cohort study', 'retrospective analysis',
+           'systematic review and meta-analysis', 'cross-sectional survey', 'case-control study']
+SOURCES = ['PubMed', 'bioRxiv', 'medRxiv', 'ScienceDirect', 'WHO Clinical Trials', 'Europe PMC']
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def synthetic_papers(count: int, seed: int = 0, start: int = 0) -> Iterator[Dict]:
+    """Scraped-paper dicts with abstracts of 100-250 words built from a fixed medical vocabulary.
+
+    Paper i is the same whatever range it is generated in.
+    """
+    for i in range(start, start + count):
+        rng = random.Random(f"{seed}:{i}")
+        topic = rng.choice(TOPICS)
+        design = rng.choice(DESIGNS)
+        population = rng.choice(POPULATIONS)
+        sentences = [f"We conducted a {design} of {topic[0]} in {population} (n={rng.randint(40, 20000)})."]
+        for _ in range(rng.randint(5, 10)):
+            sentences.append(
+                f"{rng.choice(topic).capitalize()} {rng.choice(FINDINGS)} {rng.choice(OUTCOMES)} "
+                f"in patients receiving {rng.choice(topic)} compared with controls "
+                f"(hazard ratio {rng.uniform(0.4, 1.8):.2f}, 95% CI {rng.uniform(0.2, 0.9):.2f}-{rng.uniform(1.0, 2.5):.2f})."
+            )
+        sentences.append(f"These findings inform the management of {topic[0]} and {rng.choice(topic)}.")
+        year = rng.randint(2015, 2025)
+        yield {
+            'title': f"{rng.choice(topic).capitalize()} and {rng.choice(OUTCOMES)} in {population}: "
+                     f"a {design} ({i})",
+            'abstract': ' '.join(sentences),
+            'date': f"{year} {rng.choice(MONTHS)} {rng.randint(1, 28)}",
+            'source': rng.choice(SOURCES),
+            'url': f"https://example.org/papers/{i}"
+        }
+
+
+def synthetic_queries(count: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    return [f"What is the effect of {rng.choice(topic)} on {rng.choice(OUTCOMES)} in {rng.choice(POPULATIONS)} "
+            f"with {topic[0]}? (q{i})" for i, topic in ((i, rng.choice(TOPICS)) for i in range(count))]
+
+
+class HashingEmbeddings(Embeddings):
+    """Bag-of-words feature hashing into 384 dimensions (MiniLM's size), L2-normalized."""
+
+    def __init__(self, dim: int = DIM):
+        self.dim = dim
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in TOKEN_RE.findall(text.lower()):
+                vectors[row, zlib.crc32(token.encode('utf-8')) % self.dim] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class FakeChatModel(BaseChatModel):
+    """Answers in the analysis format after a fixed delay, streaming evenly after the first token.
+
+    The answer depends only on the prompt, so runs are reproducible.
+    """
+
+    latency: float = 1.0
+    first_token_latency: float = 0.3
+    tokens: int = 80
+
+    @property
+    def _llm_type(self) -> str:
+        return 'documed-fake'
+
+    def _parts(self, messages) -> List[str]:
+        prompt = '\n'.join(str(message.content) for message in messages)
+        rng = random.Random(hashlib.sha1(prompt.encode('utf-8')).hexdigest())
+        words = TOKEN_RE.findall(prompt.lower()) or ['evidence']
+        text = ''
+        for number, section in enumerate(['Key Findings', 'Clinical Implications', 'Critical Analysis',
+                                          'Recommendations'], start=1):
+            text += f"{number}. {section}\n"
+            text += ' '.join(rng.choice(words) for _ in range(max(1, self.tokens // 4 - 3))) + '.\n'
+        return re.findall(r'\S+\s*', text)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=''.join(self._parts(messages))))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=''.join(self._parts(messages))))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        parts = self._parts(messages)
+        time.sleep(self.first_token_latency)
+        gap = max(0.0, self.latency - self.first_token_latency) / max(1, len(parts) - 1)
+        for i, part in enumerate(parts):
+            if i:
+                time.sleep(gap)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=part))
@@ -0,0 +1,107 @@
+"""Load-test a running DocuMed service (python cli.py serve) with concurrent /query requests.
+
+Each client thread keeps one connection open and sends questions back to
+back; reports throughput, latency percentiles and errors.
+
+Usage: python benchmarks/load_test.py [--url http://127.0.0.1:8000] [--clients 8] [--requests 200]
+                                      [--queries questions.txt] [--batch 0]
+"""
+from urllib.parse import urlparse
+import argparse
+import http.client
+import json
+import statistics
+import threading
+import time
+
+DEFAULT_QUERIES = [
+    "What are the latest treatments for melasma?",
+    "Hypertension management in older adults",
+    "CAR-T therapy outcomes in lymphoma",
+    "Paxlovid rebound after COVID-19 treatment",
+    "Long-term effects of statins on dementia risk",
+    "Antibiotic resistance in hospital-acquired infections",
+    "Machine learning for diabetic retinopathy screening",
+    "Vaccine effectiveness against new influenza strains"
+]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def client(url, queries, count, batch, offset, latencies, errors, lock):
+    target = urlparse(url)
+    conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=300)
+    for i in range(count):
+        index = offset + i
+        if batch:
+            path = '/query/batch'
+            body = {'queries': [queries[(index * batch + j) % len(queries)] for j in range(batch)]}
+        else:
+            path = '/query'
+            body = {'query': queries[index % len(queries)]}
+        start = time.perf_counter()
+        try:
+            conn.request('POST', path, body=json.dumps(body), headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            payload = response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=300)
+            ok, payload = False, str(e).encode()
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors.append(payload[:200])
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help="Total requests across all clients")
+    parser.add_argument('--queries', help="File with one question per line")
+    parser.add_argument('--batch', type=int, default=0, help="Send /query/batch requests of this many questions")
+    args = parser.parse_args()
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, 'r') as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+    per_client = [args.requests // args.clients + (1 if i < args.requests % args.clients else 0)
+                  for i in range(args.clients)]
+    threads = []
+    offset = 0
+    for count in per_client:
+        threads.append(threading.Thread(target=client, args=(args.url, queries, count, args.batch, offset,
+                                                             latencies, errors, lock)))
+        offset += count
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = time.perf_counter() - start
+
+    questions = len(latencies) * max(1, args.batch)
+    print(f"{len(latencies)} requests ({questions} questions) in {total:.2f}s with {args.clients} clients: "
+          f"{len(latencies) / total:.1f} req/s, {questions / total:.1f} questions/s")
+    if latencies:
+        print(f"Latency p50 {percentile(latencies, 0.5) * 1000:.0f} ms, p95 {percentile(latencies, 0.95) * 1000:.0f} ms, "
+              f"p99 {percentile(latencies, 0.99) * 1000:.0f} ms, mean {statistics.mean(latencies) * 1000:.0f} ms")
+    if errors:
+        print(f"{len(errors)} errors, e.g. {errors[0]!r}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""End-to-end benchmark of scraping, ingest, retrieval and querying, fully offline.
+
+Scraping runs against local fixture servers; ingest and queries run on a
+synthetic corpus with a deterministic fake LLM (and optionally hashing
+embeddings instead of MiniLM). Results are written as JSON named after the
+git commit, so two runs can be compared.
+
+Usage:
+    python benchmarks/run_suite.py [--papers 10000] [--queries 200] [--e2e-queries 50]
+                                   [--llm-latency 1.0] [--fake-embeddings] [--vector-backend quantized]
+    python benchmarks/run_suite.py --compare benchmarks/results/BASE.json benchmarks/results/NEW.json
+"""
+from contextlib import redirect_stdout
+from datetime import datetime
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+os.environ.setdefault('GROQ_API_KEY', 'benchmark')
+
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+STAGES = ['scrape', 'ingest', 'retrieval', 'e2e']
+# (stage, metric, unit, whether higher is better) as reported and compared
+METRICS = [
+    ('scrape', 'seconds', 's', False),
+    ('scrape', 'repeat_seconds', 's', False),
+    ('ingest', 'seconds', 's', False),
+    ('ingest', 'chunks_per_sec', '/s', True),
+    ('retrieval', 'p50_ms', 'ms', False),
+    ('retrieval', 'p95_ms', 'ms', False),
+    ('retrieval', 'p99_ms', 'ms', False),
+    ('e2e', 'p50_ms', 'ms', False),
+    ('e2e', 'p95_ms', 'ms', False),
+    ('e2e', 'p99_ms', 'ms', False),
+    ('e2e', 'ttft_p50_ms', 'ms', False),
+    ('memory', 'peak_rss_mb', 'MB', False),
+]
+
+
+def git_commit() -> dict:
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    return {'commit': git('rev-parse', '--short', 'HEAD') or 'unknown', 'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(samples) -> dict:
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000
+    return {'p50_ms': pick(0.5), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99), 'count': len(ordered)}
+
+
+def bench_scrape(args) -> dict:
+    from stub_server import start_stub_servers, SOURCES
+    from scraper import MedicalPaperScraper
+
+    servers = start_stub_servers({name: args.scrape_latency for name in SOURCES})
+    try:
+        sources = [server.url for server in servers.values()]
+        start = time.perf_counter()
+        scraper = MedicalPaperScraper(sources)
+        papers = scraper.run_scraper()
+        seconds = time.perf_counter() - start
+        scraper.commit_fetch_state()
+        downloaded = sum(stats['bytes'] for stats in scraper.fetch_stats.values())
+        # Second refresh of unchanged listings: conditional GETs come back 304
+        start = time.perf_counter()
+        MedicalPaperScraper(sources).run_scraper()
+        repeat_seconds = time.perf_counter() - start
+    finally:
+        for server in servers.values():
+            server.stop()
+    return {'seconds': seconds, 'repeat_seconds': repeat_seconds, 'papers': len(papers), 'kb': downloaded / 1024}
+
+
+def bench_ingest(rag, args) -> dict:
+    from fakes import synthetic_papers
+
+    start = time.perf_counter()
+    for offset in range(0, args.papers, args.ingest_batch):
+        count = min(args.ingest_batch, args.papers - offset)
+        rag.process_papers(list(synthetic_papers(count, start=offset)))
+        print(f"[ingest] {offset + count} papers in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    seconds = time.perf_counter() - start
+    chunks = rag.vectorstore._collection.count()
+    return {'seconds': seconds, 'papers': args.papers, 'chunks': chunks, 'chunks_per_sec': chunks / seconds}
+
+
+def bench_retrieval(rag, args) -> dict:
+    from fakes import synthetic_queries
+
+    queries = synthetic_queries(args.queries)
+    rag.retrieve(queries[0])
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        rag.retrieve(query, k=5)
+        samples.append(time.perf_counter() - start)
+    return {'mode': rag.retrieval_mode, **percentiles(samples)}
+
+
+def bench_e2e(rag, args) -> dict:
+    from fakes import synthetic_queries
+
+    # Different questions from the retrieval stage, so nothing is answered from the cache
+    queries = synthetic_queries(args.e2e_queries, seed=2)
+    samples, first_tokens = [], []
+    cached = 0
+    for query in queries:
+        start = time.perf_counter()
+        for event in rag.stream_query_papers(query):
+            if event['type'] == 'done':
+                cached += event['cached']
+                if event['time_to_first_token'] is not None:
+                    first_tokens.append(event['time_to_first_token'])
+        samples.append(time.perf_counter() - start)
+    result = {'llm_latency': args.llm_latency, 'cached': cached, **percentiles(samples)}
+    if first_tokens:
+        result['ttft_p50_ms'] = percentiles(first_tokens)['p50_ms']
+    return result
+
+
+def run_suite(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix='documed_suite_')
+    os.environ.update({
+        'EMBEDDING_CACHE_DIR': os.path.join(workdir, 'embedding_cache'),
+        'CATALOG_PATH': os.path.join(workdir, 'paper_catalog.sqlite3'),
+        'FETCH_STATE_PATH': os.path.join(workdir, 'fetch_state.json'),
+        'BACKUP_DIR': os.path.join(workdir, 'paper_backups'),
+        'VECTOR_BACKEND': args.vector_backend
+    })
+    sys.path.insert(0, BENCH_DIR)
+    from fakes import FakeChatModel, HashingEmbeddings
+    from rag_system import MedicalRAG
+
+    results = {}
+    log_path = os.path.join(workdir, 'suite.log')
+    try:
+        # The system's own progress output goes to a log instead of the report
+        with open(log_path, 'w') as log, redirect_stdout(log):
+            if 'scrape' in args.stages:
+                results['scrape'] = bench_scrape(args)
+                print(f"[scrape] {results['scrape']}", file=sys.stderr)
+
+            rag = MedicalRAG(
+                persist_directory=os.path.join(workdir, 'chroma_db'),
+                embeddings=HashingEmbeddings() if args.fake_embeddings else None,
+                llm=FakeChatModel(latency=args.llm_latency, first_token_latency=args.llm_first_token)
+            )
+            for stage, bench in (('ingest', bench_ingest), ('retrieval', bench_retrieval), ('e2e', bench_e2e)):
+                if stage in args.stages:
+                    results[stage] = bench(rag, args)
+                    print(f"[{stage}] {results[stage]}", file=sys.stderr)
+        results['memory'] = {'peak_rss_mb': peak_rss_mb()}
+    finally:
+        if args.keep:
+            print(f"Working directory kept at {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def print_report(report: dict):
+    print(f"commit {report['commit']}{' (dirty)' if report['dirty'] else ''}, {report['timestamp']}")
+    for stage, metric, unit, _ in METRICS:
+        value = report['results'].get(stage, {}).get(metric)
+        if value is not None:
+            print(f"  {stage:<10} {metric:<15} {value:>10.2f} {unit}")
+
+
+def compare(base_path: str, new_path: str, threshold: float) -> int:
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{'':<27}{base['commit']:>12}{new['commit']:>12}{'change':>10}")
+    regressions = 0
+    for stage, metric, unit, higher_is_better in METRICS:
+        before = base['results'].get(stage, {}).get(metric)
+        after = new['results'].get(stage, {}).get(metric)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        worse = -change if higher_is_better else change
+        flag = ''
+        if worse > threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"  {stage:<10} {metric:<15}{before:>12.2f}{after:>12.2f}{change:>+9.1f}%{flag}")
+    if base.get('params') != new.get('params'):
+        print("Note: the runs used different parameters")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--papers', type=int, default=10000)
+    parser.add_argument('--ingest-batch', type=int, default=1000, help="Papers per process_papers call")
+    parser.add_argument('--queries', type=int, default=200, help="Retrieval-only queries")
+    parser.add_argument('--e2e-queries', type=int, default=50, help="Full streamed queries through the fake LLM")
+    parser.add_argument('--llm-latency', type=float, default=1.0, help="Seconds per fake LLM answer")
+    parser.add_argument('--llm-first-token', type=float, default=0.3, help="Seconds to the fake LLM's first token")
+    parser.add_argument('--scrape-latency', type=float, default=0.2, help="Seconds per fixture page")
+    parser.add_argument('--fake-embeddings', action='store_true', help="Hashing embeddings instead of MiniLM")
+    parser.add_argument('--vector-backend', default=os.getenv('VECTOR_BACKEND', 'chroma'))
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES)
+    parser.add_argument('--output', help="Result file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument('--keep', action='store_true', help="Keep the working directory")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help="Compare two result files and exit")
+    parser.add_argument('--threshold', type=float, default=10.0, help="Percent change flagged as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    report = {
+        **git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'params': {key: value for key, value in vars(args).items() if key not in ('output', 'keep', 'compare', 'threshold')}
+    }
+    report['results'] = run_suite(args)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{report['commit']}{'-dirty' if report['dirty'] else ''}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"Saved {output}")
+
+
+if __name__ == '__main__':
+    main()
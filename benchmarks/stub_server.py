@@ -0,0 +1,71 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from email.utils import formatdate
+from typing import Dict
+import hashlib
+import threading
+import time
+import os
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+SOURCES = ['pubmed', 'biorxiv', 'medrxiv', 'sciencedirect', 'who', 'europepmc']
+
+
+class StubServer:
+    """Serves one fixture listing page from localhost after an injected delay.
+
+    With validators on, responses carry an ETag and Last-Modified and
+    conditional requests for an unchanged page get 304 Not Modified.
+    """
+
+    def __init__(self, name: str, latency: float = 0.0, validators: bool = True):
+        with open(os.path.join(FIXTURES_DIR, f'{name}.html'), 'rb') as f:
+            body = f.read()
+        self.name = name
+        self.latency = latency
+        self.requests = 0
+        self.not_modified = 0
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        last_modified = formatdate(usegmt=True)
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                time.sleep(stub.latency)
+                if validators and self.headers.get('If-None-Match') == etag:
+                    stub.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                if validators:
+                    self.send_header('ETag', etag)
+                    self.send_header('Last-Modified', last_modified)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/{self.name}"
+
+    def start(self) -> 'StubServer':
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_stub_servers(latencies: Dict[str, float], validators: bool = True) -> Dict[str, StubServer]:
+    """Start one server per source so each source is a distinct host:port."""
+    return {name: StubServer(name, latency, validators).start() for name, latency in latencies.items()}
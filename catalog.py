@@ -0,0 +1,215 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from paper_utils import paper_id, content_hash, normalize_date, date_ordinal
+import itertools
+import hashlib
+import heapq
+import sqlite3
+import threading
+import json
+import os
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    paper_id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    title_hash TEXT NOT NULL,
+    abstract TEXT,
+    date TEXT,
+    published TEXT,
+    published_ord INTEGER,
+    source TEXT,
+    url TEXT,
+    content_hash TEXT,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    -- Newest first (undated last) as an ascending key, so every listing order sorts ascending
+    date_rank INTEGER GENERATED ALWAYS AS (-IFNULL(published_ord, 0)) VIRTUAL
+);
+-- One index per listing order (with and without a source filter), so a page is an index
+-- seek to the last row of the previous page followed by a short range scan
+CREATE INDEX IF NOT EXISTS idx_papers_date_order ON papers (date_rank, paper_id);
+CREATE INDEX IF NOT EXISTS idx_papers_source_order ON papers (source, date_rank, paper_id);
+CREATE INDEX IF NOT EXISTS idx_papers_title_order ON papers (title, paper_id);
+CREATE INDEX IF NOT EXISTS idx_papers_source_title_order ON papers (source, title, paper_id);
+CREATE INDEX IF NOT EXISTS idx_papers_title_hash ON papers (title_hash);
+CREATE INDEX IF NOT EXISTS idx_papers_first_seen ON papers (first_seen DESC);
+CREATE TABLE IF NOT EXISTS catalog_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS imported_backups (
+    filename TEXT PRIMARY KEY,
+    imported_at TEXT NOT NULL
+);
+"""
+
+# Key columns of each listing order; a page cursor is their values on the previous page's last row
+SORT_KEYS = {
+    'date': ['date_rank', 'paper_id'],
+    'source': ['source', 'date_rank', 'paper_id'],
+    'title': ['title', 'paper_id']
+}
+
+COLUMNS = ['paper_id', 'title', 'abstract', 'date', 'published', 'source', 'url', 'first_seen', 'last_seen']
+
+
+def title_hash(title: str) -> str:
+    normalized = ' '.join((title or '').lower().split())
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+class PaperCatalog:
+    """Append-only SQLite record of every scraped paper, indexed for listing and lookups."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv('CATALOG_PATH', './paper_catalog.sqlite3')
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers proceed while the scraper writes
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def add_papers(self, papers: List[Dict]) -> int:
+        """Record papers, keeping first_seen for ones already known; returns the number of new papers."""
+        now = datetime.now().isoformat()
+        rows = {}
+        for paper in papers:
+            published = paper.get('published') or normalize_date(paper['date'])
+            pid = paper_id(paper)
+            rows[pid] = (
+                pid, paper['title'], title_hash(paper['title']), paper['abstract'], paper['date'],
+                published, date_ordinal(published), paper['source'], paper['url'], content_hash(paper), now, now
+            )
+        if not rows:
+            return 0
+
+        conn = self._connection()
+        ids = list(rows)
+        known = set()
+        with conn:
+            # Take the write lock first, so concurrent writers don't both count the same paper as new
+            conn.execute('BEGIN IMMEDIATE')
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                query = f"SELECT paper_id FROM papers WHERE paper_id IN ({', '.join('?' for _ in batch)})"
+                known.update(row[0] for row in conn.execute(query, batch))
+
+            conn.executemany("""
+                INSERT INTO papers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(paper_id) DO UPDATE SET
+                    abstract = excluded.abstract,
+                    date = excluded.date,
+                    published = excluded.published,
+                    published_ord = excluded.published_ord,
+                    content_hash = excluded.content_hash,
+                    last_seen = excluded.last_seen
+            """, list(rows.values()))
+            # Per-source totals, so counting a listing doesn't scan it
+            added = {}
+            for pid, row in rows.items():
+                if pid not in known:
+                    added[row[7]] = added.get(row[7], 0) + 1
+            conn.executemany("""
+                INSERT INTO catalog_meta VALUES (?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = value + excluded.value
+            """, [(f"papers:{source}", count) for source, count in added.items()])
+            conn.execute("""
+                INSERT INTO catalog_meta VALUES ('version', 1)
+                ON CONFLICT(key) DO UPDATE SET value = value + 1
+            """)
+        return len(rows) - len(known)
+
+    def version(self) -> int:
+        """Counter bumped on every write, for keying cached query results."""
+        row = self._connection().execute("SELECT value FROM catalog_meta WHERE key = 'version'").fetchone()
+        return row[0] if row else 0
+
+    def import_backups(self, backup_dir: str) -> int:
+        """Load legacy papers_YYYYMMDD.json backups that have not been imported yet."""
+        if not os.path.isdir(backup_dir):
+            return 0
+        conn = self._connection()
+        imported = {row[0] for row in conn.execute('SELECT filename FROM imported_backups')}
+        added = 0
+        for filename in sorted(os.listdir(backup_dir)):
+            if not filename.endswith('.json') or filename in imported:
+                continue
+            with open(os.path.join(backup_dir, filename), 'r') as f:
+                added += self.add_papers(json.load(f))
+            with conn:
+                conn.execute('INSERT INTO imported_backups VALUES (?, ?)', (filename, datetime.now().isoformat()))
+            print(f"Imported {filename} into the paper catalog")
+        return added
+
+    def _where(self, sources: Optional[List[str]]):
+        if not sources:
+            return '', []
+        return f"WHERE source IN ({', '.join('?' for _ in sources)})", list(sources)
+
+    def list_papers(self, sources: Optional[List[str]] = None, sort_by: str = 'date', limit: int = 50,
+                    after: Optional[Tuple] = None) -> Tuple[List[Dict], Optional[Tuple]]:
+        """One page of papers and the cursor for the next one (None on the last page).
+
+        ``after`` is the cursor returned with the previous page; the query
+        seeks straight to it, so deep pages cost the same as the first.
+        """
+        keys = SORT_KEYS[sort_by]
+        if sources and len(sources) > 1:
+            # One seek per source, merged here; a single IN query would sort everything past the cursor
+            rows = heapq.merge(*(self._page_rows([source], keys, limit + 1, after) for source in sources),
+                               key=lambda row: tuple(row[len(COLUMNS):]))
+            rows = list(itertools.islice(rows, limit + 1))
+        else:
+            rows = self._page_rows(sources, keys, limit + 1, after)
+        papers = [{column: row[column] for column in COLUMNS} for row in rows[:limit]]
+        cursor = tuple(rows[limit - 1][len(COLUMNS):]) if len(rows) > limit else None
+        return papers, cursor
+
+    def _page_rows(self, sources: Optional[List[str]], keys: List[str], limit: int,
+                   after: Optional[Tuple]) -> List[sqlite3.Row]:
+        where, params = self._where(sources)
+        if after is not None:
+            clause = f"({', '.join(keys)}) > ({', '.join('?' for _ in keys)})"
+            where = f"{where} AND {clause}" if where else f"WHERE {clause}"
+            params += list(after)
+        return self._connection().execute(
+            f"SELECT {', '.join(COLUMNS)}, {', '.join(keys)} FROM papers {where} "
+            f"ORDER BY {', '.join(keys)} LIMIT ?",
+            params + [limit]
+        ).fetchall()
+
+    def count(self, sources: Optional[List[str]] = None) -> int:
+        """Number of papers (from the given sources), from totals kept up to date by add_papers."""
+        rows = self._connection().execute("SELECT key, value FROM catalog_meta WHERE key LIKE 'papers:%'")
+        counts = {key[len('papers:'):]: value for key, value in rows}
+        return sum(counts.get(source, 0) for source in sources) if sources else sum(counts.values())
+
+    def sources(self) -> List[str]:
+        return [row[0] for row in self._connection().execute('SELECT DISTINCT source FROM papers ORDER BY source')]
+
+    def recent(self, limit: int = 10) -> List[Dict]:
+        rows = self._connection().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM papers ORDER BY first_seen DESC, published_ord DESC LIMIT ?",
+            (limit,)
+        )
+        return [dict(row) for row in rows]
+
+    def get(self, pid: str) -> Optional[Dict]:
+        row = self._connection().execute(f"SELECT {', '.join(COLUMNS)} FROM papers WHERE paper_id = ?", (pid,)).fetchone()
+        return dict(row) if row else None
+
+    def find_by_title(self, title: str) -> List[Dict]:
+        rows = self._connection().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM papers WHERE title_hash = ?",
+            (title_hash(title),)
+        )
+        return [dict(row) for row in rows]
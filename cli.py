@@ -0,0 +1,108 @@
+"""Command-line entry point for running DocuMed without the Streamlit UI.
+
+Usage:
+    python cli.py serve [--host 0.0.0.0] [--port 8000] [--workers 4]
+    python cli.py query "statins and dementia" ["second question" ...] [--source PubMed] [--since 2025-01-01] [--json]
+    python cli.py query --file questions.txt [--concurrency 8] [--json]
+    python cli.py ingest [--backfill paper_backups/*.json]
+    python cli.py status
+"""
+from contextlib import redirect_stdout
+import argparse
+import json
+import sys
+from service import serve, system_status, parse_date, SERVICE_HOST, SERVICE_PORT, SERVICE_WORKERS
+from refresh_worker import run_refresh
+from rag_system import MedicalRAG
+from catalog import PaperCatalog
+
+
+def print_result(result: dict):
+    print(result['analysis'])
+    for i, paper in enumerate(result.get('papers', []), start=1):
+        print(f"  [{i}] {paper['title']} ({paper['source']}, {paper['date']}) {paper['url']}")
+
+
+def command_serve(args):
+    serve(args.host, args.port, args.workers)
+
+
+def command_query(args):
+    queries = list(args.queries)
+    if args.file:
+        with open(args.file, 'r') as f:
+            queries += [line.strip() for line in f if line.strip()]
+    if not queries:
+        sys.exit("No queries given")
+    filters = {'sources': args.source, 'since': parse_date(args.since), 'until': parse_date(args.until)}
+
+    # With --json, stdout carries only the JSON; progress output goes to stderr
+    with redirect_stdout(sys.stderr if args.json else sys.stdout):
+        rag = MedicalRAG()
+        if len(queries) == 1:
+            results = [rag.query_papers(queries[0], **filters)]
+        else:
+            results = [None] * len(queries)
+            for event in rag.query_many(queries, concurrency=args.concurrency, **filters):
+                if event['type'] == 'summary':
+                    continue
+                results[event['index']] = event
+                if args.json:
+                    continue
+                print(f"\n=== {event['query']}")
+                if event['error']:
+                    print(f"Error: {event['error']}")
+                else:
+                    print_result(event)
+
+    if args.json:
+        print(json.dumps(results if len(results) > 1 else results[0], default=str, indent=2))
+    elif len(results) == 1:
+        print_result(results[0])
+
+
+def command_ingest(args):
+    result = run_refresh(backfill=args.backfill)
+    if result is None:
+        sys.exit(1)
+
+
+def command_status(args):
+    with redirect_stdout(sys.stderr):
+        status = system_status(MedicalRAG(), PaperCatalog())
+    print(json.dumps(status, default=str, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DocuMed ingestion and query tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help="Run the HTTP API")
+    serve_parser.add_argument('--host', default=SERVICE_HOST)
+    serve_parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    serve_parser.add_argument('--workers', type=int, default=SERVICE_WORKERS)
+    serve_parser.set_defaults(handler=command_serve)
+
+    query = commands.add_parser('query', help="Answer one or more questions")
+    query.add_argument('queries', nargs='*')
+    query.add_argument('--file', help="Read additional questions from a file, one per line")
+    query.add_argument('--source', action='append', help="Limit to a source (repeatable)")
+    query.add_argument('--since', help="Published on or after (YYYY-MM-DD)")
+    query.add_argument('--until', help="Published on or before (YYYY-MM-DD)")
+    query.add_argument('--concurrency', type=int, default=4, help="Concurrent LLM calls for several questions")
+    query.add_argument('--json', action='store_true', help="Print results as JSON")
+    query.set_defaults(handler=command_query)
+
+    ingest = commands.add_parser('ingest', help="Scrape the sources and index new papers")
+    ingest.add_argument('--backfill', nargs='+', metavar='PATH', help="Index JSON backup files instead of scraping")
+    ingest.set_defaults(handler=command_ingest)
+
+    status = commands.add_parser('status', help="Show paper and index counts")
+    status.set_defaults(handler=command_status)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import re
+
+HEADER_LABELS = {'title': 'Title', 'date': 'Date', 'source': 'Source', 'url': 'URL'}
+# Chunks of one paper overlap by up to the splitter's chunk_overlap characters
+MIN_OVERLAP = 20
+MAX_OVERLAP = 400
+
+APPROX_TOKEN_RE = re.compile(r"\w{1,4}|[^\w\s]")
+ABSTRACT_LABEL_RE = re.compile(r'^\s*Abstract:\s*|(?<=\s)Abstract:\s*')
+BLANK_LINES_RE = re.compile(r'\s*\n\s*')
+
+
+class TokenCounter:
+    """Counts tokens with tiktoken when it is installed and its encoding is available locally.
+
+    Otherwise falls back to an approximation (words split into 4-character
+    pieces plus punctuation), which tracks BPE counts closely for English.
+    """
+
+    def __init__(self, encoding_name: str = 'cl100k_base'):
+        self.encoding = None
+        self.name = 'approximate'
+        try:
+            import tiktoken
+            self.encoding = tiktoken.get_encoding(encoding_name)
+            self.name = encoding_name
+        except Exception:
+            pass
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return len(APPROX_TOKEN_RE.findall(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ''
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            return text if len(tokens) <= max_tokens else self.encoding.decode(tokens[:max_tokens])
+        for i, match in enumerate(APPROX_TOKEN_RE.finditer(text)):
+            if i == max_tokens:
+                return text[:match.start()].rstrip()
+        return text
+
+
+def merge_overlap(previous: str, following: str) -> str:
+    """Join consecutive chunks of one paper, dropping the text they share."""
+    limit = min(len(previous), len(following), MAX_OVERLAP)
+    for size in range(limit, MIN_OVERLAP - 1, -1):
+        if previous.endswith(following[:size]):
+            return previous + following[size:]
+    return previous + ' ' + following
+
+
+class ContextAssembler:
+    """Builds the LLM context from retrieved chunks.
+
+    Chunks are grouped per paper in order of each paper's best rank; adjacent
+    chunks are merged without their overlap, the Title/Date/Source/URL lines
+    found in them are replaced by one compact header per paper (the URL by
+    the paper's number, which matches the referenced papers list), and
+    papers are packed into the token budget, headers included, truncating
+    the last one that only partly fits.
+    """
+
+    def __init__(self, token_budget: int = 3000, counter: Optional[TokenCounter] = None, min_tokens: int = 64):
+        self.token_budget = token_budget
+        self.counter = counter or TokenCounter()
+        self.min_tokens = min_tokens
+
+    def _group(self, docs) -> "OrderedDict[str, Dict]":
+        papers: "OrderedDict[str, Dict]" = OrderedDict()
+        for rank, doc in enumerate(docs):
+            metadata = doc.metadata or {}
+            key = metadata.get('paper_id') or f"doc-{rank}"
+            paper = papers.setdefault(key, {'metadata': metadata, 'chunks': {}, 'raw': []})
+            paper['chunks'].setdefault(metadata.get('chunk_index', 0), doc.page_content)
+            paper['raw'].append(doc.page_content)
+        return papers
+
+    @staticmethod
+    def _body(metadata: Dict, chunks: Dict[int, str]) -> Tuple[str, Dict]:
+        """The merged text without its labelled fields, and the fields that were removed from it."""
+        text = ''
+        previous_index = None
+        for index in sorted(chunks):
+            chunk = chunks[index]
+            if not text:
+                text = chunk
+            elif index == previous_index + 1:
+                text = merge_overlap(text, chunk)
+            else:
+                text += ' ... ' + chunk
+            previous_index = index
+
+        # Drop the labelled fields paper_text wraps around every abstract; the splitter may
+        # have joined them onto one line with the text, so match the exact values anywhere
+        found = {}
+        for field, label in HEADER_LABELS.items():
+            labelled = f"{label}: {metadata[field]}" if metadata.get(field) else None
+            if labelled and labelled in text:
+                text = text.replace(labelled, '')
+                found[field] = metadata[field]
+        text = ABSTRACT_LABEL_RE.sub('', text, count=1)
+        return BLANK_LINES_RE.sub('\n', text).strip(), found
+
+    @staticmethod
+    def _header(number: int, found: Dict) -> str:
+        # Only fields the retrieved text carried, so the header never adds tokens of its own
+        header = f"[{number}]"
+        if found.get('title'):
+            header += f" {found['title']}"
+        details = ', '.join(found[field] for field in ('source', 'date') if found.get(field))
+        if details:
+            header += f" ({details})"
+        return header
+
+    def assemble(self, docs) -> Tuple[str, Dict]:
+        """Return the context string and token statistics for the given ranked chunks."""
+        separator_tokens = self.counter.count("\n\n")
+        blocks = []
+        # What the same papers cost as plain joined chunks, and as untruncated blocks
+        raw = []
+        full_blocks = []
+        header_tokens = 0
+        used = 0
+        truncated = False
+        for paper in self._group(docs).values():
+            body, found = self._body(paper['metadata'], paper['chunks'])
+            if not body and not found:
+                continue
+            header = self._header(len(blocks) + 1, found)
+            block = f"{header}\n{body}" if body else header
+            full_block = block
+            tokens = self.counter.count(block) + separator_tokens
+            remaining = self.token_budget - used
+            if tokens > remaining:
+                truncated = True
+                header_cost = self.counter.count(header + "\n") + separator_tokens
+                if remaining - header_cost < self.min_tokens:
+                    break
+                block = f"{header}\n{self.counter.truncate(body, remaining - header_cost)}"
+                tokens = self.counter.count(block) + separator_tokens
+            blocks.append(block)
+            full_blocks.append(full_block)
+            raw.extend(paper['raw'])
+            header_tokens += self.counter.count(header)
+            used += tokens
+
+        context = "\n\n".join(blocks)
+        context_tokens = self.counter.count(context)
+        raw_tokens = self.counter.count("\n\n".join(raw))
+        return context, {
+            'tokenizer': self.counter.name,
+            'chunks': len(docs),
+            'papers': len(blocks),
+            'raw_tokens': raw_tokens,
+            'context_tokens': context_tokens,
+            'header_tokens': header_tokens,
+            # Merging and header savings only; tokens cut by the budget are not counted as saved
+            'tokens_saved': raw_tokens - self.counter.count("\n\n".join(full_blocks)),
+            'truncated': truncated
+        }
@@ -0,0 +1,201 @@
+"""Near-duplicate detection for papers published on several sources (PubMed, Europe PMC, medRxiv, ...).
+
+Each paper gets a MinHash signature over word shingles of its title and
+abstract. Signatures are split into LSH bands stored in SQLite, so finding
+the candidates for a new paper is a few index lookups however many papers
+are indexed. Candidates are confirmed by their estimated Jaccard similarity,
+and a paper joins the cluster of its closest match; the first paper seen in
+a cluster is its canonical id.
+
+Usage:
+    python dedup.py build     # index every paper in the catalog, oldest first
+    python dedup.py stats
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+import argparse
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+import re
+import os
+
+import numpy as np
+
+from paper_utils import paper_id
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    paper_id TEXT PRIMARY KEY,
+    canonical_id TEXT NOT NULL,
+    signature BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_signatures_canonical ON signatures (canonical_id);
+CREATE TABLE IF NOT EXISTS bands (
+    band INTEGER NOT NULL,
+    hash INTEGER NOT NULL,
+    paper_id TEXT NOT NULL,
+    PRIMARY KEY (band, hash, paper_id)
+) WITHOUT ROWID;
+"""
+
+# Smallest prime above 2^32, so (a * x + b) with 32-bit a, b and x fits in uint64
+PRIME = np.uint64(4294967311)
+WORD_RE = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = 3) -> np.ndarray:
+    """32-bit hashes of the distinct word n-grams in the lowercased text."""
+    words = WORD_RE.findall(text.lower())
+    if len(words) < size:
+        grams = {' '.join(words)} if words else set()
+    else:
+        grams = {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint64, count=len(grams))
+
+
+class NearDuplicateIndex:
+    """Persistent MinHash/LSH index mapping every paper id to the canonical id of its duplicate cluster.
+
+    With 32 bands of 4 rows, pairs at Jaccard 0.5 become candidates about
+    87% of the time and pairs at 0.7 over 99%; candidates below
+    ``threshold`` are rejected.
+    """
+
+    def __init__(self, path: str, num_perm: int = 128, bands: int = 32, threshold: float = 0.5,
+                 min_shingles: int = 10, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.path = path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        # Title-only or near-empty records are too short to compare reliably
+        self.min_shingles = min_shingles
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 2 ** 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 2 ** 32, size=num_perm, dtype=np.uint64)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def paper_text(paper: Dict) -> str:
+        return f"{paper.get('title', '')} {paper.get('abstract', '')}"
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature (num_perm uint32 values), or None if the text is too short."""
+        hashes = shingles(text)
+        if len(hashes) < self.min_shingles:
+            return None
+        permuted = (hashes[:, None] * self._a + self._b) % PRIME
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_hashes(self, signature: np.ndarray) -> List[int]:
+        rows = signature.reshape(self.bands, self.rows)
+        return [int.from_bytes(hashlib.blake2b(row.tobytes(), digest_size=8).digest(), 'big', signed=True)
+                for row in rows]
+
+    def _candidates(self, conn: sqlite3.Connection, band_hashes: List[int]) -> List[Tuple[str, str, bytes]]:
+        clauses = ' OR '.join('(band = ? AND hash = ?)' for _ in band_hashes)
+        params = [value for band, band_hash in enumerate(band_hashes) for value in (band, band_hash)]
+        return conn.execute(f"""
+            SELECT s.paper_id, s.canonical_id, s.signature FROM signatures s
+            WHERE s.paper_id IN (SELECT paper_id FROM bands WHERE {clauses})
+        """, params).fetchall()
+
+    def assign(self, papers: Iterable[Dict]) -> Dict[str, str]:
+        """Canonical id for each paper, indexing the ones not seen before.
+
+        Papers are matched against the index and against earlier papers in
+        the same call; a known paper keeps the canonical id it was given.
+        """
+        conn = self._connection()
+        canonical = {}
+        with conn:
+            for paper in papers:
+                pid = paper_id(paper)
+                if pid in canonical:
+                    continue
+                row = conn.execute("SELECT canonical_id FROM signatures WHERE paper_id = ?", (pid,)).fetchone()
+                if row:
+                    canonical[pid] = row[0]
+                    continue
+                signature = self.signature(self.paper_text(paper))
+                if signature is None:
+                    canonical[pid] = pid
+                    continue
+
+                band_hashes = self._band_hashes(signature)
+                best, best_similarity = pid, self.threshold
+                for other_id, other_canonical, blob in self._candidates(conn, band_hashes):
+                    similarity = float(np.mean(np.frombuffer(blob, dtype=np.uint32) == signature))
+                    if similarity >= best_similarity:
+                        best, best_similarity = other_canonical, similarity
+                canonical[pid] = best
+
+                conn.execute("INSERT INTO signatures VALUES (?, ?, ?)", (pid, best, signature.tobytes()))
+                conn.executemany("INSERT OR IGNORE INTO bands VALUES (?, ?, ?)",
+                                 [(band, band_hash, pid) for band, band_hash in enumerate(band_hashes)])
+        return canonical
+
+    def canonical_id(self, pid: str) -> str:
+        row = self._connection().execute("SELECT canonical_id FROM signatures WHERE paper_id = ?", (pid,)).fetchone()
+        return row[0] if row else pid
+
+    def cluster(self, canonical: str) -> List[str]:
+        """Every paper id in a duplicate cluster, the canonical one included."""
+        rows = self._connection().execute("SELECT paper_id FROM signatures WHERE canonical_id = ?", (canonical,))
+        return [row[0] for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        conn = self._connection()
+        papers = conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+        clusters = conn.execute("SELECT COUNT(DISTINCT canonical_id) FROM signatures").fetchone()[0]
+        return {'papers': papers, 'clusters': clusters, 'duplicates': papers - clusters}
+
+
+def build_from_catalog(index: NearDuplicateIndex, catalog, page_size: int = 5000) -> Dict[str, int]:
+    """Index every catalog paper in the order it was first seen, so earlier versions stay canonical."""
+    start = time.perf_counter()
+    conn = catalog._connection()
+    offset = 0
+    while True:
+        rows = conn.execute("SELECT title, abstract, source, url FROM papers ORDER BY first_seen, paper_id "
+                            "LIMIT ? OFFSET ?", (page_size, offset)).fetchall()
+        if not rows:
+            break
+        index.assign(dict(row) for row in rows)
+        offset += len(rows)
+        print(f"Indexed {offset} papers ({offset / (time.perf_counter() - start):.0f}/s)")
+    return index.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Near-duplicate paper index")
+    parser.add_argument('command', choices=['build', 'stats'])
+    parser.add_argument('--path', default=os.path.join(os.getenv('CHROMA_PERSIST_DIR', './chroma_db'),
+                                                       'dedup_index.sqlite3'))
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.path) or '.', exist_ok=True)
+    index = NearDuplicateIndex(args.path, threshold=float(os.getenv('DEDUP_THRESHOLD', 0.5)))
+    if args.command == 'build':
+        from catalog import PaperCatalog
+        print(build_from_catalog(index, PaperCatalog()))
+    else:
+        print(index.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+from langchain_core.embeddings import Embeddings
+from typing import Dict, List, Optional
+from contextlib import contextmanager
+import numpy as np
+import hashlib
+import sqlite3
+import threading
+import time
+import json
+import os
+import re
+
+
+class CachedEmbeddings(Embeddings):
+    """On-disk LRU cache in front of another Embeddings object.
+
+    Vectors live in a memory-mapped array with one row per slot; a small
+    SQLite index maps text hashes to slots and remembers recency. The UI,
+    the refresh worker and the service workers share one directory, so
+    slots are only handed out inside a write transaction. Lookups just read
+    the index and then check the hash stored next to the slot, which a
+    writer clears before overwriting the vector, so hits never block.
+    """
+
+    # Bumped when the files change shape; an older cache is reset
+    LAYOUT = 2
+    # Recency of hits is kept in memory and written back this often, and before any eviction
+    TOUCH_FLUSH = 1000
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache_dir: str,
+                 max_entries: int = 200000, dtype: str = 'float16'):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.dtype = np.dtype(dtype)
+        self.directory = os.path.join(cache_dir, re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name))
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._vectors: Optional[np.memmap] = None
+        self._keys: Optional[np.memmap] = None
+        self._touched: Dict[str, float] = {}
+
+        # Autocommit, so write transactions can be opened with BEGIN IMMEDIATE
+        self._db = sqlite3.connect(os.path.join(self.directory, 'index.sqlite3'), timeout=30,
+                                   isolation_level=None, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, slot INTEGER, last_used REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used)')
+        with self._write():
+            self._load()
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.directory, 'meta.json')
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.directory, 'vectors.bin')
+
+    @property
+    def _keys_path(self) -> str:
+        return os.path.join(self.directory, 'keys.bin')
+
+    @contextmanager
+    def _read(self):
+        """Deferred transaction: a consistent view of the index that never waits on, or blocks, a writer."""
+        self._db.execute('BEGIN')
+        try:
+            yield
+        finally:
+            self._db.execute('COMMIT')
+
+    @contextmanager
+    def _write(self):
+        """Write transaction holding the database lock, which also guards vectors.bin and meta.json."""
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+        self._db.execute('COMMIT')
+
+    def _load(self):
+        """Open the vectors another process (or an earlier run) created; call with the write lock held."""
+        if self._vectors is not None or not os.path.exists(self._meta_path):
+            return
+        with open(self._meta_path) as f:
+            meta = json.load(f)
+        if (meta['capacity'] != self.max_entries or meta['dtype'] != self.dtype.name
+                or meta.get('layout') != self.LAYOUT):
+            print(f"Embedding cache settings changed, resetting {self.directory}")
+            self._db.execute('DELETE FROM entries')
+            os.remove(self._meta_path)
+            for path in (self._vectors_path, self._keys_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            return
+        self._open_vectors(meta['dim'])
+
+    def _open_vectors(self, dim: int):
+        # Never 'w+' over an existing file: another process may already have filled it
+        self._vectors = np.memmap(
+            self._vectors_path,
+            dtype=self.dtype,
+            mode='r+' if os.path.exists(self._vectors_path) else 'w+',
+            shape=(self.max_entries, dim)
+        )
+        # The raw hash of the key each slot holds, all zeros while a slot is being rewritten
+        self._keys = np.memmap(
+            self._keys_path,
+            dtype=np.uint8,
+            mode='r+' if os.path.exists(self._keys_path) else 'w+',
+            shape=(self.max_entries, 20)
+        )
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model_name}\x00{text}".encode('utf-8')).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, int]:
+        slots = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            slots.update(self._db.execute(f'SELECT key, slot FROM entries WHERE key IN ({placeholders})', batch))
+        return slots
+
+    def _read_slot(self, slot: int, key: str) -> Optional[List[float]]:
+        """The vector in slot, or None if the slot no longer holds key."""
+        tag = bytes.fromhex(key)
+        if self._keys[slot].tobytes() != tag:
+            return None
+        vector = self._vectors[slot].astype(np.float32)
+        # Checked again after the copy: a writer evicting the slot meanwhile has cleared it
+        if self._keys[slot].tobytes() != tag:
+            return None
+        return vector.tolist()
+
+    def _flush_touched(self):
+        """Write the recency of recent hits to the index; call with the write lock held."""
+        if self._touched:
+            self._db.executemany('UPDATE entries SET last_used = ? WHERE key = ?',
+                                 [(used, key) for key, used in self._touched.items()])
+            self._touched = {}
+
+    def _allocate(self) -> int:
+        """Next unused slot, or the least recently used one once full; call with the write lock held."""
+        used = self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        if used < self.max_entries:
+            # Slots are only freed by eviction, which reuses them, so 0..used-1 are taken
+            return used
+        evicted, slot = self._db.execute('SELECT key, slot FROM entries ORDER BY last_used LIMIT 1').fetchone()
+        self._db.execute('DELETE FROM entries WHERE key = ?', (evicted,))
+        return slot
+
+    def _store(self, keys: List[str], vectors: List[List[float]]):
+        with self._write():
+            self._load()
+            if self._vectors is None:
+                self._open_vectors(len(vectors[0]))
+                with open(self._meta_path, 'w') as f:
+                    json.dump({'dim': len(vectors[0]), 'capacity': self.max_entries,
+                               'dtype': self.dtype.name, 'layout': self.LAYOUT}, f)
+
+            # Eviction picks the least recently used entry, so it has to see this process's hits
+            self._flush_touched()
+            now = time.time()
+            # Keys another process stored since the lookup keep their slot
+            existing = self._lookup(keys)
+            for key, vector in zip(keys, vectors):
+                if key in existing:
+                    continue
+                slot = self._allocate()
+                self._keys[slot] = 0
+                self._vectors[slot] = vector
+                self._keys[slot] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+                self._db.execute('INSERT INTO entries VALUES (?, ?, ?)', (key, slot, now))
+                existing[key] = slot
+            self._vectors.flush()
+            self._keys.flush()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+
+        with self._lock:
+            with self._read():
+                slots = self._lookup(list(set(keys)))
+            if slots and self._vectors is None:
+                with self._write():
+                    self._load()
+            now = time.time()
+            for i, key in enumerate(keys):
+                slot = slots.get(key)
+                vector = self._read_slot(slot, key) if slot is not None and self._vectors is not None else None
+                if vector is None:
+                    missing.setdefault(key, []).append(i)
+                    continue
+                results[i] = vector
+                self._touched[key] = now
+            self.hits += len(texts) - sum(len(positions) for positions in missing.values())
+            self.misses += sum(len(positions) for positions in missing.values())
+            if len(self._touched) >= self.TOUCH_FLUSH:
+                with self._write():
+                    self._flush_touched()
+
+        if missing:
+            miss_keys = list(missing)
+            vectors = self.embeddings.embed_documents([texts[missing[key][0]] for key in miss_keys])
+            with self._lock:
+                self._store(miss_keys, vectors)
+            for key, vector in zip(miss_keys, vectors):
+                for i in missing[key]:
+                    results[i] = vector
+
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        # MiniLM embeds queries and documents identically, so they share entries
+        return self.embed_documents([text])[0]
+
+    def update(self, texts: List[str], vectors: List[List[float]]):
+        """Add vectors computed elsewhere, e.g. by bulk ingestion workers."""
+        if texts:
+            with self._lock:
+                self._store([self._key(text) for text in texts], vectors)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0],
+            'capacity': self.max_entries
+        }
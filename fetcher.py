@@ -0,0 +1,86 @@
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import threading
+import time
+import os
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ConcurrentFetcher:
+    """Pooled HTTP client with per-host concurrency limits, timeouts and retries."""
+
+    def __init__(self, headers: Dict[str, str], max_workers: Optional[int] = None,
+                 per_host: Optional[int] = None, timeout: Optional[float] = None,
+                 retries: Optional[int] = None, backoff: float = 0.5):
+        self.max_workers = max_workers or int(os.getenv('SCRAPER_MAX_WORKERS', 6))
+        self.per_host = per_host or int(os.getenv('SCRAPER_PER_HOST', 2))
+        self.timeout = timeout or float(os.getenv('SCRAPER_TIMEOUT', 30))
+        self.retries = retries if retries is not None else int(os.getenv('SCRAPER_RETRIES', 3))
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers * self.per_host)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._host_limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_lock = threading.Lock()
+
+    def _host_semaphore(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self._host_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_limits[host]
+
+    def _retry_delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                return float(retry_after)
+        return self.backoff * (2 ** attempt)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """GET with a per-host slot, retrying connection errors and retryable statuses."""
+        kwargs.setdefault('timeout', self.timeout)
+        semaphore = self._host_semaphore(url)
+
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            with semaphore:
+                try:
+                    response = self.session.get(url, **kwargs)
+                except (requests.ConnectionError, requests.Timeout):
+                    if last_attempt:
+                        raise
+                    response = None
+            if response is not None and (response.status_code not in RETRY_STATUSES or last_attempt):
+                return response
+            time.sleep(self._retry_delay(attempt, response))
+
+    def stream(self, jobs: List[Tuple[str, Callable, str]]) -> Iterator[Tuple[int, str, object, Optional[Exception], float]]:
+        """Run (name, fn, url) jobs concurrently and yield (index, name, result, error, seconds) as each finishes."""
+        def timed(fn, url):
+            start = time.perf_counter()
+            try:
+                return fn(url), None, time.perf_counter() - start
+            except Exception as e:
+                return None, e, time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(timed, fn, url): (index, name)
+                for index, (name, fn, url) in enumerate(jobs)
+            }
+            for future in as_completed(futures):
+                index, name = futures[future]
+                result, error, elapsed = future.result()
+                yield index, name, result, error, elapsed
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,169 @@
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import heapq
+import math
+import pickle
+import re
+import threading
+import os
+
+INDEX_FORMAT = 2
+# Metadata kept per chunk so filters can be applied to lexical results
+FILTER_FIELDS = ('source', 'published_ord')
+
+# Keeps identifiers such as il-6, brca1, nct04280705 and 2.5 as single tokens
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[str]:
+    """Fuse ranked id lists; each list contributes 1 / (k + rank) per id."""
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def matches_where(metadata: Dict[str, Any], where: Optional[Dict]) -> bool:
+    """Evaluate the subset of Chroma's where syntax we use ($and, $in, $gte, $lte, equality)."""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == '$and':
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+        for op, operand in condition.items():
+            if op == '$eq' and value != operand:
+                return False
+            if op == '$in' and value not in operand:
+                return False
+            if op == '$gte' and (value is None or value < operand):
+                return False
+            if op == '$lte' and (value is None or value > operand):
+                return False
+    return True
+
+
+class BM25Index:
+    """In-memory BM25 inverted index over chunk ids, persisted with pickle."""
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.paper_chunks: Dict[str, Set[str]] = {}
+        self.doc_fields: Dict[str, Dict[str, Any]] = {}
+        self.total_length = 0
+        self._lock = threading.RLock()
+        if os.path.exists(path):
+            self.load()
+
+    def count(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, ids: List[str], texts: List[str], metadatas: Optional[List[Optional[Dict]]] = None):
+        with self._lock:
+            self.remove(ids)
+            metadatas = metadatas or [None] * len(ids)
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                metadata = metadata or {}
+                terms = tokenize(text)
+                for term in terms:
+                    postings = self.postings.setdefault(term, {})
+                    postings[doc_id] = postings.get(doc_id, 0) + 1
+                self.doc_lengths[doc_id] = len(terms)
+                self.total_length += len(terms)
+                self.doc_fields[doc_id] = {field: metadata[field] for field in FILTER_FIELDS if field in metadata}
+                if metadata.get('paper_id'):
+                    self.paper_chunks.setdefault(metadata['paper_id'], set()).add(doc_id)
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            ids = [doc_id for doc_id in ids if doc_id in self.doc_lengths]
+            if not ids:
+                return
+            removed = set(ids)
+            for term in list(self.postings):
+                postings = self.postings[term]
+                for doc_id in removed.intersection(postings):
+                    del postings[doc_id]
+                if not postings:
+                    del self.postings[term]
+            for doc_id in removed:
+                self.total_length -= self.doc_lengths.pop(doc_id)
+                self.doc_fields.pop(doc_id, None)
+
+    def remove_papers(self, paper_ids: Iterable[str]):
+        with self._lock:
+            ids = []
+            for pid in paper_ids:
+                ids.extend(self.paper_chunks.pop(pid, ()))
+            self.remove(ids)
+
+    def search(self, query: str, k: int = 10, where: Optional[Dict] = None) -> List[Tuple[str, float]]:
+        with self._lock:
+            n = len(self.doc_lengths)
+            if not n:
+                return []
+            avg_length = self.total_length / n
+            scores: Dict[str, float] = defaultdict(float)
+            allowed: Dict[str, bool] = {}
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    if where:
+                        if doc_id not in allowed:
+                            allowed[doc_id] = matches_where(self.doc_fields.get(doc_id, {}), where)
+                        if not allowed[doc_id]:
+                            continue
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+            return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def clear(self):
+        with self._lock:
+            self.postings = {}
+            self.doc_lengths = {}
+            self.paper_chunks = {}
+            self.doc_fields = {}
+            self.total_length = 0
+
+    def save(self):
+        with self._lock:
+            state = {
+                'format': INDEX_FORMAT,
+                'postings': self.postings,
+                'doc_lengths': self.doc_lengths,
+                'paper_chunks': self.paper_chunks,
+                'doc_fields': self.doc_fields,
+                'total_length': self.total_length
+            }
+            with open(self.path + '.tmp', 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(self.path + '.tmp', self.path)
+
+    def load(self):
+        with self._lock:
+            with open(self.path, 'rb') as f:
+                state = pickle.load(f)
+            # Older formats are left empty; the store rebuilds the index when counts differ
+            if not isinstance(state, dict) or state.get('format') != INDEX_FORMAT:
+                return
+            self.postings = state['postings']
+            self.doc_lengths = state['doc_lengths']
+            self.paper_chunks = state['paper_chunks']
+            self.doc_fields = state['doc_fields']
+            self.total_length = state['total_length']
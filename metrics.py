@@ -0,0 +1,233 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import bisect
+import json
+import threading
+import time
+import os
+
+# Upper bounds in seconds; wide enough for a cache hit and a slow LLM call alike
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PREFIX = 'documed_'
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_current_trace: ContextVar[Optional['Trace']] = ContextVar('documed_trace', default=None)
+
+
+def _label_key(labels: Dict) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: str = '') -> str:
+    parts = [f'{name}="{value}"' for name, value in key]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; quantiles are estimated within a bucket."""
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return BUCKETS[-1]
+
+
+class Trace:
+    """Time spent per stage while handling one request, logged as one JSON line at the end."""
+
+    def __init__(self, kind: str, fields: Dict):
+        self.kind = kind
+        self.fields = fields
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float):
+        # Stages can repeat (one LLM call per question in a batch), so they add up
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+
+class Metrics:
+    """Process-wide counters and stage latency histograms with Prometheus text export.
+
+    Recording is a dict lookup and a few additions under one lock, so it is
+    left on in production. Values are per process: each service worker
+    exposes its own.
+    """
+
+    def __init__(self, recent: int = 50):
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self.recent_traces: deque = deque(maxlen=recent)
+        self._collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+        self.log_path = os.getenv('REQUEST_LOG_PATH')
+        self.log_enabled = os.getenv('REQUEST_LOG', 'true').lower() == 'true'
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(seconds)
+
+    def register(self, name: str, collector: Callable[[], Dict[str, float]]):
+        """Add a callback whose values (e.g. cache hit counts) are read at export time.
+
+        A later registration under the same name replaces the earlier one.
+        """
+        self._collectors[name] = collector
+
+    @contextmanager
+    def span(self, stage: str, **labels) -> Iterator[None]:
+        """Time a block as one stage; also adds it to the current request's trace."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe('stage_seconds', elapsed, stage=stage, **labels)
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.add(stage, elapsed)
+
+    @contextmanager
+    def trace(self, kind: str, **fields) -> Iterator[Trace]:
+        """Handle one request: count it, time it, and log its stages as a JSON line."""
+        trace = Trace(kind, fields)
+        token = _current_trace.set(trace)
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            yield trace
+        except GeneratorExit:
+            # A streamed answer the client stopped reading
+            status = 'cancelled'
+            raise
+        except BaseException as e:
+            status = 'error'
+            trace.fields['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            try:
+                _current_trace.reset(token)
+            except ValueError:
+                # A generator finished in a different context than it started in
+                _current_trace.set(None)
+            self.inc('requests_total', kind=kind, status=status)
+            self.observe('request_seconds', elapsed, kind=kind)
+            record = {
+                'ts': datetime.now().isoformat(timespec='milliseconds'),
+                'kind': kind,
+                'status': status,
+                'duration_ms': round(elapsed * 1000, 2),
+                'stages_ms': {stage: round(seconds * 1000, 2) for stage, seconds in trace.stages.items()},
+                **trace.fields
+            }
+            self.recent_traces.append(record)
+            self._log(record)
+
+    def _log(self, record: Dict):
+        if not self.log_enabled:
+            return
+        line = json.dumps(record, default=str)
+        if self.log_path:
+            with self._lock, open(self.log_path, 'a') as f:
+                f.write(line + '\n')
+        else:
+            print(line)
+
+    def collected(self) -> Dict[str, float]:
+        values = {}
+        for collector in list(self._collectors.values()):
+            try:
+                values.update(collector())
+            except Exception as e:
+                print(f"Metrics collector failed: {str(e)}")
+        return values
+
+    def prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                for key, value in series.items():
+                    lines.append(f"{PREFIX}{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS, histogram.counts):
+                        cumulative += count
+                        le = 'le="%g"' % bound
+                        lines.append(f"{PREFIX}{name}_bucket{_format_labels(key, le)} {cumulative}")
+                    le = 'le="+Inf"'
+                    lines.append(f"{PREFIX}{name}_bucket{_format_labels(key, le)} {histogram.count}")
+                    lines.append(f"{PREFIX}{name}_sum{_format_labels(key)} {histogram.sum:.6f}")
+                    lines.append(f"{PREFIX}{name}_count{_format_labels(key)} {histogram.count}")
+        for name, value in sorted(self.collected().items()):
+            lines.append(f"# TYPE {PREFIX}{name} gauge")
+            lines.append(f"{PREFIX}{name} {value:g}")
+        return '\n'.join(lines) + '\n'
+
+    def stage_summary(self) -> List[Dict]:
+        """One row per stage histogram with count and estimated p50/p95, for display."""
+        rows = []
+        with self._lock:
+            for name in ('request_seconds', 'stage_seconds'):
+                for key, histogram in sorted(self.histograms.get(name, {}).items()):
+                    labels = dict(key)
+                    rows.append({
+                        'stage': labels.pop('kind', None) or labels.pop('stage', ''),
+                        'labels': ', '.join(f"{k}={v}" for k, v in labels.items()),
+                        'count': histogram.count,
+                        'mean_ms': histogram.sum / histogram.count * 1000,
+                        'p50_ms': histogram.quantile(0.5) * 1000,
+                        'p95_ms': histogram.quantile(0.95) * 1000
+                    })
+        return rows
+
+    def counter_summary(self) -> Dict[str, float]:
+        values = {}
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                for key, value in series.items():
+                    values[name + _format_labels(key)] = value
+        values.update(self.collected())
+        return values
+
+
+METRICS = Metrics()
@@ -0,0 +1,186 @@
+"""all-MiniLM-L6-v2 through ONNX Runtime instead of PyTorch, for CPU-only nodes.
+
+The model is exported once (needs torch, transformers and, for int8, onnx);
+serving only needs onnxruntime and tokenizers. Vectors are mean-pooled and
+L2-normalized like sentence-transformers, so they can be mixed with the
+ones already in chroma_db; ``check`` measures how closely they match.
+
+Usage:
+    python onnx_embeddings.py export [--output ./onnx_model] [--no-quantize]
+    python onnx_embeddings.py check [--quantized] [--samples 500] [--min-cosine 0.99]
+"""
+from langchain_core.embeddings import Embeddings
+from typing import Dict, List, Optional
+import argparse
+import threading
+import time
+import sys
+import os
+
+import numpy as np
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+ONNX_MODEL_DIR = os.getenv('ONNX_MODEL_DIR', './onnx_model')
+FP32_FILE = 'model.onnx'
+INT8_FILE = 'model.int8.onnx'
+# sentence-transformers truncates MiniLM inputs at 256 word pieces
+MAX_LENGTH = 256
+# Lowest cosine similarity to the PyTorch vectors accepted by check
+MIN_COSINE = {'fp32': 0.999, 'int8': 0.99}
+
+
+class OnnxMiniLMEmbeddings(Embeddings):
+    """MiniLM sentence embeddings from an exported ONNX model (fp32 or dynamically quantized int8).
+
+    Texts are sorted by length and batched so each batch is padded only to
+    its own longest text, then returned in their original order.
+    """
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, quantized: bool = True, threads: Optional[int] = None,
+                 batch_size: int = 32, max_length: int = MAX_LENGTH):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        path = os.path.join(model_dir, INT8_FILE if quantized else FP32_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No ONNX model at {path}; run python onnx_embeddings.py export first")
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads or 0  # 0 lets ONNX Runtime use every core
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.no_padding()
+        self.quantized = quantized
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        length = max(len(encoding.ids) for encoding in encodings)
+        input_ids = np.zeros((len(texts), length), dtype=np.int64)
+        attention_mask = np.zeros((len(texts), length), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            input_ids[row, :len(encoding.ids)] = encoding.ids
+            attention_mask[row, :len(encoding.ids)] = 1
+        inputs = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in self.input_names:
+            inputs['token_type_ids'] = np.zeros_like(input_ids)
+        hidden = self.session.run(None, inputs)[0]
+
+        # Mean over real tokens, then unit length (MiniLM's pooling and normalize layers)
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            # One run at a time; intra-op threads already use the cores
+            with self._lock:
+                embedded = self._encode_batch([texts[i] for i in batch])
+            for i, vector in zip(batch, embedded.tolist()):
+                vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def export_model(output_dir: str = ONNX_MODEL_DIR, model_name: str = EMBEDDING_MODEL, quantize: bool = True):
+    """Export the transformer to ONNX with dynamic batch and sequence axes, plus an int8 copy."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    tokenizer.save_pretrained(output_dir)
+    model = AutoModel.from_pretrained(model_name).eval()
+
+    sample = tokenizer(["dimension probe", "a somewhat longer sample sentence"], padding=True, return_tensors='pt')
+    names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+
+    class HiddenStates(torch.nn.Module):
+        # Positional tensors in, token vectors out; forward signatures differ across transformers versions
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(names, inputs)), return_dict=True).last_hidden_state
+
+    axes = {name: {0: 'batch', 1: 'sequence'} for name in names + ['last_hidden_state']}
+    fp32_path = os.path.join(output_dir, FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(HiddenStates().eval(), tuple(sample[name] for name in names), fp32_path,
+                          input_names=names, output_names=['last_hidden_state'], dynamic_axes=axes,
+                          opset_version=17, dynamo=False)
+    print(f"Exported {model_name} to {fp32_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        int8_path = os.path.join(output_dir, INT8_FILE)
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"Quantized to {int8_path}")
+    print(f"Export finished in {time.perf_counter() - start:.1f}s")
+
+
+def compare_vectors(reference: List[List[float]], candidate: List[List[float]]) -> Dict[str, float]:
+    """Cosine similarity between matching rows of two embedding lists."""
+    a = np.asarray(reference, dtype=np.float32)
+    b = np.asarray(candidate, dtype=np.float32)
+    cosine = (a * b).sum(axis=1) / np.clip(np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12, None)
+    return {'count': len(cosine), 'min': float(cosine.min()), 'mean': float(cosine.mean()),
+            'p01': float(np.percentile(cosine, 1))}
+
+
+def check_store(embeddings: Embeddings, persist_directory: str, samples: int = 500) -> Dict[str, float]:
+    """Re-embed stored chunks and compare them with the vectors already in the Chroma collection."""
+    import chromadb
+
+    client = chromadb.PersistentClient(path=persist_directory)
+    collection = client.get_collection('langchain')
+    stored = collection.get(limit=samples, include=['documents', 'embeddings'])
+    if not stored['ids']:
+        raise ValueError(f"No chunks stored in {persist_directory}")
+    return compare_vectors(stored['embeddings'], embeddings.embed_documents(stored['documents']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and check the ONNX MiniLM embedding backend")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help="Export MiniLM to ONNX (and int8)")
+    export.add_argument('--output', default=ONNX_MODEL_DIR)
+    export.add_argument('--no-quantize', action='store_true', help="Only write the fp32 model")
+    check = commands.add_parser('check', help="Compare ONNX vectors with the ones stored in chroma_db")
+    check.add_argument('--model-dir', default=ONNX_MODEL_DIR)
+    check.add_argument('--quantized', action='store_true', help="Check the int8 model instead of fp32")
+    check.add_argument('--persist-directory', default=os.getenv('CHROMA_PERSIST_DIR', './chroma_db'))
+    check.add_argument('--samples', type=int, default=500)
+    check.add_argument('--min-cosine', type=float, help="Fail below this (default 0.999 fp32, 0.99 int8)")
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_model(args.output, quantize=not args.no_quantize)
+        return
+
+    embeddings = OnnxMiniLMEmbeddings(args.model_dir, quantized=args.quantized)
+    result = check_store(embeddings, args.persist_directory, args.samples)
+    threshold = args.min_cosine or MIN_COSINE['int8' if args.quantized else 'fp32']
+    print(f"Cosine to stored vectors over {result['count']} chunks: min {result['min']:.5f}, "
+          f"p1 {result['p01']:.5f}, mean {result['mean']:.5f} (threshold {threshold})")
+    if result['min'] < threshold:
+        print("ONNX vectors are not compatible with this store")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
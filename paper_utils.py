@@ -0,0 +1,72 @@
+from datetime import date
+from typing import Dict, Optional, Union
+import hashlib
+import re
+
+# Bump when the stored chunk metadata changes, so existing papers are re-indexed
+INDEX_VERSION = 3
+
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+MONTH = r'(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?'
+DATE_PATTERNS = [
+    # 2025-02-20
+    (re.compile(r'\b(\d{4})-(\d{1,2})-(\d{1,2})\b'), ('year', 'month', 'day')),
+    # 20/02/2025 (day first, as used by the WHO registry)
+    (re.compile(r'\b(\d{1,2})/(\d{1,2})/(\d{4})\b'), ('day', 'month', 'year')),
+    # February 20, 2025
+    (re.compile(r'\b' + MONTH + r' (\d{1,2}),? (\d{4})\b'), ('month', 'day', 'year')),
+    # 20 February 2025
+    (re.compile(r'\b(\d{1,2}) ' + MONTH + r',? (\d{4})\b'), ('day', 'month', 'year')),
+    # PubMed citations: "J Clin Med. 2019 Oct 15;25(10)", "2020 Nov;31(7)", "2019;12:1"
+    (re.compile(r'\b((?:19|20)\d{2})(?: ' + MONTH + r'(?: (\d{1,2}))?)?(?![\d/-])'), ('year', 'month', 'day')),
+]
+
+
+def _normalize(value: str) -> str:
+    return re.sub(r'\s+', ' ', (value or '')).strip().lower()
+
+
+def paper_id(paper: Dict) -> str:
+    """Stable id for a paper: hash of its normalized title, source and URL."""
+    key = '\x1f'.join(_normalize(paper.get(field, '')) for field in ('title', 'source', 'url'))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+
+def paper_text(paper: Dict) -> str:
+    return f"Title: {paper['title']}\nAbstract: {paper['abstract']}\nDate: {paper['date']}\nSource: {paper['source']}\nURL: {paper['url']}"
+
+
+def content_hash(paper: Dict) -> str:
+    """Hash of everything that ends up in the embedded text, so edits trigger a re-index."""
+    return hashlib.sha1(f"{INDEX_VERSION}\x1f{paper_text(paper)}".encode('utf-8')).hexdigest()
+
+
+def normalize_date(raw: str) -> Optional[str]:
+    """Best-effort ISO date (YYYY-MM-DD) from the free-form date strings sources publish.
+
+    Missing months or days fall back to the first of the period.
+    """
+    text = (raw or '').lower()
+    for pattern, fields in DATE_PATTERNS:
+        for match in pattern.finditer(text):
+            parts = dict(zip(fields, match.groups()))
+            month = parts.get('month')
+            if month and not month.isdigit():
+                month = MONTHS[month[:3]]
+            try:
+                return date(int(parts['year']), int(month or 1), int(parts.get('day') or 1)).isoformat()
+            except ValueError:
+                continue
+    return None
+
+
+def date_ordinal(value: Union[str, date, None]) -> Optional[int]:
+    """Sortable integer (YYYYMMDD) for an ISO date string or date, as stored in chunk metadata."""
+    if not value:
+        return None
+    if isinstance(value, date):
+        value = value.isoformat()
+    return int(value[:10].replace('-', ''))
@@ -0,0 +1,184 @@
+from bs4 import BeautifulSoup, SoupStrainer
+from typing import Dict, Iterator, List, Optional, Tuple
+import re
+
+try:
+    from lxml import etree, html as lxml_html
+    PARSER = 'lxml'
+except ImportError:
+    PARSER = 'html.parser'
+
+# Field extraction rules per source. Selectors are 'tag.class' steps separated by
+# spaces (descendants); 'link' is None when items link back to the listing page.
+SOURCE_RULES = {
+    'pubmed': {
+        'source': 'PubMed',
+        'item': 'article.full-docsum',
+        'title': 'a.docsum-title',
+        'abstract': 'div.full-view-snippet',
+        'date': 'span.docsum-journal-citation',
+        'link': None,
+        'base_url': None
+    },
+    'biorxiv': {
+        'source': 'bioRxiv',
+        'item': 'article.article-item',
+        'title': 'a.highwire-cite-linked-title',
+        'abstract': 'div.abstract',
+        'date': 'span.article-date',
+        'link': 'a.highwire-cite-linked-title',
+        'base_url': 'https://www.biorxiv.org'
+    },
+    'medrxiv': {
+        'source': 'medRxiv',
+        'item': 'div.article-item',
+        'title': 'a.article-title',
+        'abstract': 'div.abstract-text',
+        'date': 'span.pub-date',
+        'link': 'a.article-title',
+        'base_url': 'https://www.medrxiv.org'
+    },
+    'sciencedirect': {
+        'source': 'ScienceDirect',
+        'item': 'li.ResultItem',
+        'title': 'h2',
+        'abstract': 'div.abstract',
+        'date': 'span.publication-date',
+        'link': 'h2 a',
+        'base_url': 'https://www.sciencedirect.com'
+    },
+    'who': {
+        'source': 'WHO Clinical Trials',
+        'item': 'tr.trial-record',
+        'title': 'td.trial-title',
+        'abstract': 'td.trial-description',
+        'date': 'td.trial-date',
+        'link': 'a',
+        'base_url': 'https://trialsearch.who.int'
+    },
+    'europepmc': {
+        'source': 'Europe PMC',
+        'item': 'div.citation',
+        'title': 'h3.title',
+        'abstract': 'p.abstract',
+        'date': 'span.publication-date',
+        'link': 'a.title-link',
+        'base_url': 'https://europepmc.org'
+    }
+}
+
+CHARSET_RE = re.compile(r'charset=["\']?([\w-]+)', re.IGNORECASE)
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+Selector = List[Tuple[str, Optional[str]]]
+
+
+def compile_selector(selector: str) -> Selector:
+    steps = []
+    for step in selector.split():
+        tag, _, css_class = step.partition('.')
+        steps.append((tag, css_class or None))
+    return steps
+
+
+def _find(node, steps: Selector):
+    for tag, css_class in steps:
+        node = node.find(tag, class_=css_class) if css_class else node.find(tag)
+        if node is None:
+            return None
+    return node
+
+
+def _text(node, steps: Selector) -> str:
+    # AttributeError on a missing field matches the old per-source parsers: the item is skipped
+    return _find(node, steps).get_text().strip()
+
+
+def _xpath(steps: Selector, prefix: str = './/'):
+    """One XPath per step, matching a class among several like BeautifulSoup's class_ does."""
+    compiled = []
+    for tag, css_class in steps:
+        condition = f"[contains(concat(' ', normalize-space(@class), ' '), ' {css_class} ')]" if css_class else ''
+        compiled.append(etree.XPath(f'{prefix}{tag}{condition}'))
+    return compiled
+
+
+def _lxml_find(node, steps):
+    for step in steps:
+        matches = step(node)
+        if not matches:
+            return None
+        node = matches[0]
+    return node
+
+
+class ListingParser:
+    """Extracts papers from one source's listing page using its SOURCE_RULES entry."""
+
+    def __init__(self, source_key: str, parser: Optional[str] = None):
+        rules = SOURCE_RULES[source_key]
+        self.source = rules['source']
+        self.base_url = rules['base_url']
+        self.parser = parser or PARSER
+        self.item = compile_selector(rules['item'])[0]
+        self.fields = {field: compile_selector(rules[field]) for field in ('title', 'abstract', 'date')}
+        self.link = compile_selector(rules['link']) if rules['link'] else None
+        # Only item elements (and their children) are built into the tree. The strainer sees the
+        # raw class attribute, so match the class as a word to keep multi-class items.
+        tag, css_class = self.item
+        self.strainer = SoupStrainer(tag, class_=re.compile(rf'(?:^|\s){re.escape(css_class)}(?:\s|$)'))
+        if self.parser == 'lxml':
+            self.item_xpath = _xpath([self.item], prefix='//')[0]
+            self.field_xpaths = {field: _xpath(steps) for field, steps in self.fields.items()}
+            self.link_xpath = _xpath(self.link) if self.link else None
+
+    def _absolute(self, href: str) -> str:
+        if href.startswith('http'):
+            return href
+        return self.base_url + href
+
+    def parse(self, content: bytes, url: str, content_type: Optional[str] = None) -> Iterator[Dict]:
+        """Yield papers in page order from the raw response body."""
+        match = CHARSET_RE.search(content_type or '')
+        encoding = match.group(1) if match else None
+        if self.parser == 'lxml':
+            return self._parse_lxml(content, url, encoding)
+        return self._parse_soup(content, url, encoding)
+
+    def _parse_lxml(self, content: bytes, url: str, encoding: Optional[str]) -> Iterator[Dict]:
+        # libxml2 builds the tree in C; only matched elements become Python objects
+        if not content.strip():
+            return
+        # libxml2 assumes Latin-1 for undeclared pages, so pick the charset here (header,
+        # then <meta>, then UTF-8) and let it decode the bytes; pages with an
+        # <?xml encoding=...?> declaration can't be parsed from an already decoded str
+        if not encoding:
+            match = META_CHARSET_RE.search(content[:4096])
+            encoding = match.group(1).decode('ascii') if match else 'utf-8'
+        root = lxml_html.document_fromstring(content, parser=lxml_html.HTMLParser(encoding=encoding))
+        for item in self.item_xpath(root):
+            try:
+                paper = {
+                    field: _lxml_find(item, steps).text_content().strip()
+                    for field, steps in self.field_xpaths.items()
+                }
+                paper['source'] = self.source
+                paper['url'] = self._absolute(_lxml_find(item, self.link_xpath).get('href')) if self.link else url
+            except (AttributeError, TypeError):
+                continue
+            yield paper
+
+    def _parse_soup(self, content: bytes, url: str, encoding: Optional[str]) -> Iterator[Dict]:
+        soup = BeautifulSoup(content, self.parser, parse_only=self.strainer, from_encoding=encoding)
+        tag, css_class = self.item
+        for item in soup.find_all(tag, class_=css_class):
+            try:
+                paper = {field: _text(item, steps) for field, steps in self.fields.items()}
+                paper['source'] = self.source
+                paper['url'] = self._absolute(_find(item, self.link)['href']) if self.link else url
+            except (AttributeError, TypeError, KeyError):
+                continue
+            yield paper
+
+
+PARSERS = {source_key: ListingParser(source_key) for source_key in SOURCE_RULES}
@@ -0,0 +1,449 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import sqlite3
+import threading
+import json
+import uuid
+import os
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    slot INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    paper_id TEXT,
+    source TEXT,
+    published_ord INTEGER,
+    list_id INTEGER NOT NULL DEFAULT -1,
+    document TEXT,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_paper ON chunks (paper_id);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Metadata keys stored as columns so filters and paper lookups use SQLite indexes
+COLUMN_FIELDS = ('paper_id', 'source', 'published_ord')
+SQL_OPERATORS = {'$eq': '=', '$ne': '!=', '$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<='}
+
+# Rows converted to float32 and scored per step; small blocks stay in CPU cache
+SCAN_BLOCK = 2048
+# IVF is trained once the store has this many rows, and retrained when it doubles
+IVF_MIN_ROWS = 10000
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def where_sql(where: Optional[Dict]) -> Tuple[str, list]:
+    """Translate the Chroma where syntax MedicalRAG uses into a SQL condition."""
+    if not where:
+        return '1', []
+    clauses, params = [], []
+    for key, condition in where.items():
+        if key in ('$and', '$or'):
+            parts = [where_sql(clause) for clause in condition]
+            joiner = ' AND ' if key == '$and' else ' OR '
+            clauses.append('(' + joiner.join(part for part, _ in parts) + ')')
+            for _, part_params in parts:
+                params.extend(part_params)
+            continue
+        column = key if key in COLUMN_FIELDS else f"json_extract(metadata, '$.{key}')"
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+        for op, operand in condition.items():
+            if op in ('$in', '$nin'):
+                negate = 'NOT ' if op == '$nin' else ''
+                clauses.append(f"{column} {negate}IN ({', '.join('?' for _ in operand)})")
+                params.extend(operand)
+            else:
+                clauses.append(f"{column} {SQL_OPERATORS[op]} ?")
+                params.append(operand)
+    return ' AND '.join(clauses), params
+
+
+class QuantizedCollection:
+    """Vector collection with the subset of Chroma's Collection API that MedicalRAG uses.
+
+    Vectors are normalized and kept twice in memory-mapped files: quantized
+    (int8 with a per-row scale, or float16) for the scan, and float32 for
+    re-scoring the top candidates. Documents and metadata live in SQLite.
+    Search is a blocked brute-force scan, or an IVF probe of the nearest
+    k-means lists once the store is large enough and ``index='ivf'``.
+    """
+
+    def __init__(self, directory: str, metadata: Optional[Dict] = None, dtype: str = 'int8',
+                 index: str = 'flat', nprobe: int = 16, rescore: int = 40):
+        if dtype not in ('int8', 'float16'):
+            raise ValueError(f"Unsupported quantized dtype {dtype}")
+        self.directory = directory
+        self.index = index
+        self.nprobe = nprobe
+        self.rescore = rescore
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(directory, 'store.sqlite3'), timeout=30, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+        if metadata is not None and self._get_meta('collection') is None:
+            self._set_meta('collection', metadata)
+        self._db.commit()
+
+        self._generation = None
+        self._load()
+        if self.settings['dtype'] != dtype:
+            self._requantize(dtype)
+
+    # -- persistence --------------------------------------------------------
+
+    def _get_meta(self, key: str):
+        row = self._db.execute('SELECT value FROM store_meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_meta(self, key: str, value):
+        self._db.execute('INSERT OR REPLACE INTO store_meta VALUES (?, ?)', (key, json.dumps(value)))
+
+    def _bump_generation(self):
+        self._generation = (self._get_meta('generation') or 0) + 1
+        self._set_meta('generation', self._generation)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _open_arrays(self):
+        dim, capacity, dtype = self.settings['dim'], self.settings['capacity'], self.settings['dtype']
+        self.vectors = self.scales = self.full = None
+        if not dim:
+            return
+        self.vectors = np.memmap(self._path(f'vectors.{dtype}'), dtype=dtype, mode='r+', shape=(capacity, dim))
+        self.scales = np.memmap(self._path('scales.f32'), dtype=np.float32, mode='r+', shape=(capacity,))
+        self.full = np.memmap(self._path('full.f32'), dtype=np.float32, mode='r+', shape=(capacity, dim))
+
+    def _resize_files(self, dim: int, capacity: int, dtype: str):
+        for name, row_bytes in ((f'vectors.{dtype}', dim * np.dtype(dtype).itemsize),
+                                ('scales.f32', 4), ('full.f32', dim * 4)):
+            with open(self._path(name), 'ab') as f:
+                f.truncate(capacity * row_bytes)
+
+    def _load(self):
+        """(Re)read the in-memory view: settings, memmaps, live slots, IVF lists and centroids."""
+        self.settings = self._get_meta('settings') or {'dim': None, 'capacity': 0, 'dtype': 'int8'}
+        self._open_arrays()
+        capacity = self.settings['capacity']
+        self._live = np.zeros(capacity, dtype=bool)
+        self._lists = np.full(capacity, -1, dtype=np.int32)
+        self._high_water = 0
+        rows = self._db.execute('SELECT slot, list_id FROM chunks').fetchall()
+        if rows:
+            slots, lists = np.array(rows, dtype=np.int64).T
+            self._live[slots] = True
+            self._lists[slots] = lists
+            self._high_water = int(slots.max()) + 1
+        self.centroids = None
+        if os.path.exists(self._path('centroids.npy')) and self._get_meta('ivf'):
+            self.centroids = np.load(self._path('centroids.npy'))
+        self._generation = self._get_meta('generation') or 0
+
+    def _maybe_reload(self):
+        # Other processes (refresh worker, API workers) may have written since we last looked
+        generation = self._get_meta('generation') or 0
+        if generation != self._generation:
+            self._load()
+
+    def _ensure_capacity(self, dim: int, needed: int):
+        if self.settings['dim'] and self.settings['dim'] != dim:
+            raise ValueError(f"Store holds {self.settings['dim']}-dimensional vectors, got {dim}")
+        if needed <= self.settings['capacity']:
+            return
+        capacity = max(1024, self.settings['capacity'] * 2, needed)
+        self._resize_files(dim, capacity, self.settings['dtype'])
+        self.settings = {**self.settings, 'dim': dim, 'capacity': capacity}
+        self._set_meta('settings', self.settings)
+        self._open_arrays()
+        self._live = np.concatenate([self._live, np.zeros(capacity - len(self._live), dtype=bool)])
+        self._lists = np.concatenate([self._lists, np.full(capacity - len(self._lists), -1, dtype=np.int32)])
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.settings['dtype'] == 'float16':
+            return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _requantize(self, dtype: str):
+        with self._lock:
+            previous = self._path(f"vectors.{self.settings['dtype']}")
+            self.settings = {**self.settings, 'dtype': dtype}
+            if self.settings['dim']:
+                print(f"Re-quantizing vector store in {self.directory} to {dtype}")
+                self._resize_files(self.settings['dim'], self.settings['capacity'], dtype)
+            self._open_arrays()
+            if os.path.exists(previous):
+                os.remove(previous)
+            for start in range(0, self._high_water, SCAN_BLOCK):
+                end = min(start + SCAN_BLOCK, self._high_water)
+                self.vectors[start:end], self.scales[start:end] = self._quantize(np.asarray(self.full[start:end]))
+            if self.vectors is not None:
+                self.vectors.flush()
+                self.scales.flush()
+            self._set_meta('settings', self.settings)
+            self._bump_generation()
+            self._db.commit()
+
+    # -- Chroma Collection API ---------------------------------------------
+
+    @property
+    def metadata(self) -> Optional[Dict]:
+        return self._get_meta('collection')
+
+    def modify(self, metadata: Dict):
+        with self._lock:
+            self._set_meta('collection', metadata)
+            self._db.commit()
+
+    def count(self) -> int:
+        return self._db.execute('SELECT COUNT(*) FROM chunks').fetchone()[0]
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], metadatas: Optional[List[Dict]] = None,
+               documents: Optional[List[str]] = None):
+        if not ids:
+            return
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        metadatas = metadatas or [{}] * len(ids)
+        documents = documents or [None] * len(ids)
+        with self._lock:
+            self._maybe_reload()
+            existing = self._slots_for_ids(ids)
+            free = iter(np.flatnonzero(~self._live[:self._high_water]).tolist())
+            slots = []
+            next_slot = self._high_water
+            for doc_id in ids:
+                slot = existing.get(doc_id)
+                if slot is None:
+                    slot = next(free, None)
+                if slot is None:
+                    slot = next_slot
+                    next_slot += 1
+                existing[doc_id] = slot
+                slots.append(slot)
+            self._ensure_capacity(vectors.shape[1], next_slot)
+
+            slots = np.array(slots, dtype=np.int64)
+            lists = self._assign(vectors)
+            # Vectors are flushed before the rows commit, so readers never see a row without its vector
+            self.full[slots] = vectors
+            self.vectors[slots], self.scales[slots] = self._quantize(vectors)
+            for array in (self.full, self.vectors, self.scales):
+                array.flush()
+
+            rows = []
+            for doc_id, slot, metadata, document, list_id in zip(ids, slots.tolist(), metadatas, documents, lists.tolist()):
+                metadata = metadata or {}
+                rows.append((slot, doc_id, metadata.get('paper_id'), metadata.get('source'),
+                             metadata.get('published_ord'), list_id, document, json.dumps(metadata)))
+            self._db.execute('DELETE FROM chunks WHERE id IN (SELECT value FROM json_each(?))', (json.dumps(list(ids)),))
+            self._db.executemany('INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            self._bump_generation()
+            self._db.commit()
+
+            self._live[slots] = True
+            self._lists[slots] = lists
+            self._high_water = max(self._high_water, next_slot)
+
+            if self.index == 'ivf':
+                trained = self._get_meta('ivf') or {}
+                live = int(self._live.sum())
+                if live >= IVF_MIN_ROWS and live >= 2 * trained.get('rows', 0):
+                    self.train()
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None):
+        with self._lock:
+            self._maybe_reload()
+            slots = self._select_slots(ids, where)
+            if not slots:
+                return
+            self._db.execute('DELETE FROM chunks WHERE slot IN (SELECT value FROM json_each(?))', (json.dumps(slots),))
+            self._bump_generation()
+            self._db.commit()
+            self._live[slots] = False
+            self._lists[slots] = -1
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None, include: Iterable[str] = ('documents', 'metadatas')) -> Dict:
+        with self._lock:
+            self._maybe_reload()
+            condition, params = where_sql(where)
+            if ids is not None:
+                condition += ' AND id IN (SELECT value FROM json_each(?))'
+                params.append(json.dumps(list(ids)))
+            query = f"SELECT slot, id, document, metadata FROM chunks WHERE {condition} ORDER BY slot"
+            if limit is not None or offset:
+                query += ' LIMIT ? OFFSET ?'
+                params.extend([limit if limit is not None else -1, offset or 0])
+            rows = self._db.execute(query, params).fetchall()
+            result = {'ids': [row[1] for row in rows]}
+            if 'documents' in include:
+                result['documents'] = [row[2] for row in rows]
+            if 'metadatas' in include:
+                result['metadatas'] = [json.loads(row[3]) for row in rows]
+            if 'embeddings' in include:
+                slots = np.array([row[0] for row in rows], dtype=np.int64)
+                result['embeddings'] = np.asarray(self.full[slots]).tolist() if len(slots) else []
+            return result
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10, where: Optional[Dict] = None,
+              include: Iterable[str] = ('documents', 'metadatas', 'distances')) -> Dict:
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32))
+        with self._lock:
+            self._maybe_reload()
+            allowed = None
+            if where:
+                allowed = np.zeros(len(self._live), dtype=bool)
+                allowed[self._select_slots(None, where)] = True
+            hits = [self._search(query, n_results, allowed) for query in queries]
+
+            result = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+            for slots, scores in hits:
+                rows = self._rows_for_slots(slots)
+                result['ids'].append([rows[slot][0] for slot in slots])
+                result['documents'].append([rows[slot][1] for slot in slots])
+                result['metadatas'].append([json.loads(rows[slot][2]) for slot in slots])
+                # Squared L2 between unit vectors, matching Chroma's default space
+                result['distances'].append([float(2 - 2 * score) for score in scores])
+            return {key: value for key, value in result.items() if key == 'ids' or key in include}
+
+    # -- search -------------------------------------------------------------
+
+    def _candidate_slots(self, query: np.ndarray, allowed: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """Slots to scan, or None to scan every row up to the high-water mark."""
+        mask = None
+        if self.centroids is not None:
+            probe = np.argsort(self.centroids @ query)[::-1][:self.nprobe]
+            mask = np.isin(self._lists[:self._high_water], probe)
+        if allowed is not None:
+            mask = allowed[:self._high_water] if mask is None else mask & allowed[:self._high_water]
+        return None if mask is None else np.flatnonzero(mask & self._live[:self._high_water])
+
+    def _scan(self, query: np.ndarray, slots: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        count = self._high_water if slots is None else len(slots)
+        scores = np.empty(count, dtype=np.float32)
+        buffer = np.empty((min(SCAN_BLOCK, count), len(query)), dtype=np.float32)
+        for start in range(0, count, SCAN_BLOCK):
+            end = min(start + SCAN_BLOCK, count)
+            rows = slice(start, end) if slots is None else slots[start:end]
+            block = buffer[:end - start]
+            block[...] = self.vectors[rows]
+            scores[start:end] = (block @ query) * self.scales[rows]
+        if slots is None:
+            scores[~self._live[:count]] = -np.inf
+            slots = np.arange(count)
+        return slots, scores
+
+    def _search(self, query: np.ndarray, k: int, allowed: Optional[np.ndarray]) -> Tuple[List[int], List[float]]:
+        if not self._high_water or self.vectors is None:
+            return [], []
+        slots, scores = self._scan(query, self._candidate_slots(query, allowed))
+        live = np.isfinite(scores)
+        slots, scores = slots[live], scores[live]
+        if not len(slots):
+            return [], []
+        # Shortlist on quantized scores, then order the shortlist by exact float32 scores
+        depth = max(k * 4, self.rescore)
+        if depth < len(slots):
+            slots = np.sort(slots[np.argpartition(-scores, depth - 1)[:depth]])
+        exact = self._read_full(slots) @ query
+        order = np.argsort(-exact)[:k]
+        return slots[order].tolist(), exact[order].tolist()
+
+    def _read_full(self, slots: np.ndarray) -> np.ndarray:
+        """Full-precision rows via pread, so re-scoring does not map the float32 file into memory."""
+        dim = self.settings['dim']
+        row_bytes = dim * 4
+        rows = np.empty((len(slots), dim), dtype=np.float32)
+        with open(self._path('full.f32'), 'rb', buffering=0) as f:
+            for i, slot in enumerate(slots.tolist()):
+                rows[i] = np.frombuffer(os.pread(f.fileno(), row_bytes, slot * row_bytes), dtype=np.float32)
+        return rows
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        if self.centroids is None:
+            return np.full(len(vectors), -1, dtype=np.int32)
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def train(self, iterations: int = 10, sample: int = 50000, seed: int = 0):
+        """Fit IVF centroids (spherical k-means on a sample) and assign every row to a list."""
+        with self._lock:
+            live = np.flatnonzero(self._live[:self._high_water])
+            nlist = max(8, int(np.sqrt(len(live))))
+            rng = np.random.default_rng(seed)
+            sample_slots = np.sort(rng.choice(live, size=min(sample, len(live)), replace=False))
+            data = np.asarray(self.full[sample_slots])
+            centroids = data[rng.choice(len(data), size=nlist, replace=False)]
+            for _ in range(iterations):
+                assignment = np.argmax(data @ centroids.T, axis=1)
+                for i in range(nlist):
+                    members = data[assignment == i]
+                    if len(members):
+                        centroids[i] = members.mean(axis=0)
+                centroids = _normalize(centroids)
+
+            self.centroids = centroids.astype(np.float32)
+            for start in range(0, len(live), SCAN_BLOCK):
+                block = live[start:start + SCAN_BLOCK]
+                self._lists[block] = self._assign(np.asarray(self.full[block]))
+            np.save(self._path('centroids.npy'), self.centroids)
+            self._db.executemany('UPDATE chunks SET list_id = ? WHERE slot = ?',
+                                 zip(self._lists[live].tolist(), live.tolist()))
+            self._set_meta('ivf', {'nlist': nlist, 'rows': len(live)})
+            self._bump_generation()
+            self._db.commit()
+            print(f"Trained IVF index with {nlist} lists over {len(live)} vectors")
+
+    # -- lookups ------------------------------------------------------------
+
+    def _slots_for_ids(self, ids: List[str]) -> Dict[str, int]:
+        rows = self._db.execute('SELECT id, slot FROM chunks WHERE id IN (SELECT value FROM json_each(?))',
+                                (json.dumps(list(ids)),))
+        return dict(rows.fetchall())
+
+    def _select_slots(self, ids: Optional[List[str]], where: Optional[Dict]) -> List[int]:
+        condition, params = where_sql(where)
+        if ids is not None:
+            condition += ' AND id IN (SELECT value FROM json_each(?))'
+            params.append(json.dumps(list(ids)))
+        return [row[0] for row in self._db.execute(f"SELECT slot FROM chunks WHERE {condition}", params)]
+
+    def _rows_for_slots(self, slots: List[int]) -> Dict[int, Tuple[str, str, str]]:
+        rows = self._db.execute(
+            'SELECT slot, id, document, metadata FROM chunks WHERE slot IN (SELECT value FROM json_each(?))',
+            (json.dumps(slots),)
+        )
+        return {row[0]: row[1:] for row in rows}
+
+
+class QuantizedVectorStore:
+    """Stands in for the langchain Chroma wrapper: add_texts plus the underlying _collection."""
+
+    def __init__(self, embedding_function, persist_directory: str, collection_metadata: Optional[Dict] = None,
+                 dtype: str = 'int8', index: str = 'flat'):
+        self.embedding_function = embedding_function
+        self._collection = QuantizedCollection(
+            os.path.join(persist_directory, 'quantized'),
+            metadata=collection_metadata,
+            dtype=dtype,
+            index=index
+        )
+
+    def add_texts(self, texts: List[str], metadatas: Optional[List[Dict]] = None,
+                  ids: Optional[List[str]] = None) -> List[str]:
+        texts = list(texts)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        embeddings = self.embedding_function.embed_documents(texts)
+        self._collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=texts)
+        return ids
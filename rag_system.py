@@ -4,82 +4,43 @@ from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 from langchain_groq import ChatGroq
+from langchain_core.documents import Document
+from chromadb.api.client import SharedSystemClient
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+import multiprocessing
+import threading
+import asyncio
+import queue
+import hashlib
+import json
+import time
 import os
 from dotenv import load_dotenv
-from typing import List, Dict
+from typing import AsyncIterator, Callable, Iterator, List, Dict, Optional, Tuple
+from paper_utils import paper_id, paper_text, content_hash, normalize_date, date_ordinal
+from embedding_cache import CachedEmbeddings
+from answer_cache import SemanticAnswerCache
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from context_assembler import ContextAssembler
+from reranker import CrossEncoderReranker, RERANK_MODEL
+from quantized_store import QuantizedVectorStore
+from metrics import METRICS
+from dedup import NearDuplicateIndex
 
 load_dotenv()
 
-class MedicalRAG:
-    def __init__(self):
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
-        self.llm = ChatGroq(
-            api_key=os.getenv("GROQ_API_KEY"),
-            model_name="mixtral-8x7b-32768"
-        )
-        self.vectorstore = None
-
-    def process_papers(self, papers: List[Dict]):
-        texts = []
-        metadata_list = []
-        
-        for paper in papers:
-            # Store complete paper info in metadata
-            metadata = {
-                'title': paper['title'],
-                'url': paper['url'],
-                'source': paper['source'],
-                'date': paper['date']
-            }
-            
-            text = f"Title: {paper['title']}\nAbstract: {paper['abstract']}\nDate: {paper['date']}\nSource: {paper['source']}\nURL: {paper['url']}"
-            chunks = self.text_splitter.split_text(text)
-            
-            for chunk in chunks:
-                texts.append(chunk)
-                metadata_list.append(metadata)
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 
-        if not self.vectorstore:
-            self.vectorstore = Chroma.from_texts(
-                texts,
-                self.embeddings,
-                metadatas=metadata_list,
-                persist_directory="./chroma_db"
-            )
-        else:
-            self.vectorstore.add_texts(texts, metadatas=metadata_list)
+# Layout of the stored chunks, recorded in the collection metadata: 1 is the original one with
+# no paper ids, 2 keys every chunk by paper_id and content_hash
+STORE_SCHEMA = 2
 
-        if not self.vectorstore:
-            self.vectorstore = Chroma.from_texts(
-                texts,
-                self.embeddings,
-                persist_directory="./chroma_db"
-            )
-        else:
-            self.vectorstore.add_texts(texts)
+NO_PAPERS_MESSAGE = "No papers have been processed yet. Please update the database first."
 
-    def query_papers(self, query: str) -> Dict:
-        if not self.vectorstore:
-            return {
-                'analysis': "No papers have been processed yet. Please update the database first.",
-                'papers': []
-            }
-            
-        # First get relevant documents
-        docs = self.vectorstore.similarity_search(query, k=5)
-        
-        # Extract document texts for the analysis
-        texts = [doc.page_content for doc in docs]
-        context = "\n\n".join(texts)
-        
-        # Prepare the prompt
-        template = """You are a medical research assistant analyzing academic papers. Given the following research papers, 
+ANALYSIS_TEMPLATE = """You are a medical research assistant analyzing academic papers. Given the following research papers, 
         provide a detailed analysis focusing on the practical implications and key takeaways.
 
         Research papers: {context}
@@ -96,21 +57,763 @@ class MedicalRAG:
         Include numerical data and statistics when available.
         """
 
+_worker_embeddings = None
+
+
+def load_embeddings(backend: Optional[str] = None, threads: Optional[int] = None):
+    """MiniLM through PyTorch ('torch') or its ONNX export, in fp32 ('onnx') or int8 ('onnx-int8')."""
+    backend = backend or os.getenv('EMBEDDING_BACKEND', 'torch')
+    threads = threads or int(os.getenv('EMBEDDING_THREADS', 0)) or None
+    if backend == 'torch':
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    if backend in ('onnx', 'onnx-int8'):
+        from onnx_embeddings import OnnxMiniLMEmbeddings
+        return OnnxMiniLMEmbeddings(
+            os.getenv('ONNX_MODEL_DIR', './onnx_model'),
+            quantized=backend == 'onnx-int8',
+            threads=threads,
+            batch_size=int(os.getenv('EMBEDDING_BATCH_SIZE', 32))
+        )
+    raise ValueError(f"Unknown embedding backend {backend}; use torch, onnx or onnx-int8")
+
+
+def embedding_model_id(backend: str) -> str:
+    """Name for the vectors a backend produces, keying the embedding cache; PyTorch keeps the bare model name."""
+    return EMBEDDING_MODEL if backend == 'torch' else f"{EMBEDDING_MODEL}@{backend}"
+
+
+def _init_embedding_worker(backend: str, threads: int, embeddings=None):
+    global _worker_embeddings
+    # Injected embeddings arrive pickled; otherwise the configured backend is loaded here
+    _worker_embeddings = embeddings if embeddings is not None else load_embeddings(backend, threads)
+
+
+def _embed_batch(texts: List[str]) -> List[List[float]]:
+    return _worker_embeddings.embed_documents(texts)
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds to wait if an LLM call failed on a rate limit (HTTP 429), else None."""
+    response = getattr(error, 'response', None)
+    status = getattr(error, 'status_code', None) or getattr(response, 'status_code', None)
+    if status != 429 and 'rate limit' not in str(error).lower():
+        return None
+    retry_after = getattr(response, 'headers', {}).get('retry-after') if response is not None else None
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _collapse_duplicates(docs: List[Document], k: int) -> List[Document]:
+    """Top k chunks, keeping only the best-ranked version of each paper published on several sources.
+
+    Several chunks of that one version may stay; the context assembler merges them.
+    """
+    versions = {}
+    kept = []
+    for doc in docs:
+        metadata = doc.metadata or {}
+        pid = metadata.get('paper_id')
+        cluster = metadata.get('canonical_id') or pid
+        if cluster is not None and versions.setdefault(cluster, pid) != pid:
+            continue
+        kept.append(doc)
+        if len(kept) == k:
+            break
+    return kept
+
+
+def _chunk_key(doc) -> str:
+    """Identify a retrieved chunk by id and content, so edited papers never match old answers."""
+    metadata = doc.metadata or {}
+    if 'paper_id' in metadata:
+        return f"{metadata['paper_id']}:{metadata.get('chunk_index', 0)}:{metadata.get('content_hash', '')}"
+    return hashlib.sha1(doc.page_content.encode('utf-8')).hexdigest()
+
+
+class MedicalRAG:
+    def __init__(self, persist_directory: Optional[str] = None, retrieval_mode: Optional[str] = None,
+                 rerank: Optional[bool] = None, embeddings=None, llm=None):
+        # embeddings and llm replace MiniLM and the Groq client, e.g. with offline stand-ins for benchmarks
+        self.persist_directory = persist_directory or os.getenv('CHROMA_PERSIST_DIR', './chroma_db')
+        # 'hybrid' (BM25 + vector, fused), 'vector' or 'lexical'
+        self.retrieval_mode = retrieval_mode or os.getenv('RETRIEVAL_MODE', 'hybrid')
+        # 'chroma', or 'quantized' for the memory-mapped int8/float16 store
+        self.vector_backend = os.getenv('VECTOR_BACKEND', 'chroma')
+        # Backends run the same MiniLM weights but their vectors differ slightly (int8 more so): the
+        # cache is kept per backend, and a store is only served by another backend once checked
+        self.embedding_backend = os.getenv('EMBEDDING_BACKEND', 'torch') if embeddings is None else type(embeddings).__name__
+        # Kept so bulk_ingest's worker processes embed with the same stand-in
+        self._injected_embeddings = embeddings
+        self.embeddings = CachedEmbeddings(
+            embeddings or load_embeddings(self.embedding_backend),
+            model_name=embedding_model_id(self.embedding_backend),
+            cache_dir=os.getenv('EMBEDDING_CACHE_DIR', './embedding_cache'),
+            max_entries=int(os.getenv('EMBEDDING_CACHE_SIZE', 200000)),
+            dtype=os.getenv('EMBEDDING_CACHE_DTYPE', 'float16')
+        )
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=1000,
+            chunk_overlap=200
+        )
+        self.llm = llm or ChatGroq(
+            api_key=os.getenv("GROQ_API_KEY"),
+            model_name="mixtral-8x7b-32768"
+        )
+        self.answer_cache = SemanticAnswerCache(
+            threshold=float(os.getenv('ANSWER_CACHE_THRESHOLD', 0.95)),
+            ttl=float(os.getenv('ANSWER_CACHE_TTL', 3600))
+        )
+        self.lexical_index = BM25Index(os.path.join(self.persist_directory, 'bm25_index.pkl'))
+        # Cross-source copies of a paper share a canonical_id; retrieval returns only one of them
+        os.makedirs(self.persist_directory, exist_ok=True)
+        self.dedup = NearDuplicateIndex(os.path.join(self.persist_directory, 'dedup_index.sqlite3'),
+                                        threshold=float(os.getenv('DEDUP_THRESHOLD', 0.5)))
+        self.collapse_duplicates = os.getenv('DEDUP_COLLAPSE', 'true').lower() == 'true'
+        # Extra candidates fetched per requested chunk, so collapsing still leaves k
+        self.dedup_overfetch = int(os.getenv('DEDUP_OVERFETCH', 3))
+        # Touched after every completed write so other processes know to reload
+        self.version_path = os.path.join(self.persist_directory, 'store_version')
+        self.context_assembler = ContextAssembler(token_budget=int(os.getenv('CONTEXT_TOKEN_BUDGET', 3000)))
+        # Optional second pass: re-score a wider candidate set with a cross-encoder
+        if rerank is None:
+            rerank = os.getenv('RERANK_ENABLED', 'false').lower() == 'true'
+        self.reranker = None
+        if rerank:
+            self.reranker = CrossEncoderReranker(
+                model_name=os.getenv('RERANK_MODEL', RERANK_MODEL),
+                budget=float(os.getenv('RERANK_BUDGET_MS', 500)) / 1000,
+                # Queries reranked at once; more wait their turn, up to one budget
+                workers=int(os.getenv('RERANK_WORKERS', 2))
+            )
+        self.rerank_candidates = int(os.getenv('RERANK_CANDIDATES', 50))
+        self._vectorstore = None
+        self._vectorstore_lock = threading.Lock()
+        # Searches run concurrently; writers are serialized
+        self._write_lock = threading.Lock()
+        # Searches inside serving() hold the gate open; a reload waits for them to finish
+        self._gate = threading.Condition()
+        self._active_searches = 0
+        self._reloading = False
+        self._loaded_version = None
+        self._embedding_dim = None
+        METRICS.register('rag', self._cache_metrics)
+
+    def _cache_metrics(self) -> Dict[str, float]:
+        embedding = self.embeddings.stats()
+        answer = self.answer_cache.stats()
+        return {
+            'embedding_cache_hits': embedding['hits'],
+            'embedding_cache_misses': embedding['misses'],
+            'embedding_cache_entries': embedding['entries'],
+            'answer_cache_hits': answer['hits'],
+            'answer_cache_misses': answer['misses'],
+            'answer_cache_entries': answer['entries']
+        }
+
+    @property
+    def vectorstore(self) -> Optional[Chroma]:
+        """The vector store, opened from disk on first use if one was persisted."""
+        if self._vectorstore is None and os.path.exists(self._store_marker()):
+            self._open_vectorstore()
+        return self._vectorstore
+
+    @vectorstore.setter
+    def vectorstore(self, value: Optional[Chroma]):
+        self._vectorstore = value
+
+    def _store_marker(self) -> str:
+        if self.vector_backend == 'quantized':
+            return os.path.join(self.persist_directory, 'quantized', 'store.sqlite3')
+        return os.path.join(self.persist_directory, 'chroma.sqlite3')
+
+    @property
+    def embedding_dim(self) -> int:
+        if self._embedding_dim is None:
+            self._embedding_dim = len(self.embeddings.embed_query("dimension probe"))
+        return self._embedding_dim
+
+    def _check_collection(self, vectorstore: Chroma):
+        """Refuse to serve a collection built with a different embedding model, or with a backend
+        whose vectors the configured one doesn't reproduce."""
+        collection = vectorstore._collection
+        metadata = collection.metadata or {}
+        stored_model = metadata.get('embedding_model')
+        stored_dim = metadata.get('embedding_dim')
+        count = collection.count()
+        if stored_dim is None and count:
+            sample = collection.get(limit=1, include=['embeddings'])
+            stored_dim = len(sample['embeddings'][0])
+        # Collections that predate the setting were embedded with PyTorch; an empty one is built by this backend
+        stored_backend = metadata.get('embedding_backend', 'torch') if count else self.embedding_backend
+
+        if stored_model and stored_model != EMBEDDING_MODEL:
+            raise ValueError(f"Collection in {self.persist_directory} was built with {stored_model}, "
+                             f"but {EMBEDDING_MODEL} is configured")
+        if stored_dim is not None and stored_dim != self.embedding_dim:
+            raise ValueError(f"Collection in {self.persist_directory} has {stored_dim}-dimensional vectors, "
+                             f"but {EMBEDDING_MODEL} produces {self.embedding_dim}")
+
+        updates = {}
+        checked = [backend for backend in metadata.get('checked_backends', '').split(',') if backend]
+        if stored_backend != self.embedding_backend and self.embedding_backend not in checked:
+            self._check_backend_vectors(collection, stored_backend)
+            updates['checked_backends'] = ','.join(checked + [self.embedding_backend])
+        if stored_model is None or metadata.get('embedding_dim') is None or metadata.get('embedding_backend') != stored_backend:
+            updates.update({'embedding_model': EMBEDDING_MODEL, 'embedding_dim': self.embedding_dim,
+                            'embedding_backend': stored_backend})
+        if updates:
+            # Chroma rejects hnsw:* keys on modify, they are fixed at creation
+            updated = {key: value for key, value in metadata.items() if not key.startswith('hnsw:')}
+            updated.update(updates)
+            collection.modify(metadata=updated)
+
+    def _check_backend_vectors(self, collection, stored_backend: str):
+        """Re-embed a sample of stored chunks and require the MIN_COSINE similarity to the stored vectors."""
+        from onnx_embeddings import MIN_COSINE, compare_vectors
+
+        stored = collection.get(limit=int(os.getenv('EMBEDDING_CHECK_SAMPLES', 32)), include=['documents', 'embeddings'])
+        similarity = compare_vectors(stored['embeddings'], self.embeddings.embed_documents(stored['documents']))
+        threshold = MIN_COSINE['int8' if 'onnx-int8' in (stored_backend, self.embedding_backend) else 'fp32']
+        if similarity['min'] < threshold:
+            raise ValueError(f"Collection in {self.persist_directory} was embedded with the {stored_backend} backend, "
+                             f"and {self.embedding_backend} vectors differ from it (min cosine "
+                             f"{similarity['min']:.5f} < {threshold}); re-index or switch EMBEDDING_BACKEND back")
+        print(f"Embedding backend {self.embedding_backend} matches the stored {stored_backend} vectors "
+              f"(min cosine {similarity['min']:.5f} over {similarity['count']} chunks)")
+
+    def _stored_hashes(self, paper_ids: List[str]) -> Dict[str, str]:
+        """Map paper id -> content hash for papers already in the store."""
+        hashes = {}
+        for i in range(0, len(paper_ids), 500):
+            batch = paper_ids[i:i + 500]
+            stored = self.vectorstore._collection.get(
+                where={'paper_id': {'$in': batch}},
+                include=['metadatas']
+            )
+            for metadata in stored['metadatas']:
+                hashes[metadata['paper_id']] = metadata.get('content_hash')
+        return hashes
+
+    def _paper_metadata(self, paper: Dict, pid: str, digest: str, canonical_id: Optional[str] = None) -> Dict:
+        # Store complete paper info in metadata
+        metadata = {
+            'title': paper['title'],
+            'url': paper['url'],
+            'source': paper['source'],
+            'date': paper['date'],
+            'paper_id': pid,
+            'canonical_id': canonical_id or pid,
+            'content_hash': digest
+        }
+        # Older backups predate scrape-time normalization
+        published = paper.get('published') or normalize_date(paper['date'])
+        if published:
+            metadata['published'] = published
+            metadata['published_ord'] = date_ordinal(published)
+        return metadata
+
+    def _open_vectorstore(self):
+        with self._vectorstore_lock:
+            if self._vectorstore is not None:
+                return
+            start = time.perf_counter()
+            self._loaded_version = self.store_version()
+            collection_metadata = {'embedding_model': EMBEDDING_MODEL, 'embedding_dim': self.embedding_dim,
+                                   'embedding_backend': self.embedding_backend, 'store_schema': STORE_SCHEMA}
+            if self.vector_backend == 'quantized':
+                vectorstore = QuantizedVectorStore(
+                    embedding_function=self.embeddings,
+                    persist_directory=self.persist_directory,
+                    collection_metadata=collection_metadata,
+                    dtype=os.getenv('QUANTIZED_DTYPE', 'int8'),
+                    index=os.getenv('QUANTIZED_INDEX', 'flat')
+                )
+            else:
+                vectorstore = Chroma(
+                    embedding_function=self.embeddings,
+                    persist_directory=self.persist_directory,
+                    collection_metadata=collection_metadata
+                )
+            self._check_collection(vectorstore)
+            migrated = False
+            if (vectorstore._collection.metadata or {}).get('store_schema', 1) < STORE_SCHEMA:
+                migrated = self._migrate_legacy_chunks(vectorstore._collection)
+            if migrated or self.lexical_index.count() != vectorstore._collection.count():
+                self._rebuild_lexical_index(vectorstore)
+            self._vectorstore = vectorstore
+            print(f"Opened vector store with {vectorstore._collection.count()} chunks "
+                  f"in {time.perf_counter() - start:.2f}s")
+
+    def _migrate_legacy_chunks(self, collection, page_size: int = 5000) -> bool:
+        """Key chunks written before paper ids existed, so the next ingest of their paper replaces them.
+
+        Their paper id comes from the title, source and URL kept in their
+        metadata. The abstract isn't stored, so the content hash is left empty
+        and never matches. Copies the original code added without any metadata
+        are dropped. Returns whether any chunk changed.
+        """
+        start = time.perf_counter()
+        rekeyed, dropped = [], []
+        offset = 0
+        while True:
+            page = collection.get(include=['metadatas'], limit=page_size, offset=offset)
+            if not page['ids']:
+                break
+            for chunk_id, metadata in zip(page['ids'], page['metadatas']):
+                if metadata and metadata.get('paper_id'):
+                    continue
+                if not metadata or not metadata.get('title'):
+                    dropped.append(chunk_id)
+                    continue
+                pid = paper_id(metadata)
+                updated = {**metadata, 'paper_id': pid, 'canonical_id': pid, 'content_hash': ''}
+                published = normalize_date(metadata.get('date', ''))
+                if published:
+                    updated.update(published=published, published_ord=date_ordinal(published))
+                rekeyed.append((chunk_id, updated))
+            offset += len(page['ids'])
+
+        for i in range(0, len(rekeyed), 500):
+            batch = rekeyed[i:i + 500]
+            collection.update(ids=[chunk_id for chunk_id, _ in batch], metadatas=[metadata for _, metadata in batch])
+        for i in range(0, len(dropped), 500):
+            collection.delete(ids=dropped[i:i + 500])
+
+        # Chroma rejects hnsw:* keys on modify, they are fixed at creation
+        metadata = {key: value for key, value in (collection.metadata or {}).items() if not key.startswith('hnsw:')}
+        collection.modify(metadata={**metadata, 'store_schema': STORE_SCHEMA})
+        if rekeyed or dropped:
+            print(f"Migrated the store: keyed {len(rekeyed)} chunks by paper, dropped {len(dropped)} "
+                  f"without metadata, in {time.perf_counter() - start:.2f}s")
+        return bool(rekeyed or dropped)
+
+    def store_version(self) -> int:
+        """Changes whenever a process finishes writing to the stores."""
+        try:
+            return os.stat(self.version_path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _mark_updated(self):
+        os.makedirs(self.persist_directory, exist_ok=True)
+        with open(self.version_path, 'w') as f:
+            f.write(datetime.now().isoformat())
+        # Our own writes are already visible here
+        self._loaded_version = self.store_version()
+
+    def reload(self):
+        """Reopen the stores from disk to pick up papers another process has ingested.
+
+        Chroma keeps its vector index in memory per process, so the cached
+        client has to be dropped as well. Callers must make sure no search is
+        running on this instance meanwhile.
+        """
+        with self._write_lock, self._vectorstore_lock:
+            if self._vectorstore is not None and self.vector_backend != 'quantized':
+                SharedSystemClient.clear_system_cache()
+            self._vectorstore = None
+            self.lexical_index = BM25Index(self.lexical_index.path)
+        print(f"Reloaded stores from {self.persist_directory}")
+
+    def _reload_if_changed(self):
+        if self._vectorstore is None or self.store_version() == self._loaded_version:
+            return
+        with self._gate:
+            if self._reloading:
+                return
+            self._reloading = True
+            while self._active_searches:
+                self._gate.wait()
+        try:
+            self.reload()
+            self._open_vectorstore()
+        finally:
+            with self._gate:
+                self._reloading = False
+                self._gate.notify_all()
+
+    @contextmanager
+    def serving(self):
+        """Wrap reads of the stores so they see papers another process has ingested since they were opened.
+
+        The stores are reloaded first if they changed; a reload waits for
+        reads already inside serving() and holds new ones back until it is
+        done, so every search runs against one consistent index. retrieve()
+        takes it around the searches only, so it is held for milliseconds;
+        don't hold it across LLM calls. Not reentrant.
+        """
+        self._reload_if_changed()
+        with self._gate:
+            while self._reloading:
+                self._gate.wait()
+            self._active_searches += 1
+        try:
+            yield self
+        finally:
+            with self._gate:
+                self._active_searches -= 1
+                self._gate.notify_all()
+
+    def _rebuild_lexical_index(self, vectorstore: Chroma, page_size: int = 5000):
+        """Re-sync the BM25 index from the collection, e.g. after an interrupted bulk ingest."""
+        start = time.perf_counter()
+        self.lexical_index.clear()
+        offset = 0
+        while True:
+            page = vectorstore._collection.get(include=['documents', 'metadatas'], limit=page_size, offset=offset)
+            if not page['ids']:
+                break
+            self.lexical_index.add(page['ids'], page['documents'], page['metadatas'])
+            offset += len(page['ids'])
+        self.lexical_index.save()
+        print(f"Rebuilt lexical index over {offset} chunks in {time.perf_counter() - start:.2f}s")
+
+    def process_papers(self, papers: List[Dict]) -> int:
+        """Embed new or edited papers and return how many were indexed."""
+        with self._write_lock, METRICS.trace('ingest', papers=len(papers)) as trace:
+            self._open_vectorstore()
+
+            # Later copies of the same paper in a batch win
+            latest = {paper_id(paper): paper for paper in papers}
+            stored = self._stored_hashes(list(latest))
+
+            texts = []
+            metadata_list = []
+            ids = []
+            changed = []
+            pending = {}
+
+            for pid, paper in latest.items():
+                digest = content_hash(paper)
+                if stored.get(pid) == digest:
+                    continue
+                if pid in stored:
+                    changed.append(pid)
+                pending[pid] = digest
+            indexed = len(pending)
+
+            with METRICS.span('dedup'):
+                canonical = self.dedup.assign(latest[pid] for pid in pending)
+            duplicates = sum(1 for pid in pending if canonical[pid] != pid)
+            METRICS.inc('duplicate_papers_total', duplicates)
+
+            with METRICS.span('chunk'):
+                for pid, digest in pending.items():
+                    paper = latest[pid]
+                    metadata = self._paper_metadata(paper, pid, digest, canonical[pid])
+
+                    chunks = self.text_splitter.split_text(paper_text(paper))
+                    for i, chunk in enumerate(chunks):
+                        texts.append(chunk)
+                        metadata_list.append({**metadata, 'chunk_index': i})
+                        ids.append(f"{pid}:{i}")
+
+            # Edited papers may now split into fewer chunks, so drop the old ones first
+            if changed:
+                with METRICS.span('store_write'):
+                    self.vectorstore._collection.delete(where={'paper_id': {'$in': changed}})
+                self.lexical_index.remove_papers(changed)
+                self.answer_cache.invalidate_papers(changed)
+            if texts:
+                with METRICS.span('embed_chunks'):
+                    vectors = self.embeddings.embed_documents(texts)
+                with METRICS.span('store_write'):
+                    self.vectorstore._collection.upsert(ids=ids, embeddings=vectors, metadatas=metadata_list,
+                                                        documents=texts)
+                with METRICS.span('lexical_index'):
+                    self.lexical_index.add(ids, texts, metadata_list)
+            if changed or texts:
+                with METRICS.span('lexical_index'):
+                    self.lexical_index.save()
+                self._mark_updated()
+
+            METRICS.inc('papers_indexed_total', indexed)
+            METRICS.inc('papers_skipped_total', len(latest) - indexed)
+            METRICS.inc('chunks_embedded_total', len(texts))
+            trace.fields.update(indexed=indexed, skipped=len(latest) - indexed, chunks=len(texts), duplicates=duplicates)
+            print(f"Indexed {indexed} new or updated papers ({len(texts)} chunks, {duplicates} versions of papers "
+                  f"from other sources), skipped {len(latest) - indexed} unchanged")
+            print(f"Embedding cache: {self.embeddings.stats()}")
+            return indexed
+
+    def _iter_backup_papers(self, paths: List[str], progress: Dict[str, int]) -> Iterator[Tuple[str, int, Dict]]:
+        for path in paths:
+            # One backup file is loaded at a time
+            with open(path, 'r') as f:
+                papers = json.load(f)
+            for i in range(progress.get(path, 0), len(papers)):
+                yield path, i, papers[i]
+
+    def _bulk_batches(self, paths: List[str], progress: Dict[str, int], batch_size: int) -> Iterator[Dict]:
+        pending = {}
+        positions = {}
+        chunk_count = 0
+        # Papers already put in a batch this run; earlier batches may still be embedding, so the
+        # store doesn't show them yet. Batches are written in order, so the newest version wins.
+        issued = {}
+
+        def build_batch():
+            stored = self._stored_hashes([pid for pid in pending if pid not in issued])
+            stored.update((pid, issued[pid]) for pid in pending if pid in issued)
+            batch = {'ids': [], 'texts': [], 'metadatas': [], 'changed': [], 'papers': 0, 'positions': dict(positions)}
+            new = [pid for pid, (_, digest, _) in pending.items() if stored.get(pid) != digest]
+            canonical = self.dedup.assign(pending[pid][0] for pid in new)
+            for pid in new:
+                paper, digest, chunks = pending[pid]
+                issued[pid] = digest
+                if pid in stored:
+                    batch['changed'].append(pid)
+                batch['papers'] += 1
+                metadata = self._paper_metadata(paper, pid, digest, canonical[pid])
+                for i, chunk in enumerate(chunks):
+                    batch['ids'].append(f"{pid}:{i}")
+                    batch['texts'].append(chunk)
+                    batch['metadatas'].append({**metadata, 'chunk_index': i})
+            return batch
+
+        for path, index, paper in self._iter_backup_papers(paths, progress):
+            chunks = self.text_splitter.split_text(paper_text(paper))
+            pending[paper_id(paper)] = (paper, content_hash(paper), chunks)
+            positions[path] = index + 1
+            chunk_count += len(chunks)
+            if chunk_count >= batch_size:
+                yield build_batch()
+                pending, positions, chunk_count = {}, {}, 0
+        if pending:
+            yield build_batch()
+
+    def _write_batch(self, batch: Dict, vectors: List[List[float]]):
+        if batch['changed']:
+            with METRICS.span('store_write'):
+                self.vectorstore._collection.delete(where={'paper_id': {'$in': batch['changed']}})
+            self.lexical_index.remove_papers(batch['changed'])
+            self.answer_cache.invalidate_papers(batch['changed'])
+        if batch['texts']:
+            with METRICS.span('store_write'):
+                self.vectorstore._collection.upsert(
+                    ids=batch['ids'],
+                    embeddings=vectors,
+                    metadatas=batch['metadatas'],
+                    documents=batch['texts']
+                )
+            with METRICS.span('lexical_index'):
+                self.lexical_index.add(batch['ids'], batch['texts'], batch['metadatas'])
+            self.embeddings.update(batch['texts'], vectors)
+        METRICS.inc('papers_indexed_total', batch['papers'])
+        METRICS.inc('chunks_embedded_total', len(batch['texts']))
+
+    def bulk_ingest(self, paths: List[str], batch_size: int = 512, workers: Optional[int] = None,
+                    checkpoint_path: Optional[str] = None, progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Backfill papers from JSON backup files, embedding batches across a process pool.
+
+        Progress is checkpointed after every written batch, so an interrupted
+        run picks up where it stopped when called again with the same paths.
+        ``progress`` is called with the running stats after each batch.
+        Workers load the configured embedding backend, or use the embeddings
+        passed to MedicalRAG, which must then be picklable.
+        """
+        with self._write_lock, METRICS.trace('bulk_ingest', files=len(paths)) as trace:
+            self._open_vectorstore()
+            workers = workers or max(1, (os.cpu_count() or 2) - 1)
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            checkpoint_path = checkpoint_path or os.path.join(self.persist_directory, 'bulk_ingest_checkpoint.json')
+
+            positions = {}
+            if os.path.exists(checkpoint_path):
+                with open(checkpoint_path, 'r') as f:
+                    positions = json.load(f)
+                print(f"Resuming bulk ingest from {checkpoint_path}")
+
+            stats = {'papers': 0, 'chunks': 0, 'batches': 0}
+            start = time.perf_counter()
+
+            def finish(batch, future):
+                # Time spent waiting on the pool beyond what the writes already overlap
+                with METRICS.span('embed_chunks'):
+                    vectors = future.result() if future else []
+                self._write_batch(batch, vectors)
+                positions.update(batch['positions'])
+                with open(checkpoint_path + '.tmp', 'w') as f:
+                    json.dump(positions, f)
+                os.replace(checkpoint_path + '.tmp', checkpoint_path)
+
+                stats['papers'] += batch['papers']
+                stats['chunks'] += len(batch['texts'])
+                stats['batches'] += 1
+                elapsed = time.perf_counter() - start
+                print(f"Bulk ingest: {stats['papers']} papers, {stats['chunks']} chunks "
+                      f"({stats['chunks'] / elapsed:.1f} chunks/sec)")
+                if progress:
+                    progress(stats)
+
+            # Batches are written in submission order so the checkpoint never skips ahead
+            in_flight = deque()
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                     initializer=_init_embedding_worker,
+                                     initargs=(self.embedding_backend, threads, self._injected_embeddings)) as pool:
+                for batch in self._bulk_batches(paths, positions, batch_size):
+                    future = pool.submit(_embed_batch, batch['texts']) if batch['texts'] else None
+                    in_flight.append((batch, future))
+                    if len(in_flight) >= workers * 2:
+                        finish(*in_flight.popleft())
+                while in_flight:
+                    finish(*in_flight.popleft())
+
+            # Saved once at the end; an interrupted run is re-synced when the store is next opened
+            self.lexical_index.save()
+            self._mark_updated()
+            if os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+            stats['seconds'] = time.perf_counter() - start
+            stats['chunks_per_sec'] = stats['chunks'] / stats['seconds'] if stats['seconds'] else 0.0
+            trace.fields.update(papers=stats['papers'], chunks=stats['chunks'])
+            print(f"Bulk ingest finished: {stats}")
+            return stats
+
+    def _analysis_chain(self):
         prompt = PromptTemplate(
-            template=template,
+            template=ANALYSIS_TEMPLATE,
             input_variables=["context", "question"]
         )
+        return prompt | self.llm
 
-        # Create and run the chain
-        chain = prompt | self.llm
-        analysis = chain.invoke({"context": context, "question": query})
-        
-        # Extract the content from the response object
-        if hasattr(analysis, 'content'):
-            analysis_text = analysis.content
-        else:
-            analysis_text = str(analysis)
+    @staticmethod
+    def build_filter(sources: Optional[List[str]] = None, since=None, until=None) -> Optional[Dict]:
+        """Chroma where clause for source names and an inclusive published date range."""
+        clauses = []
+        if sources:
+            clauses.append({'source': {'$in': list(sources)}})
+        if since:
+            clauses.append({'published_ord': {'$gte': date_ordinal(since)}})
+        if until:
+            clauses.append({'published_ord': {'$lte': date_ordinal(until)}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+    def _vector_search(self, query_embeddings: List[List[float]], k: int,
+                       where: Optional[Dict] = None) -> List[List[Tuple[str, Document]]]:
+        """One collection query for all embeddings; (id, Document) hits per embedding."""
+        with METRICS.span('vector_search'):
+            results = self.vectorstore._collection.query(
+                query_embeddings=query_embeddings,
+                n_results=k,
+                where=where,
+                include=['documents', 'metadatas']
+            )
+        return [
+            [(doc_id, Document(page_content=text, metadata=metadata or {}))
+             for doc_id, text, metadata in zip(ids, documents, metadatas)]
+            for ids, documents, metadatas in zip(results['ids'], results['documents'], results['metadatas'])
+        ]
+
+    def _fetch_documents(self, ids: List[str]) -> Dict[str, Document]:
+        if not ids:
+            return {}
+        fetched = self.vectorstore._collection.get(ids=ids, include=['documents', 'metadatas'])
+        return {
+            doc_id: Document(page_content=text, metadata=metadata or {})
+            for doc_id, text, metadata in zip(fetched['ids'], fetched['documents'], fetched['metadatas'])
+        }
+
+    def retrieve(self, query: str, k: int = 5, mode: Optional[str] = None,
+                 query_embedding: Optional[List[float]] = None, where: Optional[Dict] = None) -> List[Document]:
+        """Top-k chunks for a query using lexical, vector or hybrid (reciprocal rank fusion) retrieval.
+
+        ``where`` (see build_filter) is pushed down into both the vector query and the BM25 scan.
+        """
+        query_embeddings = [query_embedding] if query_embedding is not None else None
+        return self.retrieve_many([query], k, mode, query_embeddings, where)[0]
+
+    def retrieve_many(self, queries: List[str], k: int = 5, mode: Optional[str] = None,
+                      query_embeddings: Optional[List[List[float]]] = None,
+                      where: Optional[Dict] = None) -> List[List[Document]]:
+        """retrieve() for several queries, with one embedding batch and one vector query.
+
+        With collapse_duplicates, extra candidates are fetched and only the
+        highest-ranked version of each duplicate cluster is kept.
+        """
+        mode = mode or self.retrieval_mode
+        if query_embeddings is None and mode != 'lexical':
+            with METRICS.span('embed'):
+                query_embeddings = self.embeddings.embed_documents(queries)
+        # Only the store reads hold the reload gate, never the LLM call that follows
+        with self.serving():
+            return self._search_many(queries, k, mode, query_embeddings, where)
+
+    def _search_many(self, queries: List[str], k: int, mode: str, query_embeddings: Optional[List[List[float]]],
+                     where: Optional[Dict]) -> List[List[Document]]:
+        fetch = k * self.dedup_overfetch if self.collapse_duplicates else k
+        if mode == 'lexical':
+            with METRICS.span('lexical_search'):
+                rankings = [[doc_id for doc_id, _ in self.lexical_index.search(query, fetch, where)] for query in queries]
+            documents = self._fetch_documents(list({doc_id for ids in rankings for doc_id in ids}))
+            return [self._collapse([documents[doc_id] for doc_id in ids if doc_id in documents], k) for ids in rankings]
+
+        if mode == 'vector':
+            return [self._collapse([doc for _, doc in hits], k) for hits in self._vector_search(query_embeddings, fetch, where)]
+
+        depth = max(fetch * 4, 20)
+        documents = {}
+        rankings = []
+        for query, vector_hits in zip(queries, self._vector_search(query_embeddings, depth, where)):
+            documents.update(vector_hits)
+            with METRICS.span('lexical_search'):
+                lexical_ids = [doc_id for doc_id, _ in self.lexical_index.search(query, depth, where)]
+            rankings.append(reciprocal_rank_fusion([[doc_id for doc_id, _ in vector_hits], lexical_ids])[:fetch])
+
+        documents.update(self._fetch_documents(list({doc_id for ids in rankings for doc_id in ids} - documents.keys())))
+        return [self._collapse([documents[doc_id] for doc_id in ids if doc_id in documents], k) for ids in rankings]
+
+    def _collapse(self, docs: List[Document], k: int) -> List[Document]:
+        return _collapse_duplicates(docs, k) if self.collapse_duplicates else docs[:k]
+
+    def _retrieve_many(self, queries: List[str], where: Optional[Dict] = None) -> List[Tuple[List[float], List[Document], Dict]]:
+        """Top 5 chunks per query for the prompt, plus per-stage timings (shared by the batch)."""
+        start = time.perf_counter()
+        with METRICS.span('embed'):
+            query_embeddings = self.embeddings.embed_documents(queries)
+        embedded = time.perf_counter()
+        k = self.rerank_candidates if self.reranker else 5
+        candidates = self.retrieve_many(queries, k=k, query_embeddings=query_embeddings, where=where)
+        searched = time.perf_counter()
 
+        retrieved = []
+        for query, query_embedding, docs in zip(queries, query_embeddings, candidates):
+            stats = {'embed_time': embedded - start, 'search_time': searched - embedded, 'candidates': len(docs)}
+            if self.reranker:
+                with METRICS.span('rerank'):
+                    docs, rerank_stats = self.reranker.rerank(query, docs, 5)
+                stats.update(rerank_stats)
+            retrieved.append((query_embedding, docs, stats))
+        return retrieved
+
+    def _retrieve(self, query: str, where: Optional[Dict] = None) -> Tuple[List[float], List[Document], Dict]:
+        query_embedding, docs, stats = self._retrieve_many([query], where)[0]
+        timings = f"embed {stats['embed_time'] * 1000:.0f} ms, search {stats['search_time'] * 1000:.0f} ms"
+        if 'rerank_time' in stats:
+            fallback = ""
+            if not stats['reranked']:
+                cause = "queued too long" if stats.get('rerank_skipped') == 'queued' else "budget exceeded"
+                fallback = f" ({cause}, kept first-stage order)"
+            timings += f", rerank {stats['candidates']} in {stats['rerank_time'] * 1000:.0f} ms{fallback}"
+        print(f"Retrieval: {timings}")
+        return query_embedding, docs, stats
+
+    def _referenced_papers(self, docs: List[Document]) -> List[Dict]:
         # Extract metadata from retrieved documents
         referenced_papers = []
         for doc in docs:
@@ -121,10 +824,256 @@ class MedicalRAG:
                         'title': paper_info.get('title', 'Unknown Title'),
                         'url': paper_info.get('url', '#'),
                         'source': paper_info.get('source', 'Unknown Source'),
-                        'date': paper_info.get('date', 'Unknown Date')
+                        'date': paper_info.get('date', 'Unknown Date'),
+                        'published': paper_info.get('published')
                     })
-        
-        return {
-            'analysis': analysis_text,
-            'papers': referenced_papers
-        }
\ No newline at end of file
+        return referenced_papers
+
+    def _build_context(self, query: str, docs: List[Document]) -> Tuple[str, Dict]:
+        with METRICS.span('context'):
+            context, stats = self.context_assembler.assemble(docs)
+            counter = self.context_assembler.counter
+            stats['prompt_tokens'] = counter.count(ANALYSIS_TEMPLATE.format(context=context, question=query))
+        saved = f" ({stats['tokens_saved']} saved)" if stats['tokens_saved'] > 0 else ""
+        print(f"Context: {stats['papers']} papers from {stats['chunks']} chunks, {stats['context_tokens']} tokens"
+              f"{saved}, prompt {stats['prompt_tokens']} tokens [{stats['tokenizer']}]")
+        return context, stats
+
+    def _cache_answer(self, query_embedding: List[float], chunk_keys: List[str], docs: List[Document], result: Dict):
+        paper_ids = [doc.metadata['paper_id'] for doc in docs if doc.metadata and 'paper_id' in doc.metadata]
+        self.answer_cache.put(query_embedding, chunk_keys, result, paper_ids)
+
+    def query_papers(self, query: str, sources: Optional[List[str]] = None, since=None, until=None) -> Dict:
+        """Analyze the papers most relevant to a query, optionally limited to sources and a published date range."""
+        with METRICS.trace('query', cached=False) as trace:
+            if not self.vectorstore:
+                return {
+                    'analysis': NO_PAPERS_MESSAGE,
+                    'papers': []
+                }
+
+            # First get relevant documents
+            query_embedding, docs, retrieval_stats = self._retrieve(query, self.build_filter(sources, since, until))
+            trace.fields['chunks'] = len(docs)
+
+            # Same retrieved chunks and a near-identical question: reuse the answer
+            chunk_keys = [_chunk_key(doc) for doc in docs]
+            cached = self.answer_cache.get(query_embedding, chunk_keys)
+            if cached is not None:
+                trace.fields['cached'] = True
+                return cached
+
+            # Merge, deduplicate and budget the retrieved chunks
+            context, context_stats = self._build_context(query, docs)
+            with METRICS.span('llm'):
+                analysis = self._analysis_chain().invoke({"context": context, "question": query})
+
+            # Extract the content from the response object
+            if hasattr(analysis, 'content'):
+                analysis_text = analysis.content
+            else:
+                analysis_text = str(analysis)
+
+            result = {
+                'analysis': analysis_text,
+                'papers': self._referenced_papers(docs),
+                'context_stats': context_stats,
+                'retrieval_stats': retrieval_stats
+            }
+            trace.fields['prompt_tokens'] = context_stats['prompt_tokens']
+            self._cache_answer(query_embedding, chunk_keys, docs, result)
+            return result
+
+    def stream_query_papers(self, query: str, sources: Optional[List[str]] = None, since=None, until=None) -> Iterator[Dict]:
+        """Streaming variant of query_papers.
+
+        Yields a 'papers' event with the referenced papers as soon as retrieval
+        finishes, then 'token' events as the analysis is generated, and finally
+        a 'done' event with the full analysis and timings.
+        """
+        with METRICS.trace('stream_query') as trace:
+            for event in self._stream_query_papers(query, sources, since, until):
+                if event['type'] == 'done':
+                    trace.fields.update(cached=event['cached'], papers=len(event['papers']),
+                                        ttft_ms=round((event['time_to_first_token'] or 0) * 1000, 2))
+                yield event
+
+    def _stream_query_papers(self, query: str, sources: Optional[List[str]] = None, since=None,
+                             until=None) -> Iterator[Dict]:
+        start = time.perf_counter()
+        if not self.vectorstore:
+            yield {'type': 'papers', 'papers': []}
+            yield {'type': 'token', 'text': NO_PAPERS_MESSAGE}
+            yield {'type': 'done', 'analysis': NO_PAPERS_MESSAGE, 'papers': [], 'cached': False,
+                   'time_to_first_token': time.perf_counter() - start, 'total_time': time.perf_counter() - start}
+            return
+
+        query_embedding, docs, retrieval_stats = self._retrieve(query, self.build_filter(sources, since, until))
+        papers = self._referenced_papers(docs)
+        yield {'type': 'papers', 'papers': papers}
+
+        chunk_keys = [_chunk_key(doc) for doc in docs]
+        cached = self.answer_cache.get(query_embedding, chunk_keys)
+        if cached is not None:
+            time_to_first_token = time.perf_counter() - start
+            yield {'type': 'token', 'text': cached['analysis']}
+            yield {'type': 'done', 'analysis': cached['analysis'], 'papers': cached['papers'], 'cached': True,
+                   'time_to_first_token': time_to_first_token, 'total_time': time.perf_counter() - start}
+            return
+
+        context, context_stats = self._build_context(query, docs)
+        parts = []
+        time_to_first_token = None
+        # Includes the time the caller spends on each token, as the user sees it
+        with METRICS.span('llm'):
+            for chunk in self._analysis_chain().stream({"context": context, "question": query}):
+                text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                if not text:
+                    continue
+                if time_to_first_token is None:
+                    time_to_first_token = time.perf_counter() - start
+                    METRICS.observe('time_to_first_token_seconds', time_to_first_token)
+                    print(f"Time to first token: {time_to_first_token:.2f}s")
+                parts.append(text)
+                yield {'type': 'token', 'text': text}
+
+        result = {
+            'analysis': "".join(parts),
+            'papers': papers,
+            'context_stats': context_stats,
+            'retrieval_stats': retrieval_stats
+        }
+        self._cache_answer(query_embedding, chunk_keys, docs, result)
+        yield {'type': 'done', **result, 'cached': False,
+               'time_to_first_token': time_to_first_token, 'total_time': time.perf_counter() - start}
+
+    async def aquery_many(self, queries: List[str], concurrency: int = 4, sources: Optional[List[str]] = None,
+                          since=None, until=None, max_retries: int = 5) -> AsyncIterator[Dict]:
+        """Answer many questions, yielding a 'result' event per question as it completes.
+
+        All questions are embedded in one batch and searched with one vector
+        query; at most ``concurrency`` LLM calls run at once. A rate-limited
+        call pauses every new call until its Retry-After (or backoff) passes.
+        Ends with a 'summary' event holding throughput and latency percentiles.
+        """
+        with METRICS.trace('batch_query', queries=len(queries)) as trace:
+            async for event in self._aquery_many(queries, concurrency, sources, since, until, max_retries):
+                if event['type'] == 'summary':
+                    trace.fields.update({key: event[key] for key in ('cached', 'errors', 'retries')})
+                yield event
+
+    async def _aquery_many(self, queries: List[str], concurrency: int, sources: Optional[List[str]],
+                           since, until, max_retries: int) -> AsyncIterator[Dict]:
+        start = time.perf_counter()
+        latencies, llm_times = [], []
+        counts = {'cached': 0, 'errors': 0, 'retries': 0}
+
+        if self.vectorstore:
+            retrieved = await asyncio.to_thread(self._retrieve_many, list(queries), self.build_filter(sources, since, until))
+        else:
+            retrieved = [None] * len(queries)
+        retrieval_time = time.perf_counter() - start
+
+        semaphore = asyncio.Semaphore(concurrency)
+        paused_until = 0.0
+
+        async def answer(query: str, query_embedding: List[float], docs: List[Document], retrieval_stats: Dict) -> Dict:
+            nonlocal paused_until
+            chunk_keys = [_chunk_key(doc) for doc in docs]
+            cached = self.answer_cache.get(query_embedding, chunk_keys)
+            if cached is not None:
+                counts['cached'] += 1
+                return {**cached, 'cached': True}
+
+            context, context_stats = self._build_context(query, docs)
+            chain = self._analysis_chain()
+            async with semaphore:
+                for attempt in range(max_retries + 1):
+                    delay = paused_until - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    llm_start = time.perf_counter()
+                    try:
+                        with METRICS.span('llm'):
+                            analysis = await chain.ainvoke({"context": context, "question": query})
+                        break
+                    except Exception as e:
+                        wait = _retry_after(e)
+                        if wait is None or attempt == max_retries:
+                            raise
+                        counts['retries'] += 1
+                        METRICS.inc('llm_rate_limited_total')
+                        paused_until = max(paused_until, time.monotonic() + (wait or 2 ** attempt))
+                llm_times.append(time.perf_counter() - llm_start)
+
+            result = {
+                'analysis': analysis.content if hasattr(analysis, 'content') else str(analysis),
+                'papers': self._referenced_papers(docs),
+                'context_stats': context_stats,
+                'retrieval_stats': retrieval_stats
+            }
+            self._cache_answer(query_embedding, chunk_keys, docs, result)
+            return {**result, 'cached': False}
+
+        async def run(index: int, query: str) -> Dict:
+            event = {'type': 'result', 'index': index, 'query': query, 'error': None}
+            try:
+                if retrieved[index] is None:
+                    event.update({'analysis': NO_PAPERS_MESSAGE, 'papers': [], 'cached': False})
+                else:
+                    event.update(await answer(query, *retrieved[index]))
+            except Exception as e:
+                counts['errors'] += 1
+                event['error'] = str(e)
+            event['latency'] = time.perf_counter() - start
+            return event
+
+        for future in asyncio.as_completed([run(index, query) for index, query in enumerate(queries)]):
+            event = await future
+            latencies.append(event['latency'])
+            yield event
+
+        total_time = time.perf_counter() - start
+        summary = {
+            'type': 'summary',
+            'queries': len(queries),
+            **counts,
+            'concurrency': concurrency,
+            'retrieval_time': retrieval_time,
+            'total_time': total_time,
+            'throughput': len(queries) / total_time if total_time else 0.0,
+            'latency_p50': _percentile(latencies, 0.5),
+            'latency_p95': _percentile(latencies, 0.95),
+            'llm_p50': _percentile(llm_times, 0.5),
+            'llm_p95': _percentile(llm_times, 0.95)
+        }
+        print(f"Batch: {len(queries)} queries in {total_time:.2f}s ({summary['throughput']:.2f}/s), "
+              f"retrieval {retrieval_time:.2f}s, {counts['cached']} cached, {counts['errors']} errors, "
+              f"{counts['retries']} rate-limit retries")
+        yield summary
+
+    def query_many(self, queries: List[str], concurrency: int = 4, **kwargs) -> Iterator[Dict]:
+        """Synchronous wrapper around aquery_many; the event loop runs on its own thread."""
+        events = queue.Queue()
+        finished = object()
+
+        async def consume():
+            async for event in self.aquery_many(queries, concurrency, **kwargs):
+                events.put(event)
+
+        def run():
+            try:
+                asyncio.run(consume())
+            except Exception as e:
+                events.put(e)
+            finally:
+                events.put(finished)
+
+        threading.Thread(target=run, daemon=True).start()
+        while True:
+            event = events.get()
+            if event is finished:
+                return
+            if isinstance(event, Exception):
+                raise event
+            yield event
@@ -0,0 +1,328 @@
+"""Out-of-band paper refresh: scrape the sources (or backfill backup files) and index new papers.
+
+Any number of copies may run (one per app replica, say); a file lock
+elects the one that refreshes, so only one refresh runs per deployment at
+a time. Progress and the outcome are published to a status file that the
+UI and the HTTP service poll. Searches keep using the previously loaded
+index until the refresh has finished.
+
+Usage:
+    python refresh_worker.py            # refresh whenever the next scheduled update is due
+    python refresh_worker.py --once     # refresh now and exit
+    python refresh_worker.py --once --backfill paper_backups/*.json
+"""
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional
+import argparse
+import subprocess
+import threading
+import json
+import time
+import sys
+import os
+from scraper import MedicalPaperScraper, DEFAULT_SOURCES
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: byte-range locks instead of flock, and no lock descriptor to hand to a child
+    fcntl = None
+    import msvcrt
+
+if TYPE_CHECKING:
+    from rag_system import MedicalRAG
+
+INGEST_LOCK_PATH = os.getenv('INGEST_LOCK_PATH', './ingest.lock')
+REFRESH_STATUS_PATH = os.getenv('REFRESH_STATUS_PATH', './refresh_status.json')
+LAST_UPDATE_PATH = 'last_update.json'
+UPDATE_INTERVAL = timedelta(hours=float(os.getenv('REFRESH_INTERVAL_HOURS', 12)))
+# A failed refresh is retried after this long rather than at the next regular update
+RETRY_INTERVAL = timedelta(minutes=float(os.getenv('REFRESH_RETRY_MINUTES', 15)))
+
+WORKER_PATH = os.path.abspath(__file__)
+# The pid is written padded to a fixed width, so rewriting it never has to truncate the file
+PID_WIDTH = 20
+# msvcrt locks a byte range, which other processes can't read; it sits past the pid
+LOCK_OFFSET = 1024
+
+
+def _try_lock(handle) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            handle.seek(LOCK_OFFSET)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(handle):
+    if fcntl is not None:
+        fcntl.flock(handle, fcntl.LOCK_UN)
+    else:
+        handle.seek(LOCK_OFFSET)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class IngestLock:
+    """Exclusive, non-blocking file lock so only one refresh runs at a time per deployment directory.
+
+    The holder writes its pid into the lock file, so other processes can
+    tell whether a refresh is running without touching the lock itself.
+    """
+
+    def __init__(self, path: str = INGEST_LOCK_PATH, fd: Optional[int] = None):
+        self.path = path
+        # A lock already taken by the parent process and handed down as an open descriptor
+        self._file = os.fdopen(fd, 'r+') if fd is not None else None
+        if self._file is not None:
+            self._write_pid(os.getpid())
+
+    def _write_pid(self, pid: Optional[int]):
+        self._file.seek(0)
+        self._file.write((str(pid) if pid else '').ljust(PID_WIDTH))
+        self._file.flush()
+
+    def _open(self):
+        # Not 'a+': an O_APPEND descriptor, and the child's copy of it, can't overwrite the pid
+        return os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644), 'r+')
+
+    def acquire(self) -> bool:
+        handle = self._open()
+        if not _try_lock(handle):
+            handle.close()
+            return False
+        self._file = handle
+        self._write_pid(os.getpid())
+        return True
+
+    def release(self):
+        if self._file is not None:
+            self._write_pid(None)
+            _unlock(self._file)
+            self._file.close()
+            self._file = None
+
+    def detach(self):
+        """Close this process's handle but keep the lock, which stays held through a child's copy."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def holder(self) -> Optional[int]:
+        """Pid of the live process holding the lock, if any; reads the pid file and never locks."""
+        try:
+            with open(self.path, 'r') as f:
+                pid = int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return None
+        if not pid:
+            return None
+        if fcntl is None:
+            # os.kill would terminate the process here; ask the lock instead, which dies with its holder
+            return pid if self._locked_elsewhere() else None
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            # Killed without releasing; the kernel has dropped its lock already
+            return None
+        except PermissionError:
+            pass
+        return pid
+
+    def _locked_elsewhere(self) -> bool:
+        try:
+            handle = self._open()
+        except OSError:
+            return False
+        try:
+            if not _try_lock(handle):
+                return True
+            _unlock(handle)
+            return False
+        finally:
+            handle.close()
+
+    def held(self) -> bool:
+        """Whether some process (this one included) is refreshing right now."""
+        return self._file is not None or self.holder() is not None
+
+
+def save_last_update(last_update: Optional[datetime], next_update: datetime, path: str = LAST_UPDATE_PATH):
+    with open(path + '.tmp', 'w') as f:
+        json.dump({
+            'last_update': last_update.isoformat() if last_update else None,
+            'next_update': next_update.isoformat()
+        }, f)
+    os.replace(path + '.tmp', path)
+
+
+def load_last_update(path: str = LAST_UPDATE_PATH) -> Dict[str, Optional[datetime]]:
+    if not os.path.exists(path):
+        return {'last_update': None, 'next_update': None}
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return {key: datetime.fromisoformat(data[key]) if data.get(key) else None
+            for key in ('last_update', 'next_update')}
+
+
+class RefreshStatus:
+    """The current or most recent refresh, as a small JSON document rewritten atomically.
+
+    state is 'idle', 'running', 'succeeded' or 'failed'; while running,
+    stage says what the worker is doing and the counters grow as it goes.
+    """
+
+    def __init__(self, path: str = REFRESH_STATUS_PATH):
+        self.path = path
+        self.current: Dict = {}
+
+    def read(self) -> Dict:
+        try:
+            with open(self.path, 'r') as f:
+                status = json.load(f)
+        except (FileNotFoundError, ValueError):
+            status = {'state': 'idle'}
+        # The lock is the source of truth: a worker that was killed mid-run leaves 'running'
+        # behind without holding it, and a just-started one holds it before writing anything
+        held = IngestLock().held()
+        if status.get('state') == 'running' and not held:
+            status.update(state='failed', error="Refresh worker exited unexpectedly")
+        elif status.get('state') != 'running' and held:
+            status = {'state': 'running', 'stage': 'starting'}
+        return status
+
+    def start(self, mode: str):
+        self.current = {'state': 'running', 'mode': mode, 'stage': 'starting', 'pid': os.getpid(),
+                        'started': datetime.now().isoformat(), 'finished': None, 'error': None}
+        self._write()
+
+    def update(self, **fields):
+        self.current.update(fields)
+        self._write()
+
+    def _write(self):
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(self.current, f)
+        os.replace(self.path + '.tmp', self.path)
+
+
+def run_refresh(backfill: Optional[List[str]] = None, rag: Optional['MedicalRAG'] = None,
+                lock_fd: Optional[int] = None, lock: Optional[IngestLock] = None) -> Optional[Dict]:
+    """Scrape the sources (or backfill from backup files) and index the papers.
+
+    Returns None without doing anything if another refresh holds the lock.
+    A caller that has taken the lock already passes it in (or its descriptor).
+    """
+    if lock is None:
+        lock = IngestLock(fd=lock_fd)
+        if lock_fd is None and not lock.acquire():
+            print("A refresh is already running")
+            return None
+    status = RefreshStatus()
+    status.start('backfill' if backfill else 'scrape')
+    start = time.perf_counter()
+    try:
+        if rag is None:
+            # Imported here so the UI can use the status helpers without loading the model stack
+            from rag_system import MedicalRAG
+            rag = MedicalRAG()
+        if backfill:
+            status.update(stage='indexing', files=len(backfill), papers=0, chunks=0)
+            stats = rag.bulk_ingest(backfill, progress=lambda stats: status.update(
+                papers=stats['papers'], chunks=stats['chunks']))
+            result = {'papers': stats['papers'], 'chunks': stats['chunks']}
+        else:
+            status.update(stage='scraping')
+            scraper = MedicalPaperScraper(DEFAULT_SOURCES)
+            papers = scraper.run_scraper()
+            status.update(stage='indexing', scraped=len(papers))
+            result = {'scraped': len(papers), 'indexed': rag.process_papers(papers)}
+            scraper.commit_fetch_state()
+        result['seconds'] = time.perf_counter() - start
+        now = datetime.now()
+        save_last_update(now, now + UPDATE_INTERVAL)
+        status.update(state='succeeded', stage='done', finished=now.isoformat(), **result)
+        print(f"Refresh finished: {result}")
+        return result
+    except Exception as e:
+        now = datetime.now()
+        save_last_update(load_last_update()['last_update'], now + RETRY_INTERVAL)
+        status.update(state='failed', finished=now.isoformat(), error=str(e))
+        raise
+    finally:
+        lock.release()
+
+
+def start_refresh(backfill: Optional[List[str]] = None) -> Optional[int]:
+    """Run a refresh in a separate process; returns its pid, or None if one is already running.
+
+    The lock is taken here and inherited by the child, so a second request
+    is refused even before the child has started up. Where a child can't
+    inherit it (Windows), the refresh runs on a thread in this process
+    instead and the pid returned is this process's own.
+    """
+    lock = IngestLock()
+    if not lock.acquire():
+        return None
+    if fcntl is None:
+        threading.Thread(target=_refresh_in_process, args=(backfill, lock), daemon=True).start()
+        return os.getpid()
+    fd = lock._file.fileno()
+    command = [sys.executable, WORKER_PATH, '--once', '--lock-fd', str(fd)]
+    if backfill:
+        command += ['--backfill', *backfill]
+    try:
+        process = subprocess.Popen(command, pass_fds=(fd,), start_new_session=True)
+    except Exception:
+        lock.release()
+        raise
+    lock.detach()
+    # Reap the child when it exits
+    threading.Thread(target=process.wait, daemon=True).start()
+    return process.pid
+
+
+def _refresh_in_process(backfill: Optional[List[str]], lock: IngestLock):
+    try:
+        run_refresh(backfill=backfill, lock=lock)
+    except Exception as e:
+        print(f"Refresh failed: {str(e)}")
+
+
+def refresh_due() -> bool:
+    next_update = load_last_update()['next_update']
+    return next_update is None or datetime.now() >= next_update
+
+
+def run_loop(poll: float = 60):
+    """Refresh whenever the shared schedule says one is due and no other worker has taken it."""
+    print(f"Refresh worker {os.getpid()} checking every {poll:.0f}s")
+    while True:
+        if refresh_due():
+            try:
+                run_refresh()
+            except Exception as e:
+                print(f"Refresh failed: {str(e)}")
+        time.sleep(poll)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape and index new papers outside the UI")
+    parser.add_argument('--once', action='store_true', help="Refresh now and exit")
+    parser.add_argument('--backfill', nargs='+', metavar='PATH', help="Index JSON backup files instead of scraping")
+    parser.add_argument('--poll', type=float, default=60, help="Seconds between schedule checks")
+    parser.add_argument('--lock-fd', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.once or args.backfill:
+        if run_refresh(backfill=args.backfill, lock_fd=args.lock_fd) is None:
+            sys.exit(1)
+    else:
+        run_loop(args.poll)
+
+
+if __name__ == '__main__':
+    main()
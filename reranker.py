@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, List, Tuple
+import threading
+import time
+from metrics import METRICS
+
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+class CrossEncoderReranker:
+    """Re-scores retrieved chunks with a small cross-encoder under a hard time budget.
+
+    Scoring runs on a pool of worker threads in batches. The budget starts
+    when a worker picks the query up, so queries queued behind others still
+    get all of it; one that waits longer than the budget to start, or runs
+    out of it, keeps its original (first-stage) order and the worker stops
+    after its current batch. Skips are counted in rerank_skipped_total.
+    """
+
+    def __init__(self, model_name: str = RERANK_MODEL, budget: float = 0.5,
+                 batch_size: int = 16, max_length: int = 256, workers: int = 2):
+        self.model_name = model_name
+        self.budget = budget
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rerank')
+        self.timeouts = 0
+
+    @property
+    def model(self):
+        # Loaded on first use so the app does not pay for it unless re-ranking is enabled
+        with self._model_lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                self._model = CrossEncoder(self.model_name, max_length=self.max_length, device='cpu')
+            return self._model
+
+    def _score(self, pairs: List[Tuple[str, str]], started: threading.Event,
+               cancelled: threading.Event) -> List[float]:
+        started.set()
+        scores = []
+        for i in range(0, len(pairs), self.batch_size):
+            if cancelled.is_set():
+                return []
+            batch = pairs[i:i + self.batch_size]
+            scores.extend(float(score) for score in self.model.predict(batch, batch_size=len(batch), show_progress_bar=False))
+        return scores
+
+    def rerank(self, query: str, docs: List, k: int) -> Tuple[List, Dict]:
+        """Top-k of docs by cross-encoder score, or the first k docs if scoring misses the budget."""
+        # Model loading is a one-off cost and is not charged to the query's budget
+        self.model
+        start = time.perf_counter()
+        started = threading.Event()
+        cancelled = threading.Event()
+        future = self._executor.submit(self._score, [(query, doc.page_content) for doc in docs], started, cancelled)
+        reason = None
+        if not started.wait(self.budget):
+            reason = 'queued'
+        else:
+            try:
+                scores = future.result(timeout=self.budget)
+            except FutureTimeout:
+                reason = 'budget'
+        if reason:
+            future.cancel()
+            cancelled.set()
+            self.timeouts += 1
+            METRICS.inc('rerank_skipped_total', reason=reason)
+            return docs[:k], {'rerank_time': time.perf_counter() - start, 'reranked': False, 'rerank_skipped': reason}
+
+        order = sorted(range(len(docs)), key=lambda i: scores[i], reverse=True)
+        return [docs[i] for i in order[:k]], {'rerank_time': time.perf_counter() - start, 'reranked': True}
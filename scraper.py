@@ -1,169 +1,147 @@
-import requests
-from bs4 import BeautifulSoup
-from datetime import datetime
 import json
 from typing import List, Dict
-import schedule
 import time
 import os
 from dotenv import load_dotenv
-import xml.etree.ElementTree as ET
+import threading
+from fetcher import ConcurrentFetcher
+from catalog import PaperCatalog
+from paper_utils import normalize_date, paper_id
+from parsers import PARSERS
+from metrics import METRICS
 
 load_dotenv()
 
+# How many of the newest item ids per source are remembered as the high-water mark
+SEEN_HISTORY = 50
+
+DEFAULT_SOURCES = [
+    "https://pubmed.ncbi.nlm.nih.gov/?term=latest",
+    "https://www.biorxiv.org/collection/new_results",
+    "https://www.medrxiv.org/content/early/recent",
+    "https://www.sciencedirect.com/browse/journals-and-books?subject=medicine",
+    "https://trialsearch.who.int/trial-search",
+    "https://europepmc.org/search?query=recent"
+]
+
+SOURCE_NAMES = ['PubMed', 'bioRxiv', 'medRxiv', 'ScienceDirect', 'WHO Clinical Trials', 'Europe PMC']
+
 class MedicalPaperScraper:
     def __init__(self, sources: List[str]):
         self.sources = sources
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
-
-    def scrape_pubmed(self, url: str) -> List[Dict]:
-        response = requests.get(url, headers=self.headers)
-        soup = BeautifulSoup(response.text, 'html.parser')
+        self.fetcher = ConcurrentFetcher(self.headers)
+        self.catalog = PaperCatalog()
+        # One-time migration of the daily JSON backups written by earlier versions
+        self.catalog.import_backups(os.getenv('BACKUP_DIR', './paper_backups'))
+
+        # Per-source validators and the newest items seen, kept next to last_update.json
+        self.fetch_state_path = os.getenv('FETCH_STATE_PATH', './fetch_state.json')
+        self.fetch_state = {}
+        if os.path.exists(self.fetch_state_path):
+            with open(self.fetch_state_path, 'r') as f:
+                self.fetch_state = json.load(f)
+        # Validators from this run; saved by commit_fetch_state once the papers are indexed
+        self.pending_state = {}
+        self.fetch_stats = {}
+        self._state_lock = threading.Lock()
+
+    def _fetch(self, url: str):
+        """Conditional GET; returns None when the source reports nothing changed since the last run."""
+        state = self.fetch_state.get(url, {})
+        headers = {}
+        if state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state.get('last_modified'):
+            headers['If-Modified-Since'] = state['last_modified']
+
+        response = self.fetcher.get(url, headers=headers)
+        stats = {'status': response.status_code, 'bytes': len(response.content), 'saved_bytes': 0, 'new': 0}
+        with self._state_lock:
+            self.fetch_stats[url] = stats
+        if response.status_code == 304:
+            stats['saved_bytes'] = state.get('bytes', 0)
+            return None
+        return response
+
+    def commit_fetch_state(self):
+        """Save this run's validators and high-water marks.
+
+        Called after the scraped papers are indexed: saved any earlier, a
+        failed index would leave them behind 304s and known ids for good.
+        """
+        with self._state_lock:
+            self.fetch_state.update(self.pending_state)
+            self.pending_state = {}
+            with open(self.fetch_state_path + '.tmp', 'w') as f:
+                json.dump(self.fetch_state, f)
+            os.replace(self.fetch_state_path + '.tmp', self.fetch_state_path)
+
+    def _seen_ids(self, url: str) -> set:
+        return set(self.fetch_state.get(url, {}).get('seen', []))
+
+    def _remember(self, url: str, response, papers: List[Dict]):
+        """Stage validators and the high-water mark once a listing has been parsed successfully."""
+        previous = self.fetch_state.get(url, {})
+        seen = [paper_id(paper) for paper in papers] + previous.get('seen', [])
+        with self._state_lock:
+            self.pending_state[url] = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'bytes': len(response.content),
+                'seen': seen[:SEEN_HISTORY]
+            }
+            self.fetch_stats[url]['new'] = len(papers)
+
+    def _scrape(self, source_key: str, url: str) -> List[Dict]:
+        with METRICS.span('fetch', source=source_key):
+            response = self._fetch(url)
+        stats = self.fetch_stats[url]
+        METRICS.inc('fetches_total', source=source_key, status=stats['status'])
+        METRICS.inc('bytes_fetched_total', stats['bytes'], source=source_key)
+        if response is None:
+            return []
         papers = []
+        known = self._seen_ids(url)
 
-        for article in soup.find_all('article', class_='full-docsum'):
-            try:
-                title = article.find('a', class_='docsum-title').text.strip()
-                abstract = article.find('div', class_='full-view-snippet').text.strip()
-                date = article.find('span', class_='docsum-journal-citation').text.strip()
-                
-                papers.append({
-                    'title': title,
-                    'abstract': abstract,
-                    'date': date,
-                    'source': 'PubMed',
-                    'url': url
-                })
-            except AttributeError:
-                continue
+        with METRICS.span('parse', source=source_key):
+            for paper in PARSERS[source_key].parse(response.content, url, response.headers.get('Content-Type')):
+                # Listings are newest first, so everything after a known item is known too
+                if paper_id(paper) in known:
+                    break
+                papers.append(paper)
 
+        METRICS.inc('papers_scraped_total', len(papers), source=source_key)
+        self._remember(url, response, papers)
         return papers
 
-    def scrape_biorxiv(self, url: str) -> List[Dict]:
-        response = requests.get(url, headers=self.headers)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        papers = []
-
-        for article in soup.find_all('article', class_='article-item'):
-            try:
-                title = article.find('a', class_='highwire-cite-linked-title').text.strip()
-                abstract = article.find('div', class_='abstract').text.strip()
-                date = article.find('span', class_='article-date').text.strip()
-                article_url = "https://www.biorxiv.org" + article.find('a', class_='highwire-cite-linked-title')['href']
-                
-                papers.append({
-                    'title': title,
-                    'abstract': abstract,
-                    'date': date,
-                    'source': 'bioRxiv',
-                    'url': article_url
-                })
-            except AttributeError:
-                continue
+    def scrape_pubmed(self, url: str) -> List[Dict]:
+        return self._scrape('pubmed', url)
 
-        return papers
+    def scrape_biorxiv(self, url: str) -> List[Dict]:
+        return self._scrape('biorxiv', url)
 
     def scrape_medrxiv(self, url: str) -> List[Dict]:
-        response = requests.get(url, headers=self.headers)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        papers = []
-
-        for article in soup.find_all('div', class_='article-item'):
-            try:
-                title = article.find('a', class_='article-title').text.strip()
-                abstract = article.find('div', class_='abstract-text').text.strip()
-                date = article.find('span', class_='pub-date').text.strip()
-                article_url = "https://www.medrxiv.org" + article.find('a', class_='article-title')['href']
-                
-                papers.append({
-                    'title': title,
-                    'abstract': abstract,
-                    'date': date,
-                    'source': 'medRxiv',
-                    'url': article_url
-                })
-            except AttributeError:
-                continue
-
-        return papers
+        return self._scrape('medrxiv', url)
 
     def scrape_sciencedirect(self, url: str) -> List[Dict]:
-        response = requests.get(url, headers=self.headers)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        papers = []
-
-        for article in soup.find_all('li', class_='ResultItem'):
-            try:
-                title = article.find('h2').text.strip()
-                abstract = article.find('div', class_='abstract').text.strip()
-                date = article.find('span', class_='publication-date').text.strip()
-                article_url = article.find('h2').find('a')['href']
-                if not article_url.startswith('http'):
-                    article_url = 'https://www.sciencedirect.com' + article_url
-                
-                papers.append({
-                    'title': title,
-                    'abstract': abstract,
-                    'date': date,
-                    'source': 'ScienceDirect',
-                    'url': article_url
-                })
-            except AttributeError:
-                continue
-
-        return papers
+        return self._scrape('sciencedirect', url)
 
     def scrape_who_trials(self, url: str) -> List[Dict]:
-        response = requests.get(url, headers=self.headers)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        papers = []
-
-        for trial in soup.find_all('tr', class_='trial-record'):
-            try:
-                title = trial.find('td', class_='trial-title').text.strip()
-                abstract = trial.find('td', class_='trial-description').text.strip()
-                date = trial.find('td', class_='trial-date').text.strip()
-                trial_url = "https://trialsearch.who.int" + trial.find('a')['href']
-                
-                papers.append({
-                    'title': title,
-                    'abstract': abstract,
-                    'date': date,
-                    'source': 'WHO Clinical Trials',
-                    'url': trial_url
-                })
-            except AttributeError:
-                continue
-
-        return papers
+        return self._scrape('who', url)
 
     def scrape_europe_pmc(self, url: str) -> List[Dict]:
-        response = requests.get(url, headers=self.headers)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        papers = []
-
-        for article in soup.find_all('div', class_='citation'):
-            try:
-                title = article.find('h3', class_='title').text.strip()
-                abstract = article.find('p', class_='abstract').text.strip()
-                date = article.find('span', class_='publication-date').text.strip()
-                article_url = "https://europepmc.org" + article.find('a', class_='title-link')['href']
-                
-                papers.append({
-                    'title': title,
-                    'abstract': abstract,
-                    'date': date,
-                    'source': 'Europe PMC',
-                    'url': article_url
-                })
-            except AttributeError:
-                continue
-
-        return papers
+        return self._scrape('europepmc', url)
 
     def run_scraper(self) -> List[Dict]:
+        with METRICS.trace('scrape', sources=len(self.sources)) as trace:
+            papers = self._run_scraper(trace)
+            trace.fields['papers'] = len(papers)
+            return papers
+
+    def _run_scraper(self, trace) -> List[Dict]:
         all_papers = []
         
         source_methods = {
@@ -175,24 +153,45 @@ class MedicalPaperScraper:
             'europepmc': self.scrape_europe_pmc
         }
 
+        jobs = []
         for source in self.sources:
             for source_key, scrape_method in source_methods.items():
                 if source_key in source.lower():
-                    try:
-                        papers = scrape_method(source)
-                        all_papers.extend(papers)
-                        print(f"Successfully scraped {len(papers)} papers from {source_key}")
-                    except Exception as e:
-                        print(f"Error scraping {source_key}: {str(e)}")
+                    jobs.append((source_key, scrape_method, source))
                     break
+
+        # Sources are fetched concurrently; results are kept in source order
+        self.fetch_stats = {}
+        results = [[] for _ in jobs]
+        start = time.perf_counter()
+        for index, source_key, papers, error, elapsed in self.fetcher.stream(jobs):
+            # Sources are scraped on the fetcher's threads, so their spans are added here
+            trace.add(f"source:{source_key}", elapsed)
+            if error is not None:
+                METRICS.inc('scrape_errors_total', source=source_key)
+                print(f"Error scraping {source_key}: {str(error)}")
+                continue
+            # Sortable ISO date alongside the raw citation text
+            for paper in papers:
+                paper['published'] = normalize_date(paper['date'])
+            results[index] = papers
+            stats = self.fetch_stats.get(jobs[index][2], {})
+            detail = "not modified" if stats.get('status') == 304 else f"{stats.get('bytes', 0) / 1024:.0f} KB"
+            print(f"Successfully scraped {len(papers)} papers from {source_key} in {elapsed:.2f}s ({detail})")
+        print(f"Scraped {len(jobs)} sources in {time.perf_counter() - start:.2f}s")
+
+        downloaded = sum(stats['bytes'] for stats in self.fetch_stats.values())
+        saved = sum(stats['saved_bytes'] for stats in self.fetch_stats.values())
+        unchanged = sum(1 for stats in self.fetch_stats.values() if stats['status'] == 304)
+        print(f"Downloaded {downloaded / 1024:.0f} KB; {unchanged} sources not modified, "
+              f"saving about {saved / 1024:.0f} KB")
+        trace.fields.update(kb=round(downloaded / 1024, 1), not_modified=unchanged)
+
+        for papers in results:
+            all_papers.extend(papers)
         
-        # Create backup directory if it doesn't exist
-        backup_dir = os.getenv('BACKUP_DIR', './paper_backups')
-        os.makedirs(backup_dir, exist_ok=True)
-        
-        # Save to JSON for backup
-        backup_file = os.path.join(backup_dir, f'papers_{datetime.now().strftime("%Y%m%d")}.json')
-        with open(backup_file, 'w') as f:
-            json.dump(all_papers, f)
-            
-        return all_papers
\ No newline at end of file
+        # The catalog is the system of record for every paper ever scraped
+        new_papers = self.catalog.add_papers(all_papers)
+        print(f"Catalog: {new_papers} new papers, {self.catalog.count()} total")
+
+        return all_papers
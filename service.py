@@ -0,0 +1,332 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, Optional
+from urllib.parse import urlparse
+import traceback
+import hmac
+import threading
+import signal
+import json
+import time
+import os
+from rag_system import MedicalRAG
+from catalog import PaperCatalog
+from refresh_worker import RefreshStatus, load_last_update, start_refresh
+from metrics import METRICS
+
+SERVICE_HOST = os.getenv('SERVICE_HOST', '127.0.0.1')
+SERVICE_PORT = int(os.getenv('SERVICE_PORT', 8000))
+SERVICE_WORKERS = int(os.getenv('SERVICE_WORKERS', 2))
+MAX_BATCH = int(os.getenv('SERVICE_MAX_BATCH', 100))
+MAX_BODY_BYTES = 1024 * 1024
+# Backfill files must live here; POST /ingest never reads anywhere else on the server
+BACKUP_DIR = os.getenv('BACKUP_DIR', './paper_backups')
+# Required as a bearer token for POST /ingest; without one, only local clients may ingest
+INGEST_TOKEN = os.getenv('SERVICE_INGEST_TOKEN')
+LOCAL_CLIENTS = ('127.0.0.1', '::1', '::ffff:127.0.0.1')
+
+
+def system_status(rag: MedicalRAG, catalog: PaperCatalog) -> Dict:
+    vectorstore = rag.vectorstore
+    return {
+        'papers': catalog.count(),
+        'chunks': vectorstore._collection.count() if vectorstore else 0,
+        'vector_backend': rag.vector_backend,
+        'retrieval_mode': rag.retrieval_mode,
+        'store_version': rag.store_version(),
+        **load_last_update(),
+        'refresh': RefreshStatus().read()
+    }
+
+
+def parse_date(value) -> Optional[date]:
+    return date.fromisoformat(value) if value else None
+
+
+class ServiceWorker:
+    """Per-process state: one model, store handle and LLM client, shared by the request threads.
+
+    Retrieval runs inside rag.serving(), so a worker picks up papers indexed
+    by the refresh worker without serving from a half-reloaded store.
+    """
+
+    def __init__(self):
+        start = time.perf_counter()
+        self.rag = MedicalRAG()
+        self.catalog = PaperCatalog()
+        # Load the embedding model and open the store before taking traffic
+        self.rag.embedding_dim
+        self.rag.vectorstore
+        self.started = time.time()
+        self.requests = 0
+        self._lock = threading.Lock()
+        # Metrics are kept per worker; these tell scraped series apart
+        METRICS.register('worker', lambda: {'worker_pid': os.getpid(), 'worker_requests': self.requests,
+                                            'worker_uptime_seconds': time.time() - self.started})
+        print(f"Worker {os.getpid()} ready in {time.perf_counter() - start:.2f}s")
+
+    @contextmanager
+    def serving(self):
+        with self._lock:
+            self.requests += 1
+        yield self.rag
+
+    def status(self) -> Dict:
+        with self.serving() as rag, rag.serving():
+            return {
+                'worker': os.getpid(),
+                'uptime': time.time() - self.started,
+                'requests': self.requests,
+                **system_status(rag, self.catalog)
+            }
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """JSON endpoints: GET /status, POST /query, POST /query/batch and POST /ingest.
+
+    GET /metrics serves Prometheus text for the worker that happens to
+    accept the connection; documed_worker_pid says which one. POST /ingest
+    needs SERVICE_INGEST_TOKEN as a bearer token, or a local client if no
+    token is configured.
+    """
+
+    server_version = 'DocuMed'
+    # Keep-alive, so load generators and proxies can reuse connections
+    protocol_version = 'HTTP/1.1'
+    # Set once a streamed response has sent its headers, after which errors go into the stream
+    _streaming = False
+
+    @property
+    def worker(self) -> ServiceWorker:
+        return self.server.worker
+
+    def log_message(self, format, *args):
+        if os.getenv('SERVICE_ACCESS_LOG', 'false').lower() == 'true':
+            super().log_message(format, *args)
+
+    def _fail(self, status: int, message: str):
+        if not self._streaming:
+            self._send_json(status, {'error': message})
+            return
+        # The 200 and part of the body are out already; end the stream with an error event instead
+        try:
+            self.wfile.write(json.dumps({'type': 'error', 'error': message}).encode('utf-8') + b'\n')
+            self.wfile.flush()
+        except OSError:
+            pass
+        self.close_connection = True
+
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, status: int, text: str, content_type: str = 'text/plain; version=0.0.4'):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            raise ValueError(f"Request body over {MAX_BODY_BYTES} bytes")
+        data = json.loads(self.rfile.read(length) or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError("Request body must be a JSON object")
+        return data
+
+    @staticmethod
+    def _filters(data: Dict) -> Dict:
+        return {
+            'sources': data.get('sources') or None,
+            'since': parse_date(data.get('since')),
+            'until': parse_date(data.get('until'))
+        }
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        try:
+            if path == '/status':
+                self._send_json(200, self.worker.status())
+            elif path == '/metrics':
+                self._send_text(200, METRICS.prometheus())
+            else:
+                self._send_json(404, {'error': f"Unknown endpoint {path}"})
+        except Exception as e:
+            traceback.print_exc()
+            self._send_json(500, {'error': str(e)})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        self._streaming = False
+        handlers = {'/query': self._query, '/query/batch': self._query_batch, '/ingest': self._ingest}
+        if path not in handlers:
+            self._send_json(404, {'error': f"Unknown endpoint {path}"})
+            return
+        try:
+            data = self._read_json()
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        try:
+            handlers[path](data)
+        except ValueError as e:
+            self._fail(400, str(e))
+        except Exception as e:
+            traceback.print_exc()
+            self._fail(500, str(e))
+
+    def _query(self, data: Dict):
+        query = (data.get('query') or '').strip()
+        if not query:
+            raise ValueError("'query' is required")
+        filters = self._filters(data)
+        start = time.perf_counter()
+        with self.worker.serving() as rag:
+            result = rag.query_papers(query, **filters)
+        self._send_json(200, {**result, 'latency': time.perf_counter() - start})
+
+    def _query_batch(self, data: Dict):
+        queries = data.get('queries')
+        if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q.strip() for q in queries):
+            raise ValueError("'queries' must be a non-empty list of strings")
+        if len(queries) > MAX_BATCH:
+            raise ValueError(f"At most {MAX_BATCH} queries per batch")
+        filters = self._filters(data)
+        concurrency = int(data.get('concurrency', 4))
+
+        with self.worker.serving() as rag:
+            events = rag.query_many(queries, concurrency=concurrency, **filters)
+            if not data.get('stream'):
+                results = [None] * len(queries)
+                summary = None
+                for event in events:
+                    if event['type'] == 'result':
+                        results[event['index']] = event
+                    else:
+                        summary = event
+                self._send_json(200, {'results': results, 'summary': summary})
+                return
+
+            # Newline-delimited JSON, one event per line as each question completes
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            self._streaming = True
+            for event in events:
+                self.wfile.write(json.dumps(event, default=str).encode('utf-8') + b'\n')
+                self.wfile.flush()
+
+    def _ingest_allowed(self) -> bool:
+        if INGEST_TOKEN:
+            supplied = self.headers.get('Authorization', '')
+            return hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {INGEST_TOKEN}".encode('utf-8'))
+        return self.client_address[0] in LOCAL_CLIENTS
+
+    def _ingest(self, data: Dict):
+        if not self._ingest_allowed():
+            self._send_json(403, {'error': "Ingest needs the service's ingest token, or a local client"})
+            return
+        backfill = data.get('backfill') or None
+        if backfill is not None and not (isinstance(backfill, list) and all(isinstance(p, str) for p in backfill)):
+            raise ValueError("'backfill' must be a list of backup file paths")
+        if backfill:
+            # Relative paths are taken from BACKUP_DIR; symlinks and '..' can't leave it
+            root = os.path.realpath(BACKUP_DIR)
+            resolved = [os.path.realpath(os.path.join(root, path)) for path in backfill]
+            outside = [path for path, real in zip(backfill, resolved) if os.path.commonpath([root, real]) != root]
+            if outside:
+                raise ValueError(f"Backup files must be inside {BACKUP_DIR}: {', '.join(outside)}")
+            missing = [path for path, real in zip(backfill, resolved) if not os.path.isfile(real)]
+            if missing:
+                raise ValueError(f"Backup files not found: {', '.join(missing)}")
+            backfill = resolved
+        pid = start_refresh(backfill)
+        if pid is None:
+            self._send_json(409, {'error': "A refresh is already running"})
+        else:
+            self._send_json(202, {'started': True, 'pid': pid})
+
+
+def _limit_threads(workers: int):
+    # Workers share the machine's cores instead of each using all of them
+    os.environ.setdefault('EMBEDDING_THREADS', str(max(1, (os.cpu_count() or 1) // workers)))
+
+
+def serve(host: str = SERVICE_HOST, port: int = SERVICE_PORT, workers: int = SERVICE_WORKERS):
+    """Serve the API from ``workers`` forked processes accepting on one listening socket.
+
+    Each worker loads its own model and store handles once and handles
+    requests on threads. Workers that die are restarted; SIGTERM or
+    Ctrl-C stops them all.
+    """
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    print(f"Serving on http://{host}:{server.server_address[1]} with {workers} workers")
+
+    if workers <= 1 or not hasattr(os, 'fork'):
+        server.worker = ServiceWorker()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+
+    children = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                _limit_threads(workers)
+                server.worker = ServiceWorker()
+                server.serve_forever()
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = time.time()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if stopping or started is None:
+            continue
+        print(f"Worker {pid} exited with status {status}, restarting")
+        # Don't spin if a worker fails during startup
+        if time.time() - started < 5:
+            time.sleep(5)
+        spawn()
+    server.server_close()